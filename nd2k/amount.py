@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Iterable
+
+
+# Decimal additions beyond this many digits are rounded by the context
+MAX_EXACT_DIGITS = 28
+MAX_EXACT        = 10 ** MAX_EXACT_DIGITS
+
+
+@dataclass(slots=True, eq=False)
+class Amount:
+	"""
+	Exact amount as an integer scaled by a power of ten, standing in for
+	Decimal: sums are integer additions, and text is only rendered when
+	formatting, exactly as str(Decimal) would. Each amount keeps its own
+	scale, as NovaDAX prints a varying number of decimals for the same
+	asset, and those trailing zeros show up in the output.
+	Instances are never changed once created, but are not frozen, as
+	that makes creating them more than twice as slow.
+	"""
+	mantissa: int
+	scale:    int = 0 # amount == mantissa * 10 ** -scale, negative once rounded
+
+
+	@classmethod
+	def sum(cls, amounts: Iterable["Amount"]) -> "Amount":
+		"""Same result as Decimal(sum(...)) on the equivalent Decimals."""
+		amounts = list(amounts)
+
+		# most groups hold a single transaction
+		if len(amounts) == 1 and amounts[0].is_exact_sum():
+			return amounts[0]
+
+		scales  = {a.scale for a in amounts}
+		# Decimal sums start from int 0, which has no decimals either
+		scale   = max(scales | {0})
+
+		if scales == {scale}:
+			total = sum(a.mantissa for a in amounts)
+		else:
+			total = sum(a.mantissa * 10 ** (scale - a.scale) for a in amounts)
+
+		if not -MAX_EXACT < total < MAX_EXACT:
+			return cls.from_decimal(Decimal(sum(a.to_decimal() for a in amounts)))
+		return cls(total, scale)
+
+
+	def __add__(self, other: "Amount") -> "Amount":
+		"""Same result as adding the equivalent Decimals."""
+		if self.scale == other.scale:
+			scale = self.scale
+			total = self.mantissa + other.mantissa
+		else:
+			scale = max(self.scale, other.scale)
+			total = (
+				self.mantissa  * 10 ** (scale - self.scale)
+				+ other.mantissa * 10 ** (scale - other.scale))
+
+		if not -MAX_EXACT < total < MAX_EXACT:
+			return Amount.from_decimal(self.to_decimal() + other.to_decimal())
+		return Amount(total, scale)
+
+
+	def is_exact_sum(self) -> bool:
+		"""Whether adding it to int 0 as a Decimal leaves it unchanged."""
+		return self.scale >= 0 and -MAX_EXACT < self.mantissa < MAX_EXACT
+
+
+	@classmethod
+	def from_decimal(cls, value: Decimal) -> "Amount":
+		sign, digits, exponent = value.as_tuple()
+		mantissa = int("".join(map(str, digits)) or "0")
+		return cls(-mantissa if sign else mantissa, -int(exponent))
+
+
+	def to_decimal(self) -> Decimal:
+		return Decimal(f"{self.mantissa}E{-self.scale}")
+
+
+	def __str__(self) -> str:
+		"""Scientific notation kicks in where Decimal would use it."""
+		sign   = "-" if self.mantissa < 0 else ""
+		digits = str(abs(self.mantissa))
+		adjusted = len(digits) - 1 - self.scale
+
+		if self.scale < 0 or adjusted < -6:
+			fraction = f".{digits[1:]}" if len(digits) > 1 else ""
+			return f"{sign}{digits[0]}{fraction}E{adjusted:+}"
+
+		if not self.scale:
+			return sign + digits
+
+		digits = digits.rjust(self.scale + 1, "0")
+		return f"{sign}{digits[:-self.scale]}.{digits[-self.scale:]}"
+
+
+	def __format__(self, spec: str) -> str:
+		return format(str(self), spec) if spec else str(self)
+
+
+	def __repr__(self) -> str:
+		return f"Amount('{self}')"
+
+
+	def __eq__(self, other: object) -> bool:
+		if not isinstance(other, Amount):
+			return NotImplemented
+		return self.to_decimal() == other.to_decimal()
+
+
+	def __hash__(self) -> int:
+		return hash(self.to_decimal())
+
+
+ZERO = Amount(0)
@@ -0,0 +1,122 @@
+import glob
+import os
+import time
+
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable
+
+from .compressed import EXTENSIONS, strip_extension
+
+
+Converter = Callable[[str], tuple[int, int]] # input file -> (rows, transactions)
+
+OUTPUT_SUFFIX = "_koinly_universal.csv"
+
+INPUT_PATTERNS = ["*.csv"] + [f"*.csv{extension}" for extension in EXTENSIONS]
+
+
+@dataclass
+class Outcome:
+	input_file:   str
+	seconds:      float
+	rows:         int = 0
+	transactions: int = 0
+	error:        str | None = None
+
+
+	def format(self) -> str:
+		if self.error:
+			return f"FAILED {self.input_file}: {self.error} ({self.seconds:.2f}s)"
+		return (
+			f"OK     {self.input_file}: {self.rows} rows, "
+			f"{self.transactions} transactions ({self.seconds:.2f}s)")
+
+
+@dataclass
+class Report:
+	outcomes: list[Outcome]
+	seconds:  float
+
+
+	def succeeded(self) -> bool:
+		return all(o.error is None for o in self.outcomes)
+
+
+	def summary(self) -> str:
+		converted = sum(1 for o in self.outcomes if o.error is None)
+		lines = [o.format() for o in self.outcomes]
+		lines.append(
+			f"Converted {converted} of {len(self.outcomes)} files "
+			f"in {self.seconds:.2f}s")
+		return "\n".join(lines)
+
+
+def is_batch(inputs: list[str]) -> bool:
+	return len(inputs) > 1 or os.path.isdir(inputs[0]) or is_pattern(inputs[0])
+
+
+def is_pattern(path: str) -> bool:
+	"""Existing files are taken as they are, even if named like report[1].csv."""
+	return any(c in path for c in "*?[") and not os.path.exists(path)
+
+
+def expand_inputs(inputs: list[str]) -> list[str]:
+	"""
+	Directories and glob patterns are expanded to the CSV files they hold,
+	leaving out previous outputs. Patterns matching nothing are kept as they
+	are, to be reported as missing files.
+	"""
+	files = []
+	for i in inputs:
+		if os.path.isdir(i):
+			files += sorted(
+				f for p in INPUT_PATTERNS for f in find_inputs(os.path.join(glob.escape(i), p)))
+		elif is_pattern(i):
+			files += find_inputs(i) or [i]
+		else:
+			files.append(i)
+	return list(dict.fromkeys(files))
+
+
+def find_inputs(pattern: str) -> list[str]:
+	return sorted(
+		f for f in glob.glob(pattern)
+		if not strip_extension(f)[0].endswith(OUTPUT_SUFFIX))
+
+
+def convert_many(files: list[str], convert: Converter, jobs: int | None) -> Report:
+	start = time.perf_counter()
+	task  = partial(convert_one, convert)
+
+	if jobs == 1:
+		outcomes = [task(f) for f in files]
+	else:
+		from concurrent.futures import ProcessPoolExecutor
+
+		with ProcessPoolExecutor(jobs) as pool:
+			outcomes = list(pool.map(task, files))
+
+	return Report(outcomes, time.perf_counter() - start)
+
+
+def convert_one(convert: Converter, input_file: str) -> Outcome:
+	"""A failing file is reported without interrupting the others."""
+	start = time.perf_counter()
+
+	if not os.path.isfile(input_file):
+		return Outcome(input_file, 0, error="No such file")
+
+	try:
+		rows, transactions = convert(input_file)
+	except Exception as e:
+		return Outcome(input_file, time.perf_counter() - start, error=describe(e))
+
+	return Outcome(input_file, time.perf_counter() - start, rows, transactions)
+
+
+def describe(e: Exception) -> str:
+	# organizing errors carry the unmatched operations as extra arguments
+	if isinstance(e, ValueError) and e.args:
+		return str(e.args[0])
+	return str(e) or type(e).__name__
@@ -0,0 +1,248 @@
+"""
+Conversions kept on disk, when asked for with --cache, keyed by the hash
+of the input file, the version of nd2k and the options that change the
+result, so converting the same export again only costs reading it once.
+Each conversion leaves the records of its transactions, which any output
+format can be written from, and a copy of its Koinly CSV, which is copied
+as it is when that is all that is asked for.
+
+Entries are written to temporary files renamed into place, so readers
+never see half of one. They hold financial records, so only their owner
+can read them, and the least recently used ones are evicted once the
+cache grows beyond its size. The cache lives in $ND2K_CACHE_DIR, or in
+the user's cache directory, and never fails a conversion.
+"""
+import csv
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+from typing import IO, Iterable, Iterator
+
+from . import __version__
+from .amount import Amount
+from .compressed import codec_of
+from .reader import STDIO
+from .writers import (
+	BATCH_SIZE, Columns, KoinlyWriter, as_text, open_output, write_batches,
+	writer_for)
+
+
+MAX_SIZE   = 256 * 1024 * 1024 # bytes, unless $ND2K_CACHE_SIZE says otherwise, in MiB
+BLOCK_SIZE = 1024 * 1024
+
+RECORDS = "records.csv"
+KOINLY  = "koinly.csv"
+
+Counts = tuple[int, int] # rows read, transactions written
+
+
+def cache_dir() -> str:
+	default = os.path.join(
+		os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache")),
+		"nd2k")
+	return os.environ.get("ND2K_CACHE_DIR") or default
+
+
+def max_size() -> int:
+	size = os.environ.get("ND2K_CACHE_SIZE")
+	return int(size) * 1024 * 1024 if size else MAX_SIZE
+
+
+class Cache:
+	def __init__(self, directory: str, max_size: int):
+		self.directory = directory
+		self.max_size  = max_size
+
+
+	def path(self, key: str, kind: str) -> str:
+		return os.path.join(self.directory, f"{key}.{kind}")
+
+
+	def get(self, key: str, kind: str) -> str | None:
+		"""Path of the entry, marked as just used, None when there is none."""
+		path = self.path(key, kind)
+		try:
+			os.utime(path)
+		except OSError:
+			return None
+		return path
+
+
+	@contextmanager
+	def put(self, key: str, kind: str) -> Iterator[IO[bytes]]:
+		"""
+		Only takes the place of the entry once completely written. Temporary
+		files are only readable and writable by their owner, and so is the entry.
+		"""
+		os.makedirs(self.directory, mode=0o700, exist_ok=True)
+		f = tempfile.NamedTemporaryFile(dir=self.directory, prefix=".", delete=False)
+		try:
+			with f:
+				yield f
+			os.replace(f.name, self.path(key, kind))
+		except BaseException:
+			os.unlink(f.name)
+			raise
+		self.evict()
+
+
+	def evict(self) -> None:
+		"""Least recently used entries first, until everything fits."""
+		entries = []
+		for entry in os.scandir(self.directory):
+			if entry.name.startswith("."): # still being written
+				continue
+			try:
+				stat = entry.stat()
+			except OSError: # evicted by another process
+				continue
+			entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+		total = sum(size for _, size, _ in entries)
+		for _, size, path in sorted(entries):
+			if total <= self.max_size:
+				break
+			try:
+				os.unlink(path)
+			except OSError:
+				pass
+			total -= size
+
+
+class Entry:
+	"""Cached conversions of a single input file."""
+	def __init__(self, cache: Cache, input_file: str, trade_window: timedelta | None = None):
+		self.cache = cache
+		self.key   = key(input_file, trade_window)
+
+
+	def write(self, outputs: list[str]) -> Counts | None:
+		"""Writes the outputs from the cache, None when it holds no conversion."""
+		try:
+			return self.write_from(outputs)
+		except FileNotFoundError: # evicted by another process meanwhile
+			return None
+
+
+	def write_from(self, outputs: list[str]) -> Counts | None:
+		records = self.cache.get(self.key, RECORDS)
+		if records is None:
+			return None
+
+		koinly = self.cache.get(self.key, KOINLY)
+		if koinly and all(writer_for(o) is KoinlyWriter for o in outputs):
+			with open(records, "r", encoding="utf-8", newline="") as f:
+				counts = load_counts(f)
+			for output in outputs:
+				with open(koinly, "rb") as source, open_output(output) as f:
+					f.flush()
+					shutil.copyfileobj(source, f.buffer, BLOCK_SIZE)
+			return counts
+
+		with open(records, "r", encoding="utf-8", newline="") as f:
+			counts = load_counts(f)
+			write_batches(outputs, load_records(f))
+		if not koinly:
+			self.store_koinly(outputs)
+		return counts
+
+
+	def store(self, counts: Counts, batches: list[Columns], outputs: list[str]) -> None:
+		try:
+			with self.cache.put(self.key, RECORDS) as f:
+				dump_records(counts, batches, f)
+			self.store_koinly(outputs)
+		except OSError:
+			pass
+
+
+	def store_koinly(self, outputs: list[str]) -> None:
+		"""Copy of the first Koinly CSV written as a plain file, if any was."""
+		for output in outputs:
+			if writer_for(output) is KoinlyWriter and output != STDIO and not codec_of(output):
+				try:
+					with open(output, "rb") as source, self.cache.put(self.key, KOINLY) as f:
+						shutil.copyfileobj(source, f, BLOCK_SIZE)
+				except OSError:
+					pass
+				return
+
+
+def lookup(input_file: str, trade_window: timedelta | None = None) -> Entry | None:
+	"""None for standard input, and whenever the cache can't be used."""
+	if input_file == STDIO:
+		return None
+	try:
+		return Entry(Cache(cache_dir(), max_size()), input_file, trade_window)
+	except OSError:
+		return None
+
+
+def key(input_file: str, trade_window: timedelta | None = None) -> str:
+	"""
+	Hash of the version of nd2k, of the options changing the result,
+	and of every byte of the input, as stored.
+	"""
+	sha256 = hashlib.sha256(f"nd2k {__version__}\n".encode("utf-8"))
+	if trade_window is not None:
+		sha256.update(f"trade window {trade_window.total_seconds()}\n".encode("utf-8"))
+	with open(input_file, "rb") as f:
+		while block := f.read(BLOCK_SIZE):
+			sha256.update(block)
+	return sha256.hexdigest()
+
+
+def dump_records(counts: Counts, batches: Iterable[Columns], f: IO[bytes]) -> None:
+	"""Counts on the first line, then one CSV row per record, None left empty."""
+	text   = io.TextIOWrapper(f, encoding="utf-8", newline="")
+	writer = csv.writer(text)
+	writer.writerow(counts)
+	for batch in batches:
+		writer.writerows(zip(*as_text(batch)))
+	text.flush()
+	text.detach()
+
+
+def load_counts(f: IO[str]) -> Counts:
+	rows, transactions = map(int, next(csv.reader([f.readline()])))
+	return rows, transactions
+
+
+def load_records(f: IO[str]) -> Iterator[Columns]:
+	"""The records dump_records wrote, after the counts, a batch at a time."""
+	reader = csv.reader(f)
+	while batch := list(islice(reader, BATCH_SIZE)):
+		dates, sent, sent_currency, received, received_currency, fee, fee_currency, \
+			labels, descriptions = zip(*batch)
+		yield Columns(
+			date              = parse_dates(dates),
+			sent_amount       = parse_amounts(sent),
+			sent_currency     = optional(sent_currency),
+			received_amount   = parse_amounts(received),
+			received_currency = optional(received_currency),
+			fee_amount        = parse_amounts(fee),
+			fee_currency      = optional(fee_currency),
+			label             = labels,
+			description       = descriptions)
+
+
+def parse_dates(column: tuple[str, ...]) -> tuple[datetime, ...]:
+	"""Transactions often share a date, each one is parsed only once."""
+	parsed = {d: datetime.fromisoformat(d) for d in set(column)}
+	return tuple(map(parsed.__getitem__, column))
+
+
+def parse_amounts(column: tuple[str, ...]) -> tuple[Amount | None, ...]:
+	"""Amounts print exactly as the Decimals they stand for, so they read back exactly."""
+	return tuple(Amount.from_decimal(Decimal(a)) if a else None for a in column)
+
+
+def optional(column: tuple[str, ...]) -> tuple[str | None, ...]:
+	return tuple(s or None for s in column)
@@ -0,0 +1,86 @@
+"""
+Entry point of the nd2k command. It only imports what parsing arguments
+needs, so asking for the version or the usage doesn't pay for loading
+the conversion, which is imported once there is something to convert.
+"""
+import sys
+
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
+
+from . import __version__
+
+TYPE_CHECKING = False # spares importing typing, which only mypy needs here
+if TYPE_CHECKING:
+	from typing import NoReturn
+
+
+class CLI(ArgumentParser):
+	def error(self, message: str) -> "NoReturn":
+		"""The usage line nd2k always printed, after what argparse found wrong."""
+		print(f"{self.prog}: {message} (see {self.prog} --help)", file=sys.stderr)
+		print("Usage: nd2k <novadax-csv>")
+		exit(1)
+
+
+def positive(value: str) -> int:
+	number = int(value)
+	if number < 1:
+		raise ArgumentTypeError(f"{value} is not a positive number")
+	return number
+
+
+def main() -> None:
+	if sys.argv[1:2] == ["serve"]:
+		from . import server
+
+		server.main(sys.argv[2:])
+		return
+
+	args = parse_args(sys.argv[1:])
+
+	from . import main
+
+	main.run(args)
+
+
+def parse_args(argv: list[str]) -> Namespace:
+	cli = CLI(prog="nd2k")
+	cli.add_argument("inputs", nargs="+", metavar="novadax-csv",
+		help="NovaDAX CSV file, - for standard input; several files, "
+		     "directories or glob patterns are converted in batch")
+	cli.add_argument("-o", "--output", metavar="PATH", action="append",
+		help="where to write the Koinly CSV, - for standard output "
+		     "(defaults to a file next to the input, or standard output "
+		     "when reading standard input); repeat it to write several outputs "
+		     "from a single run, in the format told by each extension: "
+		     ".csv, .jsonl, .sqlite, .arrow or .parquet")
+	cli.add_argument("-v", "--version", action="version", version=__version__)
+	cli.add_argument("--stream", action="store_true",
+		help="read the file backwards in blocks and write the output as "
+		     "transactions complete, keeping memory usage low on large files")
+	cli.add_argument("--incremental", action="store_true",
+		help="keep a checkpoint next to the output, so the next run on a "
+		     "newer export of the same account only converts the new rows")
+	cli.add_argument("-j", "--jobs", type=positive, metavar="N",
+		help="organize transactions on N processes "
+		     "(in batch, convert N files at a time, defaults to one per CPU)")
+	cli.add_argument("--stats", action="store_true",
+		help="print time, memory and item counts of each stage to stderr")
+	cli.add_argument("--stats-json", metavar="PATH",
+		help="write the same numbers as JSON")
+	cli.add_argument("--profile", metavar="PATH",
+		help="dump cProfile stats to PATH and a tracemalloc snapshot "
+		     "to PATH.tracemalloc")
+	cli.add_argument("--cache", action="store_true",
+		help="keep this conversion in a cache, and write the outputs from "
+		     "there if the same file was converted that way before")
+	cli.add_argument("--tolerant", action="store_true",
+		help="instead of failing, write every transaction that could be "
+		     "completed, and set aside the rows that could not be converted "
+		     "in a rejects file next to the output, with their row numbers")
+	cli.add_argument("--rejects", metavar="PATH",
+		help="where --tolerant writes the rejects (implies --tolerant)")
+	cli.add_argument("--trade-window", type=float, metavar="SECONDS",
+		help="give up on trades still incomplete once operations are SECONDS "
+		     "newer, which bounds the trades kept open on long histories")
+	return cli.parse_args(argv)
@@ -0,0 +1,157 @@
+"""
+Compressed exports and outputs, decompressed and compressed as they are
+read and written, with the standard library. Inputs are recognized by
+their first bytes, outputs by their extension. Codecs are only imported
+once a compressed file shows up.
+"""
+import os
+
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import IO, TYPE_CHECKING, Any, Callable, Iterator
+
+if TYPE_CHECKING:
+	import zipfile
+
+
+SPILL_IN_MEMORY = 64 * 1024 * 1024 # bytes, beyond that spilled to a temporary file
+CHUNK_SIZE      = 1024 * 1024
+
+MAGIC = {
+	b"\x1f\x8b":          "gzip",
+	b"BZh":               "bz2",
+	b"\xfd7zXZ\x00":      "xz",
+	b"\x28\xb5\x2f\xfd":  "zstd",
+	b"PK\x03\x04":        "zip",
+}
+
+EXTENSIONS = {
+	".gz":  "gzip",
+	".bz2": "bz2",
+	".xz":  "xz",
+	".zst": "zstd",
+	".zip": "zip",
+}
+
+
+def detect(head: bytes) -> str | None:
+	"""Compression of a file starting with these bytes, None if there is none."""
+	for magic, codec in MAGIC.items():
+		if head.startswith(magic):
+			return codec
+	return None
+
+
+def codec_of(path: str) -> str | None:
+	return EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def strip_extension(path: str) -> tuple[str, str]:
+	"""Splits "export.csv.gz" into "export.csv" and ".gz"."""
+	base, extension = os.path.splitext(path)
+	if extension.lower() in EXTENSIONS:
+		return base, extension
+	return path, ""
+
+
+def unsupported(codec: str | None) -> str | None:
+	"""Why this Python can't handle the codec, None if it can."""
+	if codec == "zstd" and zstd() is None:
+		return "Zstandard files require Python 3.14 or later"
+	return None
+
+
+def spill(stream: IO[bytes]) -> IO[bytes]:
+	"""
+	Copy of a stream that can only be read forwards, to be read backwards.
+	It is held in memory up to SPILL_IN_MEMORY bytes, and in a temporary
+	file beyond that, which is deleted once closed.
+	"""
+	import shutil
+	import tempfile
+
+	copy = tempfile.SpooledTemporaryFile(SPILL_IN_MEMORY)
+	shutil.copyfileobj(stream, copy, CHUNK_SIZE)
+	copy.seek(0)
+	return copy
+
+
+def decompressed(f: IO[bytes], codec: str) -> IO[bytes]:
+	"""
+	Spilled copy of the decompressed contents. Zip archives need to be
+	seekable, and hold the export as their only, or first, CSV file.
+	"""
+	if codec == "zip":
+		import zipfile
+
+		archive = zipfile.ZipFile(f if f.seekable() else spill(f))
+		with archive, archive.open(zip_member(archive)) as member:
+			return spill(member)
+
+	with opener(codec)(f, "rb") as stream:
+		return spill(stream)
+
+
+def zip_member(archive: "zipfile.ZipFile") -> "zipfile.ZipInfo":
+	files = [i for i in archive.infolist() if not i.is_dir()]
+	csvs  = [i for i in files if i.filename.lower().endswith(".csv")]
+	if not files:
+		raise ValueError("Empty zip archive")
+	return (csvs or files)[0]
+
+
+def opener(codec: str) -> Callable[[Any, str], IO[bytes]]:
+	"""gzip.open or its equivalent, taking a path or a binary file."""
+	message = unsupported(codec)
+	if message:
+		raise ImportError(message)
+	if codec == "zstd":
+		return zstd().open # type: ignore[no-any-return]
+	if codec == "bz2":
+		import bz2
+
+		return bz2.open # type: ignore[return-value]
+	if codec == "xz":
+		import lzma
+
+		return lzma.open # type: ignore[return-value]
+	return open_gzip
+
+
+def open_gzip(file: Any, mode: str) -> IO[bytes]:
+	"""Same default level as the gzip command, as the highest is much slower."""
+	import gzip
+
+	return gzip.open(file, mode, compresslevel=6) # type: ignore[return-value]
+
+
+@lru_cache(maxsize=None)
+def zstd() -> Any:
+	"""compression.zstd, from Python 3.14 on, None before that."""
+	try:
+		import importlib
+
+		return importlib.import_module("compression.zstd")
+	except ImportError: # pragma: no cover
+		return None
+
+
+@contextmanager
+def compressing(path: str, codec: str) -> Iterator[IO[bytes]]:
+	"""
+	Binary stream compressing what is written into path. Zip archives get
+	a single file, named after the archive.
+	"""
+	if codec == "zip":
+		import zipfile
+
+		name, _ = strip_extension(os.path.basename(path))
+		if not name.lower().endswith(".csv"):
+			name += ".csv"
+		with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+			with archive.open(name, "w", force_zip64=True) as member:
+				yield member
+		return
+
+	with opener(codec)(path, "wb") as stream:
+		yield stream
@@ -1,9 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
-from decimal import Decimal
-from typing import cast
 
-from .transaction import Transaction, group_by_timestamp
+from .transaction import Transaction, Builder, Record, Totals
+from .amount import Amount
 from .operation import Operation
 
 
@@ -28,21 +27,33 @@ class Exchange(Transaction):
 		])
 
 
-	def format(self) -> list[str]:
-		return [
-			self.formatted_date,           # Date
-			f"{self.base_asset.amount}",   # Sent Amount
-			f"{self.base_asset.symbol}",   # Sent Currency
-			f"{self.quote_asset.amount}",  # Received Amount
-			f"{self.quote_asset.symbol}",  # Received Currency
-			f"{self.exchange_fee.amount}", # Fee Amount
-			f"{self.exchange_fee.symbol}", # Fee Currency
-			"",                            # Net Worth Amount
-			"",                            # Net Worth Currency
-			"exchange",                    # Label
-			self.base_asset.summary,       # Description
-			"",                            # TxHash
-		]
+	@property
+	def amounts(self) -> tuple[Amount, ...]:
+		return (
+			self.base_asset.amount,
+			self.quote_asset.amount,
+			self.exchange_fee.amount)
+
+
+	def with_amounts(self, amounts: list[Amount]) -> "Exchange":
+		base, quote, fee = amounts
+		return Exchange(
+			base_asset   = replace(self.base_asset,   amount=base),
+			quote_asset  = replace(self.quote_asset,  amount=quote),
+			exchange_fee = replace(self.exchange_fee, amount=fee))
+
+
+	def record(self) -> Record:
+		return Record(
+			date              = self.date,
+			sent_amount       = self.base_asset.amount,
+			sent_currency     = self.base_asset.symbol,
+			received_amount   = self.quote_asset.amount,
+			received_currency = self.quote_asset.symbol,
+			fee_amount        = self.exchange_fee.amount,
+			fee_currency      = self.exchange_fee.symbol,
+			label             = "exchange",
+			description       = self.base_asset.summary)
 
 
 class PartialExchange:
@@ -65,38 +76,47 @@ class PartialExchange:
 		return Exchange(**vars(self))
 
 
-def build(ops: list[Operation]) -> list[Exchange]:
-	exchanges = []
-	partial   = None
+class ExchangeBuilder(Builder[Exchange]):
+	def __init__(self) -> None:
+		self.totals:    Totals[Exchange] = Totals()
+		self.partial:   PartialExchange | None = None
 
-	for op in ops:
-		if not partial:
-			partial = PartialExchange(op)
-			continue
+
+	def add(self, op: Operation) -> None:
+		if not self.partial:
+			self.partial = PartialExchange(op)
+			return
 
 		if op.is_exchange_fee():
-			partial.exchange_fee = op
+			self.partial.exchange_fee = op
 		else:
-			partial.quote_asset = op
+			self.partial.quote_asset = op
+
+		if self.partial.is_completed():
+			self.totals.add(self.partial.complete())
+			self.partial = None
 
-		if partial.is_completed():
-			exchanges.append(partial.complete())
-			partial = None
 
-	if partial:
-		raise ValueError("Incomplete Exchange", partial)
+	def is_idle(self) -> bool:
+		return self.partial is None
 
-	groups = group_by_timestamp(cast(list[Transaction], exchanges))
-	return [combine(cast(list[Exchange], g)) for g in groups.values()]
 
+	def collect(self) -> list[Exchange]:
+		if self.partial:
+			raise ValueError("Incomplete Exchange", self.partial)
+		return self.totals.collect()
 
-def combine(lst: list[Exchange]) -> Exchange:
-	base  = lst[0].base_asset
-	quote = lst[0].quote_asset
-	fee   = lst[0].exchange_fee
 
-	base.amount  = Decimal(sum(i.base_asset.amount   for i in lst))
-	quote.amount = Decimal(sum(i.quote_asset.amount  for i in lst))
-	fee.amount   = Decimal(sum(i.exchange_fee.amount for i in lst))
+	def leftovers(self) -> list[list[Operation]]:
+		if not self.partial:
+			return []
+		p = self.partial
+		return [[op for op in (p.base_asset, p.quote_asset, p.exchange_fee) if op]]
+
+
+def build(ops: list[Operation]) -> list[Exchange]:
+	builder = ExchangeBuilder()
+	for op in ops:
+		builder.add(op)
+	return builder.collect()
 
-	return Exchange(base_asset=base, quote_asset=quote, exchange_fee=fee)
@@ -0,0 +1,174 @@
+"""
+Incremental conversion of NovaDAX exports that only ever gain new rows.
+NovaDAX lists the newest operations first, so the rows already converted
+are always the ones at the end of the file.
+"""
+import csv
+import hashlib
+import json
+import os
+import shutil
+
+from dataclasses import asdict, dataclass
+from itertools import chain
+from typing import BinaryIO, Iterable
+
+from . import __version__
+from .main import BUILDERS, collect_window
+from .operation import Operation, CATEGORY
+from .reader import LINE_BREAK, header_size, parse_line, reversed_lines
+from .writers import KOINLY_UNIVERSAL_HEADERS, koinly_rows, staged
+
+
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+
+@dataclass
+class Checkpoint:
+	version:     str
+	tail_size:   int # bytes at the end of the input already converted
+	tail_sha256: str
+	output_size: int # bytes of the output written before the open window
+	window:      list[list[str]] # rows of the open window
+
+
+	@classmethod
+	def load(cls, path: str) -> "Checkpoint | None":
+		"""Missing, unreadable or outdated checkpoints are ignored."""
+		try:
+			with open(path, "r", encoding="utf-8") as f:
+				checkpoint = cls(**json.load(f))
+		except (OSError, ValueError, TypeError):
+			return None
+		return checkpoint if checkpoint.version == __version__ else None
+
+
+	def save(self, path: str) -> None:
+		temporary = path + ".tmp"
+		with open(temporary, "w", encoding="utf-8") as f:
+			json.dump(asdict(self), f)
+		os.replace(temporary, path)
+
+
+def checkpoint_path(output_file: str) -> str:
+	return output_file + CHECKPOINT_SUFFIX
+
+
+def convert_incrementally(input_file: str, output_file: str) -> tuple[int, int]:
+	"""
+	Resumes from the checkpoint of the previous run, when the input still
+	ends with the rows it converted: only the new rows are parsed, and
+	the output is cut back to where the still open window began.
+	Otherwise the whole file is converted again.
+	The output is staged, so a failure leaves it and its checkpoint as
+	they were. It is replaced before the checkpoint, which stays valid
+	for it, as the output only grows past where the window began.
+	Returns the number of new rows parsed, and of rows held back in the
+	checkpoint because the last window still awaits matches.
+	"""
+	path = checkpoint_path(output_file)
+
+	with open(input_file, "rb") as f:
+		start = header_size(f)
+		end   = f.seek(0, os.SEEK_END)
+
+		checkpoint = Checkpoint.load(path)
+		if checkpoint and not can_resume(f, checkpoint, start, end, output_file):
+			checkpoint = None
+
+		resumed  = checkpoint.window if checkpoint else []
+		new_rows = (
+			parse_line(line) for line in
+			reversed_lines(f, start=start, end=end - checkpoint.tail_size if checkpoint else end)
+		)
+
+		with staged([output_file]) as (staging,):
+			if checkpoint:
+				shutil.copyfile(output_file, staging)
+				with open(staging, "r+b") as out:
+					out.truncate(checkpoint.output_size)
+
+			read, output_size, window, held = write_windows(
+				staging, chain(resumed, new_rows), append=checkpoint is not None)
+
+		Checkpoint(
+			version     = __version__,
+			tail_size   = end - start,
+			tail_sha256 = digest(f, start, end),
+			output_size = output_size,
+			window      = window,
+		).save(path)
+
+	return read - len(resumed), held
+
+
+def can_resume(f: BinaryIO, checkpoint: Checkpoint, start: int, end: int, output_file: str) -> bool:
+	tail_start = end - checkpoint.tail_size
+	if tail_start < start or not os.path.isfile(output_file):
+		return False
+
+	# the converted rows must begin right after a line break
+	if tail_start > start:
+		f.seek(tail_start - 1)
+		if not LINE_BREAK.match(f.read(1)):
+			return False
+
+	return (os.path.getsize(output_file) >= checkpoint.output_size
+		and digest(f, tail_start, end) == checkpoint.tail_sha256)
+
+
+def digest(f: BinaryIO, start: int, end: int, block_size: int = 1024 * 1024) -> str:
+	sha256 = hashlib.sha256()
+	f.seek(start)
+	while start < end:
+		block  = f.read(min(block_size, end - start))
+		start += len(block)
+		sha256.update(block)
+	return sha256.hexdigest()
+
+
+def write_windows(
+	output_file: str,
+	rows: Iterable[list[str]],
+	append: bool,
+) -> tuple[int, int, list[list[str]], int]:
+	"""
+	Same windows as stream_transactions, but the rows of the last one are
+	kept, along with the size of the output before it was written, so the
+	next run can rebuild it with whatever new operations it receives.
+	A last window still awaiting matches, such as a trade whose fee comes
+	in the next export, is left out of the output until then.
+	Returns the number of rows read, the output size, the last window and
+	the number of its rows held back.
+	"""
+	builders  = {c: builder() for c, builder in BUILDERS.items()}
+	last_date = None
+	window: list[list[str]] = []
+	read = 0
+
+	with open(output_file, "a" if append else "w", encoding="utf-8", newline="\n") as f:
+		writer = csv.writer(f)
+		if not append:
+			writer.writerow(KOINLY_UNIVERSAL_HEADERS)
+
+		for row in rows:
+			read += 1
+			op = Operation.from_csv_row(row)
+			if not op.is_successful():
+				continue
+
+			if op.date != last_date and all(b.is_idle() for b in builders.values()):
+				writer.writerows(koinly_rows(collect_window(builders)))
+				window = []
+			last_date = op.date
+
+			builders[CATEGORY[op.type]].add(op)
+			window.append(row)
+
+		f.flush()
+		output_size = f.tell()
+		if not all(b.is_idle() for b in builders.values()):
+			return read, output_size, window, len(window)
+		writer.writerows(koinly_rows(collect_window(builders)))
+
+	return read, output_size, window, 0
@@ -1,93 +1,524 @@
 import re
 import sys
 import os
-import csv
+import heapq
+import math
 
+from argparse import Namespace
+from datetime import timedelta
 from collections import defaultdict
-from typing import cast, Any
-from pprint import pformat
+from functools import partial
+from contextlib import AbstractContextManager, nullcontext, redirect_stdout
+from typing import (
+	TYPE_CHECKING, Any, Callable, Iterable, Iterator, Mapping, NoReturn, Sequence)
 
-from . import __version__, swap, trade, exchange, nontrade
-from .transaction import Transaction
-from .operation import Operation
+from . import cli, swap, trade, exchange, nontrade
+from .transaction import Transaction, Builder
+from .operation import Operation, CATEGORY
+from .reader import STDIO, read_numbered, read_successful
+from .compressed import codec_of, strip_extension, unsupported
+from .batch import OUTPUT_SUFFIX, convert_many, expand_inputs, is_batch
+from .writers import (
+	KoinlyWriter, column_batches, staged, unwritable, write_batches,
+	write_transactions, writer_for)
+
+if TYPE_CHECKING:
+	from .cache import Entry
 
 
 CSV = list[list[str]]
 
+Built = list[list[Transaction]] # one chronological list per category
+
 
 def main() -> None:
-	if len(sys.argv) != 2:
-		print("Usage: nd2k <novadax-csv>")
-		exit(1)
+	"""Same as the nd2k command."""
+	cli.main()
+
+
+def run(args: Namespace) -> None:
+	check_combinations(args)
+	trade_window = checked_trade_window(args.trade_window)
+
+	if is_batch(args.inputs):
+		run_batch(args)
 
-	if sys.argv[1] in ["-v", "--version"]:
-		print(__version__)
-		exit(0)
+	input_file = args.inputs[0]
+	outputs    = args.output or [output_path(input_file)]
+	check_files(input_file, outputs)
+	run_single(args, input_file, outputs, trade_window)
 
-	input_file = sys.argv[1]
 
-	if not os.path.exists(input_file):
-		print(f"Error: No such file: {input_file}")
-		exit(1)
+def run_single(
+	args:         Namespace,
+	input_file:   str,
+	outputs:      list[str],
+	trade_window: timedelta | None,
+) -> None:
+	if is_tolerant(args):
+		run_tolerantly(args, input_file, outputs, trade_window)
+	elif args.incremental:
+		run_incrementally(input_file, outputs)
+	elif args.stream:
+		stream(input_file, outputs, trade_window)
+	elif wants_stats(args):
+		with messages_away_from(*outputs):
+			convert_with_stats(input_file, outputs, args)
+	else:
+		organize = organizer(args.jobs or 1, trade_window)
+		convert_to(input_file, outputs, organize, args.cache, trade_window)
 
-	csv_rows     = read(input_file)
-	transactions = organize_rows(csv_rows)
-	ordered      = order_by_date(transactions)
-	formatted    = koinly_universal_format(ordered)
 
-	output_file = re.sub(r"\.csv$", "", input_file) + "_koinly_universal.csv"
-	write(output_file, formatted)
+def organizer(jobs: int, trade_window: timedelta | None) -> "Organize":
+	if jobs > 1:
+		return partial(organize_in_parallel, jobs=jobs)
+	return reading(partial(organize_rows, trade_window=trade_window))
+
+
+def refuse(message: str) -> NoReturn:
+	print(f"Error: {message}")
+	exit(1)
+
 
+def is_tolerant(args: Namespace) -> bool:
+	return bool(args.tolerant or args.rejects is not None)
 
-def read(path: str) -> CSV:
+
+def wants_stats(args: Namespace) -> bool:
+	return bool(args.stats or args.stats_json or args.profile)
+
+
+def check_combinations(args: Namespace) -> None:
+	"""Refuses any option the mode run picks for args makes no use of."""
+	if is_batch(args.inputs) and args.output:
+		refuse("--output takes a single input file")
+
+	picked = mode(args)
+	if picked is None:
+		return
+	name, takes = picked
+	for option in given_options(args):
+		if option not in takes:
+			refuse(f"{option} can't be combined with {name}")
+
+
+def mode(args: Namespace) -> tuple[str, list[str]] | None:
 	"""
-	The NovaDAX CSV file must be read in reverse order to
-	correctly match trades with their corresponding fees.
+	The mode run picks for args, as named in messages, and the options it
+	takes. None for regular conversions, which take every option.
 	"""
-	with open(path, "r", encoding="utf-8", errors="ignore") as f:
-		return list(reversed(list(csv.reader(f))[1:]))
+	if is_batch(args.inputs):
+		return "batches", ["--jobs", "--cache"]
+	if is_tolerant(args):
+		return "--tolerant", ["--tolerant", "--rejects", "--output", "--cache", "--trade-window"]
+	if args.incremental:
+		return "--incremental", ["--incremental", "--output"]
+	if args.stream:
+		return "--stream", ["--stream", "--output", "--trade-window"]
+	if wants_stats(args):
+		return "--stats, --stats-json or --profile", [
+			"--stats", "--stats-json", "--profile", "--output"]
+	if (args.jobs or 1) > 1:
+		return "--jobs", ["--jobs", "--output", "--cache"]
+	return None
 
 
-def organize_rows(rows: CSV) -> list[Transaction]:
-	operations  = parse_successful_rows(rows)
-	categorized = categorize_by_type(operations)
+def given_options(args: Namespace) -> list[str]:
+	"""Options given on the command line, as named there."""
+	options = {
+		"--output":       args.output,
+		"--stream":       args.stream,
+		"--incremental":  args.incremental,
+		"--jobs":         args.jobs is not None,
+		"--stats":        args.stats,
+		"--stats-json":   args.stats_json is not None,
+		"--profile":      args.profile is not None,
+		"--cache":        args.cache,
+		"--tolerant":     args.tolerant,
+		"--rejects":      args.rejects is not None,
+		"--trade-window": args.trade_window is not None,
+	}
+	return [option for option, given in options.items() if given]
+
 
+def checked_trade_window(seconds: float | None) -> timedelta | None:
+	if seconds is None:
+		return None
+	if not math.isfinite(seconds):
+		refuse("--trade-window must be a finite number of seconds")
+	if seconds < 0:
+		refuse("--trade-window can't be negative")
 	try:
-		swaps     = swap.build(categorized["swaps"])
-		trades    = trade.build(categorized["trades"])
-		exchanges = exchange.build(categorized["exchanges"])
-		nontrades = nontrade.build(categorized["nontrades"])
+		return timedelta(seconds=seconds)
+	except OverflowError:
+		refuse("--trade-window is too large")
+
+
+def run_batch(args: Namespace) -> NoReturn:
+	report = convert_many(
+		expand_inputs(args.inputs), partial(convert, cache=args.cache), args.jobs)
+	print(report.summary())
+	exit(0 if report.succeeded() else 1)
+
+
+def check_files(input_file: str, outputs: list[str]) -> None:
+	if input_file != STDIO and not os.path.exists(input_file):
+		refuse(f"No such file: {input_file}")
+
+	for message in [unsupported(codec_of(f)) for f in (input_file, *outputs)] + [
+		unwritable(f) for f in outputs
+	]:
+		if message:
+			refuse(message)
+
+	if outputs.count(STDIO) > 1:
+		refuse("Only one output can go to standard output")
+
+
+def run_tolerantly(
+	args:         Namespace,
+	input_file:   str,
+	outputs:      list[str],
+	trade_window: timedelta | None,
+) -> None:
+	from .tolerant import rejects_path
+
+	if args.rejects is None and outputs[0] == STDIO:
+		refuse("--rejects must tell where the rejects go when the output is -")
+	rejects_file = args.rejects or rejects_path(outputs[0])
+	if rejects_file in outputs:
+		refuse("The rejects must go elsewhere than the outputs")
+	convert_tolerantly(input_file, outputs, rejects_file, trade_window, cache=args.cache)
+
+
+def run_incrementally(input_file: str, outputs: list[str]) -> None:
+	if len(outputs) > 1 or writer_for(outputs[0]) is not KoinlyWriter:
+		refuse("--incremental writes a single Koinly CSV")
+	output_file = outputs[0]
+	if STDIO in (input_file, output_file) or codec_of(input_file) or codec_of(output_file):
+		refuse("--incremental needs uncompressed input and output files")
+	convert_incrementally(input_file, output_file)
+
+
+def output_path(input_file: str) -> str:
+	"""Compressed inputs get outputs compressed the same way."""
+	if input_file == STDIO:
+		return STDIO
+	base, compression = strip_extension(input_file)
+	return re.sub(r"\.csv$", "", base) + OUTPUT_SUFFIX + compression
+
+
+def messages_away_from(*outputs: str) -> AbstractContextManager[Any]:
+	"""Messages go to standard error while an output goes to standard output."""
+	if STDIO in outputs:
+		return redirect_stdout(sys.stderr)
+	return nullcontext()
+
+
+def convert(
+	input_file:  str,
+	output_file: str | None = None,
+	cache:       bool = False,
+) -> tuple[int, int]:
+	"""
+	Same as a regular run, but failures are raised instead of reported.
+	Returns the number of successful rows read and transactions written.
+	"""
+	return convert_to(
+		input_file, [output_file or output_path(input_file)], reading(organize_or_raise), cache)
+
+
+def organize_or_raise(rows: CSV) -> Built:
+	return collect_routed(route(iter_successful_operations(rows)))
+
+
+Organize = Callable[[str], tuple[int, Built]] # the input file to rows read and transactions
+
+
+def reading(organize: Callable[[CSV], Built]) -> Organize:
+	"""Organizes the successful rows of the input, all read on this process."""
+	def read_and_organize(input_file: str) -> tuple[int, Built]:
+		rows = list(read_successful(input_file))
+		return len(rows), organize(rows)
+	return read_and_organize
+
+
+def convert_to(
+	input_file:   str,
+	outputs:      list[str],
+	organize:     Organize,
+	cache:        bool,
+	trade_window: timedelta | None = None,
+) -> tuple[int, int]:
+	"""
+	With cache, outputs are written from an earlier conversion of the same
+	input, when there is one, and otherwise this conversion is kept for later.
+	The trade window organize was given tells conversions apart in the cache.
+	"""
+	entry, counts = cached(input_file, outputs, trade_window) if cache else (None, None)
+	if counts:
+		return counts
+
+	with messages_away_from(*outputs):
+		rows, built = organize(input_file)
+		ordered     = order_by_date(built)
+
+	write_converted(outputs, ordered, rows, entry)
+	return rows, len(ordered)
+
+
+def convert_tolerantly(
+	input_file:   str,
+	outputs:      list[str],
+	rejects_file: str,
+	trade_window: timedelta | None,
+	cache:        bool,
+) -> None:
+	"""
+	Same as convert_to, but whatever can't be converted goes to rejects_file,
+	instead of failing the conversion. Conversions with rejects aren't cached.
+	"""
+	from .tolerant import organize_tolerantly, summary, write_rejects
+
+	entry, counts = cached(input_file, outputs, trade_window) if cache else (None, None)
+	if counts: # only conversions without rejects are cached
+		write_rejects(rejects_file, [])
+		return
+
+	with messages_away_from(*outputs):
+		numbered       = list(read_numbered(input_file))
+		built, rejects = organize_tolerantly(numbered, trade_window)
+		ordered        = order_by_date(built)
+
+	write_converted(outputs, ordered, len(numbered), None if rejects else entry)
+	write_rejects(rejects_file, rejects)
+	if rejects:
+		with messages_away_from(*outputs, rejects_file):
+			print(summary(rejects, rejects_file))
+
+
+def cached(
+	input_file:   str,
+	outputs:      list[str],
+	trade_window: timedelta | None,
+) -> "tuple[Entry | None, tuple[int, int] | None]":
+	"""
+	The cache entry of the input, and the counts of the conversion it
+	wrote the outputs from, if it held one.
+	"""
+	from .cache import lookup
+
+	entry = lookup(input_file, trade_window)
+	return entry, entry.write(outputs) if entry else None
+
+
+def write_converted(
+	outputs: list[str],
+	ordered: list[Transaction],
+	rows:    int,
+	entry:   "Entry | None",
+) -> None:
+	"""Also keeps the conversion in the cache entry, if given one."""
+	if entry is None:
+		write_transactions(outputs, ordered)
+		return
+
+	batches = list(column_batches(ordered))
+	write_batches(outputs, batches)
+	entry.store((rows, len(ordered)), batches, outputs)
+
+
+def organize_rows(rows: CSV, trade_window: timedelta | None = None) -> Built:
+	routed = route(iter_successful_operations(rows), trade_window)
+	try:
+		return collect_routed(routed)
+	except ValueError as e:
+		organize_rows_failed(e.args)
+
+
+def organize_in_parallel(input_file: str, jobs: int) -> tuple[int, Built]:
+	"""Rows are read and parsed on a pool of processes as well, see parse_in_parallel."""
+	from .parallel import parse_in_parallel
+
+	rows, operations = parse_in_parallel(input_file, jobs)
+	try:
+		return rows, build_transactions_in_parallel(categorize_by_type(operations), jobs)
+	except ValueError as e:
+		organize_rows_failed(e.args)
+
+
+def convert_incrementally(input_file: str, output_file: str) -> None:
+	from .incremental import convert_incrementally
+
+	try:
+		_, held = convert_incrementally(input_file, output_file)
+	except ValueError as e:
+		organize_rows_failed(e.args)
+
+	if held:
+		print(f"{held} rows still await a match, so they are left out of the "
+		      "output until the next run")
+
+
+def convert_with_stats(input_file: str, outputs: list[str], args: Namespace) -> None:
+	from . import profiling
+
+	try:
+		stats = profiling.convert_with_stats(input_file, outputs, args.profile)
 	except ValueError as e:
 		organize_rows_failed(e.args)
 
-	return cast(list[Transaction], trades + swaps + exchanges + nontrades)
+	if args.stats:
+		print(stats.summary(), file=sys.stderr)
+	if args.stats_json:
+		with open(args.stats_json, "w", encoding="utf-8") as f:
+			f.write(stats.to_json())
+
+
+def build_transactions_in_parallel(
+	categorized: dict[str, list[Operation]],
+	jobs: int
+) -> Built:
+	from .parallel import build_in_parallel
+
+	built = build_in_parallel(
+		[(builder, categorized[c]) for c, builder in BUILDERS.items()], jobs)
+	return in_output_order(dict(zip(BUILDERS, built)))
+
 
+def parse_successful_rows(rows: Iterable[list[str]]) -> list[Operation]:
+	return list(iter_successful_operations(rows))
 
-def parse_successful_rows(rows: CSV) -> list[Operation]:
-	operations = []
+
+def iter_successful_operations(rows: Iterable[list[str]]) -> Iterator[Operation]:
 	for row in rows:
 		op = Operation.from_csv_row(row)
 		if op.is_successful():
-			operations.append(op)
-	return operations
+			yield op
+
+
+# in the order categories are built, and their errors reported
+BUILDERS: dict[str, type[Builder[Any]]] = {
+	"swaps":     swap.SwapBuilder,
+	"trades":    trade.TradeBuilder,
+	"exchanges": exchange.ExchangeBuilder,
+	"nontrades": nontrade.NonTradeBuilder,
+}
 
 
 def categorize_by_type(ops: list[Operation]) -> dict[str, list[Operation]]:
 	categorized = defaultdict(list)
-	conditions  = {
-		"swaps":     "is_a_swap",
-		"trades":    "belongs_to_trade",
-		"exchanges": "belongs_to_an_exchange",
-		"nontrades": "is_a_non_trade"
-	}
 	for op in ops:
-		for category, condition in conditions.items():
-			if getattr(op, condition)():
-				categorized[category].append(op)
+		categorized[CATEGORY[op.type]].append(op)
 	return categorized
 
 
-def organize_rows_failed(leftovers: Any) -> None:
+Routed = dict[str, Builder[Any] | ValueError]
+
+
+def new_builders(trade_window: timedelta | None = None) -> dict[str, Builder[Any]]:
+	"""See TradeBuilder for trade_window."""
+	builders = {c: builder() for c, builder in BUILDERS.items()}
+	builders["trades"] = trade.TradeBuilder(trade_window)
+	return builders
+
+
+def route(ops: Iterable[Operation], trade_window: timedelta | None = None) -> Routed:
+	"""
+	Feeds each operation to the builder of its category as soon as it is
+	parsed. A builder that fails is replaced by its error, to be raised by
+	collect_routed, as if each category had been built in turn.
+	"""
+	routed: Routed = dict(new_builders(trade_window))
+
+	for op in ops:
+		category = CATEGORY[op.type]
+		builder  = routed[category]
+		if isinstance(builder, ValueError):
+			continue
+		try:
+			builder.add(op)
+		except ValueError as e:
+			routed[category] = e
+
+	return routed
+
+
+def collect_routed(routed: Mapping[str, Builder[Any] | ValueError]) -> Built:
+	built = {}
+	for category, builder in routed.items():
+		if isinstance(builder, ValueError):
+			raise builder
+		built[category] = builder.collect()
+
+	return in_output_order(built)
+
+
+def in_output_order(built: Mapping[str, list[Any]]) -> Built:
+	"""Transactions sharing a date are written in this order."""
+	return [built["trades"], built["swaps"], built["exchanges"], built["nontrades"]]
+
+
+def stream(input_file: str, outputs: list[str], trade_window: timedelta | None = None) -> None:
+	"""Outputs are only replaced once completely written, see staged."""
+	rows         = read_successful(input_file)
+	transactions = stream_transactions(rows, trade_window)
+	try:
+		with staged(outputs) as paths:
+			write_transactions(paths, transactions)
+	except Unmatched as e:
+		with messages_away_from(*outputs):
+			organize_rows_failed(e.args)
+
+
+class Unmatched(ValueError):
+	"""A builder failed, unlike the parsing of a row."""
+
+
+def stream_transactions(
+	rows:         Iterable[list[str]],
+	trade_window: timedelta | None = None,
+) -> Iterator[Transaction]:
+	"""
+	Organizes operations as they are parsed, emitting transactions every
+	time the timestamp advances while no operation awaits a match.
+	It relies on the NovaDAX CSV being in chronological order (once reversed),
+	so only the window of still open transactions is held in memory.
+	With a trade_window, a trade given up on fails the stream right away,
+	instead of keeping every window after it open until the end.
+	"""
+	builders  = new_builders(trade_window)
+	last_date = None
+
+	for op in iter_successful_operations(rows):
+		window: list[Transaction] = []
+		try:
+			if op.date != last_date:
+				for b in builders.values():
+					b.advance(op.date)
+				if all(b.is_idle() for b in builders.values()):
+					window = collect_window(builders)
+			builders[CATEGORY[op.type]].add(op)
+		except ValueError as e:
+			raise Unmatched(*e.args) from e
+		last_date = op.date
+
+		yield from window
+
+	try:
+		window = collect_window(builders)
+	except ValueError as e:
+		raise Unmatched(*e.args) from e
+	yield from window
+
+
+def collect_window(builders: dict[str, Builder[Any]]) -> list[Transaction]:
+	return order_by_date(collect_routed(builders))
+
+
+def organize_rows_failed(leftovers: Any) -> NoReturn:
+	from pprint import pformat
+
 	error_msg = "Error! The script went through all rows in the NovaDAX CSV "
 	error_msg+= "and could not find a match for the following operations:\n\n"
 
@@ -102,31 +533,10 @@ def organize_rows_failed(leftovers: Any) -> None:
 	exit(1)
 
 
-def order_by_date(lst: list[Transaction]) -> list[Transaction]:
-	return sorted(lst, key=lambda t: t.date)
-
-
-def koinly_universal_format(transactions: list[Transaction]) -> CSV:
-	rows = []
-	rows.append([ # headers
-		"Date",
-		"Sent Amount",
-		"Sent Currency",
-		"Received Amount",
-		"Received Currency",
-		"Fee Amount",
-		"Fee Currency",
-		"Net Worth Amount",
-		"Net Worth Currency",
-		"Label",
-		"Description",
-	])
-	for t in transactions:
-		rows.append(t.format())
-	return rows
-
-
-def write(path: str, contents: CSV) -> None:
-	with open(path, "w", encoding="utf-8", newline="\n") as f:
-		writer = csv.writer(f)
-		writer.writerows(contents)
+def order_by_date(built: Sequence[Iterable[Transaction]]) -> list[Transaction]:
+	"""
+	Merges categories, each one already in chronological order, which
+	leaves ties in the order of in_output_order, as a stable sort would.
+	"""
+	return list(heapq.merge(*built, key=lambda t: t.date))
+
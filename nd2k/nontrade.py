@@ -1,9 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
-from decimal import Decimal
-from typing import cast
 
-from .transaction import Transaction, group_by_timestamp
+from .transaction import Transaction, Builder, Record, Totals
+from .amount import Amount
 from .operation import Operation
 
 
@@ -26,24 +25,29 @@ class NonTrade(Transaction): # a.k.a. "Simple Transaction"
 		])
 
 
-	def format(self) -> list[str]:
+	@property
+	def amounts(self) -> tuple[Amount, ...]:
+		return (self.operation.amount,)
+
+
+	def with_amounts(self, amounts: list[Amount]) -> "NonTrade":
+		return NonTrade(operation=replace(self.operation, amount=amounts[0]))
+
+
+	def record(self) -> Record:
 		sent = self.operation if self.operation.is_sending_funds() else None
 		recv = None if sent else self.operation
 
-		return [
-			self.formatted_date,              # Date
-			f"{sent.amount if sent else ''}", # Sent Amount
-			f"{sent.symbol if sent else ''}", # Sent Currency
-			f"{recv.amount if recv else ''}", # Received Amount
-			f"{recv.symbol if recv else ''}", # Received Currency
-			"",                               # Fee Amount
-			"",                               # Fee Currency
-			"",                               # Net Worth Amount
-			"",                               # Net Worth Currency
-			self.koinly_tag(),                # Label
-			self.operation.summary,           # Description
-			"",                               # TxHash
-		]
+		return Record(
+			date              = self.date,
+			sent_amount       = sent.amount if sent else None,
+			sent_currency     = sent.symbol if sent else None,
+			received_amount   = recv.amount if recv else None,
+			received_currency = recv.symbol if recv else None,
+			fee_amount        = None,
+			fee_currency      = None,
+			label             = self.koinly_tag(),
+			description       = self.operation.summary)
 
 
 	def koinly_tag(self) -> str:
@@ -57,13 +61,30 @@ class NonTrade(Transaction): # a.k.a. "Simple Transaction"
 		}[self.operation.type.name]
 
 
-def build(ops: list[Operation]) -> list[NonTrade]:
-	nontrades = [NonTrade(operation=op) for op in ops]
-	groups = group_by_timestamp(cast(list[Transaction], nontrades))
-	return [combine(cast(list[NonTrade], g)) for g in groups.values()]
+class NonTradeBuilder(Builder[NonTrade]):
+	def __init__(self) -> None:
+		self.totals: Totals[NonTrade] = Totals()
+
+
+	def add(self, op: Operation) -> None:
+		self.totals.add(NonTrade(operation=op))
 
 
-def combine(lst: list[NonTrade]) -> NonTrade:
-	op = lst[0].operation
-	op.amount = Decimal(sum(i.operation.amount for i in lst))
-	return NonTrade(operation=op)
+	def is_idle(self) -> bool:
+		return True
+
+
+	def collect(self) -> list[NonTrade]:
+		return self.totals.collect()
+
+
+	def leftovers(self) -> list[list[Operation]]:
+		return []
+
+
+def build(ops: list[Operation]) -> list[NonTrade]:
+	builder = NonTradeBuilder()
+	for op in ops:
+		builder.add(op)
+	return builder.collect()
+
@@ -1,9 +1,12 @@
 import re
+import sys
 import unicodedata
 from dataclasses import dataclass
 from datetime import datetime
-from decimal import Decimal
 from enum import Enum
+from functools import lru_cache
+
+from .amount import Amount
 
 
 class OperationType(Enum):
@@ -21,52 +24,100 @@ class OperationType(Enum):
 	EXCHANGE_FEE    = "Taxa de Convert"
 
 
-@dataclass
+CATEGORY = {
+	OperationType.CRYPTO_DEPOSIT:  "nontrades",
+	OperationType.FIAT_DEPOSIT:    "nontrades",
+	OperationType.CRYPTO_WITHDRAW: "nontrades",
+	OperationType.FIAT_WITHDRAW:   "nontrades",
+	OperationType.WITHDRAW_FEE:    "nontrades",
+	OperationType.REDEEMED_BONUS:  "nontrades",
+	OperationType.BUY:             "trades",
+	OperationType.SELL:            "trades",
+	OperationType.TRADING_FEE:     "trades",
+	OperationType.SWAP:            "swaps",
+	OperationType.EXCHANGE:        "exchanges",
+	OperationType.EXCHANGE_FEE:    "exchanges",
+}
+
+SENDING_FUNDS = frozenset(t for t in OperationType if "WITHDRAW" in t.name)
+
+
+DATE_PATTERN   = re.compile(r"(\d\d)/(\d\d)/(\d{4}) (\d\d):(\d\d):(\d\d)\Z", re.ASCII)
+AMOUNT_PATTERN = re.compile(r"^\D*([,\d]+)")
+
+
+@dataclass(slots=True)
 class Operation:
+	"""
+	Exports hold millions of operations sharing a handful of summaries,
+	symbols and statuses, so instances have no __dict__ and these strings
+	are interned, each row pointing to a single shared copy.
+	"""
 	date:    datetime
 	type:    OperationType
 	summary: str
 	symbol:  str
-	amount:  Decimal
+	amount:  Amount
 	status:  str
 
 
 	@classmethod
 	def from_csv_row(cls, row: list[str]) -> "Operation":
-		summary = unicodedata.normalize('NFC', row[1])
+		summary, op_type = Operation.parse_summary(row[1])
 		return cls(
 			date    = Operation.parse_date(row[0]),
-			type    = OperationType(summary.split("(")[0]),
+			type    = op_type,
 			summary = summary,
-			symbol  = row[2],
+			symbol  = sys.intern(row[2]),
 			amount  = Operation.parse_amount(row[3]),
-			status  = row[4],
+			status  = sys.intern(row[4]),
 		)
 
 
 	@staticmethod
+	@lru_cache(maxsize=256)
+	def parse_summary(data: str) -> tuple[str, OperationType]:
+		"""A real export has only a few dozen distinct summaries."""
+		summary = sys.intern(unicodedata.normalize('NFC', data))
+		return summary, OperationType(summary.split("(")[0])
+
+
+	@staticmethod
+	@lru_cache(maxsize=1024)
 	def parse_date(data: str) -> datetime:
+		"""
+		Operations of the same order share their timestamp, so repeated
+		dates are served from a cache, all pointing to the same object.
+		Anything not in the exact format is left for strptime to handle.
+		"""
+		m = DATE_PATTERN.match(data)
+		if m:
+			day, month, year, hour, minute, second = map(int, m.groups())
+			try:
+				return datetime(year, month, day, hour, minute, second)
+			except ValueError:
+				pass
 		return datetime.strptime(data, "%d/%m/%Y %H:%M:%S")
 
 
 	@staticmethod
-	def parse_amount(data: str) -> Decimal:
-		pattern = r"^\D*([,\d]+)"
-		matches = re.search(pattern, data)
+	def parse_amount(data: str) -> Amount:
+		matches = AMOUNT_PATTERN.search(data)
 
-		if not matches:
+		# commas alone are no number either
+		if not matches or not matches.group(1).strip(","):
 			raise ValueError(f"No numeric values found in \"{data}\"")
 
-		parts = matches.group(1).split(",")
-		last_part = parts.pop()
+		digits = matches.group(1)
+		last_comma = digits.rfind(",")
 
 		# number has no commas, no decimals
-		if not len(parts):
-			return Decimal(last_part)
+		if last_comma < 0:
+			return Amount(int(digits))
 
 		# last comma acting as decimal separator
-		int_part = "".join(parts)
-		return Decimal(f"{int_part}.{last_part}")
+		mantissa = digits.replace(",", "")
+		return Amount(int(mantissa), len(digits) - last_comma - 1)
 
 
 	def is_successful(self) -> bool:
@@ -74,39 +125,32 @@ class Operation:
 
 
 	def is_a_non_trade(self) -> bool:
-		return self.type.name in [
-			"CRYPTO_DEPOSIT",
-			"FIAT_DEPOSIT",
-			"CRYPTO_WITHDRAW",
-			"FIAT_WITHDRAW",
-			"WITHDRAW_FEE",
-			"REDEEMED_BONUS",
-		]
+		return CATEGORY[self.type] == "nontrades"
 
 
 	def is_a_swap(self) -> bool:
-		return self.type.name == "SWAP"
+		return self.type is OperationType.SWAP
 
 
 	def is_an_exchange(self) -> bool:
-		return self.type.name == "EXCHANGE"
+		return self.type is OperationType.EXCHANGE
 
 
 	def is_exchange_fee(self) -> bool:
-		return self.type.name == "EXCHANGE_FEE"
+		return self.type is OperationType.EXCHANGE_FEE
 
 
 	def belongs_to_an_exchange(self) -> bool:
-		return self.is_an_exchange() or self.is_exchange_fee()
+		return CATEGORY[self.type] == "exchanges"
 
 
 	def belongs_to_trade(self) -> bool:
-		return self.type.name in ["BUY", "SELL"] or self.is_trading_fee()
+		return CATEGORY[self.type] == "trades"
 
 
 	def is_trading_fee(self) -> bool:
-		return self.type.name == "TRADING_FEE"
+		return self.type is OperationType.TRADING_FEE
 
 
 	def is_sending_funds(self) -> bool:
-		return "WITHDRAW" in self.type.name
+		return self.type in SENDING_FUNDS
@@ -0,0 +1,349 @@
+import gc
+import os
+import sys
+
+from array import array
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Iterator, NamedTuple
+
+from .amount import Amount
+from .compressed import detect
+from .transaction import Transaction, Builder
+from .operation import Operation, OperationType
+from .reader import (
+	BLOCK_SIZE, LINE_BREAK, STDIO, header_size, open_source, read_successful,
+	successful_rows)
+
+
+BuilderClass = type[Builder[Any]]
+
+WINDOW_SIZE = 5000
+CHUNK_SIZE  = 1024 * 1024 # bytes, at least, parsed by each process at a time
+
+TYPES     = list(OperationType)
+TYPE_CODE = {t: i for i, t in enumerate(TYPES)}
+STATUS    = "Sucesso" # of every operation parsed
+
+# columns of the operations parsed by each process, widest first, so each
+# one starts aligned when laid out one after the other
+TYPECODES = "qqIIhB" # dates, mantissas, summaries, symbols, scales, types
+INT64     = 2 ** 63
+
+
+def build_in_parallel(
+	categories: list[tuple[BuilderClass, list[Operation]]],
+	jobs: int,
+	window_size: int = WINDOW_SIZE,
+) -> list[list[Transaction]]:
+	"""
+	Builds every category, window by window, on a pool of processes.
+	Results and errors are identical to building each category serially.
+	"""
+	with ProcessPoolExecutor(jobs) as pool:
+		submitted = []
+		for builder, ops in categories:
+			windows = split_in_windows(ops, window_size)
+			futures = [
+				pool.submit(build_window, builder, w, i == len(windows) - 1)
+				for i, w in enumerate(windows)
+			]
+			submitted.append((builder, windows, futures))
+
+		return [resolve(*s) for s in submitted]
+
+
+def split_in_windows(ops: list[Operation], size: int) -> list[list[Operation]]:
+	"""
+	Only cuts where every operation behind is older than every operation
+	ahead, so no group of transactions sharing a timestamp is split apart.
+	"""
+	earliest_ahead = [op.date for op in ops]
+	for i in range(len(ops) - 2, -1, -1):
+		earliest_ahead[i] = min(earliest_ahead[i], earliest_ahead[i + 1])
+
+	windows: list[list[Operation]] = []
+	start = 0
+	latest_behind = None
+
+	for i, op in enumerate(ops):
+		if (i - start >= size
+			and latest_behind is not None
+			and latest_behind < earliest_ahead[i]):
+			windows.append(ops[start:i])
+			start = i
+
+		if latest_behind is None or op.date > latest_behind:
+			latest_behind = op.date
+
+	if start < len(ops):
+		windows.append(ops[start:])
+	return windows
+
+
+def build_window(
+	builder_class: BuilderClass,
+	ops: list[Operation],
+	is_last: bool,
+) -> list[Transaction] | None:
+	"""
+	Returns None when an operation still awaits a match at the end of the
+	window, meaning the window must be built again, carrying on into the next.
+	"""
+	builder = builder_class()
+	for op in ops:
+		builder.add(op)
+
+	if not builder.is_idle() and not is_last:
+		return None
+	return builder.collect()
+
+
+def resolve(
+	builder_class: BuilderClass,
+	windows: list[list[Operation]],
+	futures: list[Future[list[Transaction] | None]],
+) -> list[Transaction]:
+	"""
+	Each window starts from an idle builder, just like in a serial run,
+	as long as the window before it has ended idle too. When it has not,
+	that window is built again on this process, and the builder carries on
+	into the windows after it until it ends one idle, so every operation is
+	added at most twice, however long it awaits its match.
+	"""
+	built:   list[Transaction]   = []
+	carried: Builder[Any] | None = None
+
+	for ops, future in zip(windows, futures):
+		if carried is None:
+			result = future.result()
+			if result is not None:
+				built.extend(result)
+				continue
+			carried = builder_class()
+
+		for op in ops:
+			carried.add(op)
+		if carried.is_idle():
+			built.extend(carried.collect())
+			carried = None
+
+	if carried is not None:
+		built.extend(carried.collect()) # fails just like a serial run
+	return built
+
+
+class Encoded(NamedTuple):
+	"""Operations parsed by a process, as columns in shared memory."""
+	name:       str # of the shared memory block, empty when there are no operations
+	rows:       int # successful rows read
+	operations: int
+	summaries:  list[str]
+	symbols:    list[str]
+	big:        dict[int, int] # mantissas beyond 64 bits, by position
+
+
+def parse_in_parallel(
+	path: str,
+	jobs: int,
+	chunk_size: int = CHUNK_SIZE,
+) -> tuple[int, list[Operation]]:
+	"""
+	Same successful rows read and operations parsed as read_successful and
+	parse_successful_rows, with the file split in ranges of whole lines,
+	each one read and parsed on a pool of processes. Operations come back
+	as columns of numbers in shared memory instead of pickled objects, and
+	the ranges are put back together from the last one to the first.
+	Standard input, compressed and small files are parsed on this process.
+	"""
+	ranges = split_in_ranges(path, jobs * 4, chunk_size)
+	if len(ranges) < 2:
+		rows = list(read_successful(path))
+		return len(rows), successful_operations(rows)
+
+	# shared by the processes of the pool, so each block of shared memory
+	# is tracked once, and freed once decoded, whichever process created it
+	resource_tracker.ensure_running()
+
+	with ProcessPoolExecutor(jobs) as pool:
+		futures = [pool.submit(parse_range, path, start, end) for start, end in ranges]
+		try:
+			parsed = [decode(f.result()) for f in reversed(futures)]
+		finally:
+			for f in futures:
+				release(f)
+
+	return sum(rows for rows, _ in parsed), [op for _, ops in parsed for op in ops]
+
+
+def file_size(path: str) -> int:
+	"""Of plain files, which can be read from anywhere, 0 for anything else."""
+	if path == STDIO:
+		return 0
+	with open(path, "rb") as f:
+		if detect(f.read(8)):
+			return 0
+		f.seek(0, os.SEEK_END)
+		return f.tell()
+
+
+def split_in_ranges(path: str, pieces: int, chunk_size: int = CHUNK_SIZE) -> list[tuple[int, int]]:
+	"""
+	About as many ranges as pieces, of at least chunk_size bytes, covering
+	what follows the header, from the first to the last, each one ending
+	right after a line break. No ranges for files that can't be read from anywhere.
+	"""
+	size = file_size(path)
+	if not size:
+		return []
+	chunk_size = max(chunk_size, size // pieces)
+
+	with open_source(path) as source:
+		start  = header_size(source)
+		ranges = []
+		while start < size:
+			end = start + chunk_size
+			if end < size:
+				source.seek(end)
+				line_break = LINE_BREAK.search(source.read(chunk_size))
+				end = end + line_break.end() if line_break else size
+			end = min(end, size)
+			ranges.append((start, end))
+			start = end
+		return ranges
+
+
+def parse_range(path: str, start: int, end: int) -> Encoded:
+	with open_source(path) as source, collection_paused():
+		rows = list(successful_rows(source, BLOCK_SIZE, start, end))
+		return encode(len(rows), successful_operations(rows))
+
+
+def successful_operations(rows: list[list[str]]) -> list[Operation]:
+	return [op for op in map(Operation.from_csv_row, rows) if op.is_successful()]
+
+
+def encode(rows: int, ops: list[Operation]) -> Encoded:
+	"""Copies the operations to a new block of shared memory, left for decode to free."""
+	if not ops:
+		return Encoded("", rows, 0, [], [], {})
+
+	summaries: dict[str, int] = {}
+	symbols:   dict[str, int] = {}
+	big:       dict[int, int] = {}
+
+	mantissas = array("q")
+	for i, op in enumerate(ops):
+		mantissa = op.amount.mantissa
+		if not -INT64 <= mantissa < INT64:
+			big[i] = mantissa
+			mantissa = 0
+		mantissas.append(mantissa)
+
+	columns = [
+		array("q", [seconds(op.date) for op in ops]),
+		mantissas,
+		array("I", [summaries.setdefault(op.summary, len(summaries)) for op in ops]),
+		array("I", [symbols.setdefault(op.symbol, len(symbols)) for op in ops]),
+		array("h", [op.amount.scale for op in ops]),
+		array("B", [TYPE_CODE[op.type] for op in ops]),
+	]
+
+	shm = SharedMemory(create=True, size=sum(c.itemsize * len(c) for c in columns))
+	buf = buffer(shm)
+	offset = 0
+	for column in columns:
+		size = column.itemsize * len(column)
+		buf[offset:offset + size] = column.tobytes()
+		offset += size
+	shm.close()
+
+	return Encoded(shm.name, rows, len(ops), list(summaries), list(symbols), big)
+
+
+def decode(encoded: Encoded) -> tuple[int, list[Operation]]:
+	"""Successful rows read and the operations parsed, freeing their shared memory."""
+	if not encoded.operations:
+		return encoded.rows, []
+
+	shm = SharedMemory(name=encoded.name)
+	try:
+		columns = []
+		offset  = 0
+		for typecode in TYPECODES:
+			column = array(typecode)
+			size   = column.itemsize * encoded.operations
+			with buffer(shm)[offset:offset + size] as view:
+				column.frombytes(view)
+			columns.append(column.tolist())
+			offset += size
+	finally:
+		shm.close()
+		shm.unlink()
+
+	dates, mantissas, summary_codes, symbol_codes, scales, types = columns
+	for i, mantissa in encoded.big.items():
+		mantissas[i] = mantissa
+
+	# operations of the same order share their date, as when parsed
+	date_of   = {s: from_seconds(s) for s in set(dates)}
+	summaries = [sys.intern(s) for s in encoded.summaries]
+	symbols   = [sys.intern(s) for s in encoded.symbols]
+
+	with collection_paused():
+		return encoded.rows, [
+			Operation(date_of[d], TYPES[t], summaries[su], symbols[sy], Amount(m, sc), STATUS)
+			for d, m, su, sy, sc, t in zip(dates, mantissas, summary_codes, symbol_codes, scales, types)
+		]
+
+
+@contextmanager
+def collection_paused() -> Iterator[None]:
+	"""
+	Rows and operations hold no reference cycles, yet creating them by the
+	hundred thousand triggers garbage collections that go through every
+	object alive, which take most of the time spent creating them.
+	"""
+	enabled = gc.isenabled()
+	gc.disable()
+	try:
+		yield
+	finally:
+		if enabled:
+			gc.enable()
+
+
+def buffer(shm: SharedMemory) -> memoryview:
+	if shm.buf is None: # only once closed
+		raise ValueError(f"Shared memory {shm.name} is closed")
+	return shm.buf
+
+
+def release(future: Future[Encoded]) -> None:
+	"""Frees the shared memory of a range decode didn't get to."""
+	if future.cancelled() or future.exception() is not None:
+		return
+	name = future.result().name
+	if not name:
+		return
+	try:
+		shm = SharedMemory(name=name)
+	except FileNotFoundError: # already decoded
+		return
+	shm.close()
+	shm.unlink()
+
+
+EPOCH = datetime(1, 1, 1)
+
+
+def seconds(date: datetime) -> int:
+	"""Exports have no fractions of a second."""
+	return (date - EPOCH) // timedelta(seconds=1)
+
+
+def from_seconds(value: int) -> datetime:
+	return EPOCH + timedelta(seconds=value)
@@ -0,0 +1,167 @@
+"""
+Per-stage instrumentation of a conversion (--stats, --profile).
+Regular runs never import this module, so they pay nothing for it.
+Memory is told by the peak resident set size of the process, which costs
+nothing to measure, as tracing allocations would slow every stage down.
+"""
+import cProfile
+import json
+import resource
+import sys
+import time
+import tracemalloc
+
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator
+
+from .main import (
+	BUILDERS, categorize_by_type, in_output_order, order_by_date,
+	parse_successful_rows)
+from .reader import read_successful
+from .transaction import Transaction
+from .writers import column_batches, write_batches
+
+
+@dataclass
+class Stage:
+	name:        str
+	items:       int   = 0
+	wall:        float = 0 # seconds
+	cpu:         float = 0 # seconds
+	peak_memory: int   = 0 # bytes resident at the highest point, since the process started
+
+
+@dataclass
+class Stats:
+	stages: list[Stage] = field(default_factory=list)
+
+
+	@contextmanager
+	def stage(self, name: str) -> Iterator[Stage]:
+		stage     = Stage(name)
+		wall, cpu = time.perf_counter(), time.process_time()
+
+		try:
+			yield stage
+		finally:
+			stage.wall = time.perf_counter() - wall
+			stage.cpu  = time.process_time() - cpu
+			stage.peak_memory = peak_resident_memory()
+			self.stages.append(stage)
+
+
+	def summary(self) -> str:
+		lines = [f"{'Stage':<20} {'Items':>9} {'Wall':>9} {'CPU':>9} {'Peak memory':>12}"]
+		for s in self.stages + [self.total()]:
+			lines.append(
+				f"{s.name:<20} {s.items:>9} {s.wall:>8.3f}s {s.cpu:>8.3f}s "
+				f"{s.peak_memory / 2**20:>9.1f} MiB")
+		return "\n".join(lines)
+
+
+	def total(self) -> Stage:
+		return Stage(
+			name        = "total",
+			items       = self.stages[0].items if self.stages else 0,
+			wall        = sum(s.wall for s in self.stages),
+			cpu         = sum(s.cpu  for s in self.stages),
+			peak_memory = max((s.peak_memory for s in self.stages), default=0),
+		)
+
+
+	def to_json(self) -> str:
+		return json.dumps({
+			"stages": [asdict(s) for s in self.stages],
+			"total":  asdict(self.total()),
+		}, indent=2)
+
+
+def convert_with_stats(input_file: str, outputs: list[str], profile: str | None = None) -> Stats:
+	"""
+	Same conversion as a regular run, but with every category built in
+	turn, so each stage is measured apart. With a profile path, cProfile
+	stats are dumped there, and a tracemalloc snapshot next to them, taken
+	in a second pass over the rows read, once the timed one is over.
+	"""
+	stats    = Stats()
+	profiler = cProfile.Profile() if profile else None
+
+	if profiler:
+		profiler.enable()
+	try:
+		rows = run_stages(stats, input_file, outputs)
+	finally:
+		if profiler and profile:
+			profiler.disable()
+			profiler.dump_stats(profile)
+
+	if profile:
+		dump_allocations(rows, profile + ".tracemalloc")
+	return stats
+
+
+def dump_allocations(rows: list[list[str]], path: str) -> None:
+	"""
+	Same stages after reading, on the rows already read, as standard
+	input can't be read twice, writing no output, with every allocation traced.
+	"""
+	tracemalloc.start()
+	try:
+		run_stages_on(Stats(), rows, [])
+		tracemalloc.take_snapshot().dump(path)
+	finally:
+		tracemalloc.stop()
+
+
+def peak_resident_memory() -> int:
+	"""In bytes, which macOS reports as they are, and Linux in KiB."""
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_stages(stats: Stats, input_file: str, outputs: list[str]) -> list[list[str]]:
+	"""Returns the rows read."""
+	with stats.stage("read") as s:
+		rows = list(read_successful(input_file))
+		s.items = len(rows)
+
+	run_stages_on(stats, rows, outputs)
+	return rows
+
+
+def run_stages_on(stats: Stats, rows: list[list[str]], outputs: list[str]) -> None:
+	with stats.stage("parse") as s:
+		operations = parse_successful_rows(rows)
+		s.items = len(operations)
+
+	with stats.stage("categorize") as s:
+		categorized = categorize_by_type(operations)
+		s.items = len(operations)
+
+	built: dict[str, list[Transaction]] = {}
+	for category, builder_class in BUILDERS.items():
+		builder: Any = builder_class()
+
+		with stats.stage(f"build {category}") as s:
+			for op in categorized[category]:
+				builder.add(op)
+			s.items = len(builder.totals)
+
+		# combined transactions made out of the running totals
+		with stats.stage(f"combine {category}") as s:
+			built[category] = builder.collect()
+			s.items = len(built[category])
+
+	with stats.stage("sort") as s:
+		ordered = order_by_date(in_output_order(built))
+		s.items = len(ordered)
+
+	# records of every transaction, as columns, handed to each output
+	with stats.stage("format") as s:
+		batches = list(column_batches(ordered))
+		s.items = len(ordered)
+
+	with stats.stage("write") as s:
+		write_batches(outputs, batches)
+		s.items = len(ordered)
@@ -0,0 +1,188 @@
+import csv
+import mmap
+import os
+import re
+import sys
+
+from contextlib import contextmanager
+from io import BytesIO
+from typing import IO, Iterator
+
+from .compressed import decompressed, detect, spill
+
+
+BLOCK_SIZE = 64 * 1024
+STDIO      = "-" # as input or output, standard input or output
+LINE_BREAK = re.compile(rb"\r\n|\r|\n")
+
+Source = IO[bytes] | mmap.mmap
+
+SUCCESSFUL = "Sucesso" # status, in the fifth column of a NovaDAX export
+
+
+def read_successful(path: str, block_size: int = BLOCK_SIZE) -> Iterator[list[str]]:
+	"""
+	Yields the successful rows of a NovaDAX CSV file from the last one to
+	the first, skipping the header, while holding a single block of it in
+	memory. Unsuccessful rows are left out before they are even decoded,
+	and lines of a block are tokenized all at once, which is much faster
+	than one line at a time. Fields spanning multiple lines are not supported.
+	"""
+	with open_source(path) as source:
+		yield from successful_rows(source, block_size, start=header_size(source))
+
+
+def successful_rows(
+	source: Source,
+	block_size: int = BLOCK_SIZE,
+	start: int = 0,
+	end: int | None = None,
+) -> Iterator[list[str]]:
+	"""Same as read_successful, on the bytes from start to end of source."""
+	for lines in reversed_blocks(source, block_size, start, end):
+		for _, row in successful(lines):
+			yield row
+
+
+def read_numbered(path: str, block_size: int = BLOCK_SIZE) -> Iterator[tuple[int, list[str]]]:
+	"""
+	Same rows as read_successful, each with its row number, the header
+	being row 1, as spreadsheets number them. Blank lines aren't counted.
+	Rows are counted first, so the file is read twice.
+	"""
+	with open_source(path) as source:
+		yield from numbered_rows(source, block_size)
+
+
+def numbered_rows(source: Source, block_size: int = BLOCK_SIZE) -> Iterator[tuple[int, list[str]]]:
+	"""Same as read_numbered, on source."""
+	start  = header_size(source)
+	number = 1 + sum(len(lines) for lines in reversed_blocks(source, block_size, start))
+	for lines in reversed_blocks(source, block_size, start):
+		for i, row in successful(lines):
+			yield number - i, row
+		number -= len(lines)
+
+
+def read_rows(path: str, block_size: int = BLOCK_SIZE) -> Iterator[list[str]]:
+	"""Every row of a CSV file, from the last one to the first, skipping the header."""
+	with open_source(path) as source:
+		for lines in reversed_blocks(source, block_size, header_size(source)):
+			yield from parse_lines(lines)
+
+
+def successful(lines: list[bytes]) -> Iterator[tuple[int, list[str]]]:
+	"""
+	Index and row of each successful line. Lines that don't even mention
+	the status are left out before being decoded, and the others are
+	tokenized all at once, then kept if their status column says so,
+	whatever columns follow it.
+	"""
+	status = SUCCESSFUL.encode("utf-8")
+	chosen = [i for i, line in enumerate(lines) if status in line]
+	if chosen:
+		rows = parse_lines([lines[i] for i in chosen])
+		for i, row in zip(chosen, rows):
+			if row[4:5] == [SUCCESSFUL]:
+				yield i, row
+
+
+@contextmanager
+def open_source(path: str) -> Iterator[Source]:
+	"""
+	Files are memory-mapped, so the operating system pages them in and out
+	as needed, and only the block being read is copied. Standard input and
+	compressed files can only be read forwards, so they are decompressed
+	into a spill file first, which is then read backwards.
+	"""
+	if path == STDIO:
+		stdin = sys.stdin.buffer
+		codec = detect(stdin.peek(8)[:8] if hasattr(stdin, "peek") else b"")
+		with (decompressed(stdin, codec) if codec else spill(stdin)) as copy:
+			yield copy
+		return
+
+	with open(path, "rb") as f:
+		codec = detect(f.read(8))
+		f.seek(0)
+		if codec:
+			with decompressed(f, codec) as copy:
+				yield copy
+		elif not os.fstat(f.fileno()).st_size:
+			yield BytesIO() # empty files can't be mapped
+		else:
+			with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+				yield mm
+
+
+def reversed_lines(
+	f: Source,
+	block_size: int = BLOCK_SIZE,
+	start: int = 0,
+	end: int | None = None,
+) -> Iterator[bytes]:
+	for lines in reversed_blocks(f, block_size, start, end):
+		yield from lines
+
+
+def reversed_blocks(
+	f: Source,
+	block_size: int = BLOCK_SIZE,
+	start: int = 0,
+	end: int | None = None,
+) -> Iterator[list[bytes]]:
+	"""
+	Yields the lines of each block, from the last one to the first.
+	Blank lines are skipped, which also takes care of a "\\r\\n"
+	line break that happens to be split between two blocks.
+	Only the bytes from start to end (defaults to the end of file) are read.
+	"""
+	if end is None:
+		f.seek(0, os.SEEK_END)
+		end = f.tell() # mmap.seek returns nothing before Python 3.13
+	position = end
+	leftover = b""
+
+	while position > start:
+		size     = min(block_size, position - start)
+		position-= size
+		f.seek(position)
+
+		lines = LINE_BREAK.split(f.read(size) + leftover)
+
+		# the first line may continue in the previous block
+		leftover = lines.pop(0) if position > start else b""
+
+		yield [line for line in reversed(lines) if line]
+
+
+def header_size(f: Source, block_size: int = BLOCK_SIZE) -> int:
+	"""Number of bytes up to the end of the first line break."""
+	f.seek(0)
+	head = b""
+
+	while block := f.read(block_size):
+		head += block
+		# a "\r" at the end of the block may be followed by "\n"
+		match = LINE_BREAK.search(head)
+		if match and match.end() < len(head):
+			return match.end()
+
+	match = LINE_BREAK.search(head)
+	return match.end() if match else len(head)
+
+
+def parse_line(line: bytes) -> list[str]:
+	return next(csv.reader([line.decode("utf-8", errors="ignore")]))
+
+
+def parse_lines(lines: list[bytes]) -> list[list[str]]:
+	"""
+	Same as parse_line on each line. A quote left open makes csv carry
+	on into the next line, which then yields fewer rows than lines.
+	"""
+	text = b"\n".join(lines).decode("utf-8", errors="ignore")
+	rows = list(csv.reader(text.split("\n")))
+	if len(rows) != len(lines):
+		return [parse_line(line) for line in lines]
+	return rows
@@ -0,0 +1,314 @@
+"""
+Conversion service (nd2k serve): a NovaDAX CSV POSTed to /convert comes
+back as a Koinly CSV. Conversions run on a pool of processes started
+once, so uploads don't pay for starting Python and importing nd2k.
+
+	curl --data-binary @novadax.csv http://127.0.0.1:8000/convert
+
+Each connection carries a single request. Requests beyond what the pool
+and the backlog can hold are turned away with 503, and responses are
+written no faster than clients read them.
+"""
+import asyncio
+import csv
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from http import HTTPStatus
+from pprint import pformat
+from typing import TextIO
+
+from .main import Unmatched, collect_routed, order_by_date, route
+from .operation import Operation
+from .reader import numbered_rows
+from .tolerant import reason
+from .writers import koinly_universal_format
+
+
+CHUNK_SIZE  = 64 * 1024
+MAX_HEADERS = 16 * 1024 # bytes
+
+Timings = dict[str, float] # seconds, by stage
+
+
+class Malformed(ValueError):
+	"""A row of the upload that can't be parsed."""
+
+
+class HTTPError(Exception):
+	def __init__(self, status: int, message: str):
+		super().__init__(status, message)
+		self.status  = status
+		self.message = message
+
+
+@dataclass
+class Conversion:
+	output:       bytes
+	rows:         int
+	transactions: int
+	timings:      Timings
+
+
+class Stopwatch:
+	def __init__(self) -> None:
+		self.timings: Timings = {}
+		self.start = self.last = time.perf_counter()
+
+
+	def lap(self, stage: str) -> None:
+		now = time.perf_counter()
+		self.timings[stage] = now - self.last
+		self.last = now
+
+
+	def total(self) -> float:
+		return self.last - self.start
+
+
+def convert_upload(data: bytes) -> Conversion:
+	"""
+	Same conversion as a regular run, from and to bytes, run on workers.
+	Rows that can't be parsed are raised as Malformed, and operations left
+	unmatched as Unmatched, with the leftovers formatted.
+	"""
+	watch = Stopwatch()
+
+	operations = []
+	for number, row in numbered_rows(io.BytesIO(data)):
+		try:
+			operations.append(Operation.from_csv_row(row))
+		except (ValueError, IndexError) as e:
+			raise Malformed(f"Row {number} could not be parsed: {reason(e)}")
+	watch.lap("parse")
+
+	try:
+		transactions = collect_routed(route(operations))
+	except ValueError as e:
+		raise Unmatched(pformat(e.args, indent=2, width=80))
+	ordered = order_by_date(transactions)
+	watch.lap("organize")
+
+	output = io.StringIO()
+	csv.writer(output).writerows(koinly_universal_format(ordered))
+	watch.lap("format")
+
+	return Conversion(output.getvalue().encode("utf-8"), len(operations), len(ordered), watch.timings)
+
+
+class Server:
+	"""
+	Up to jobs conversions run at once, and up to backlog more uploads
+	are received and wait for a worker. Anything beyond that is refused.
+	"""
+	def __init__(
+		self,
+		pool:       Executor,
+		jobs:       int,
+		backlog:    int,
+		max_upload: int, # bytes
+		log:        TextIO = sys.stderr,
+	):
+		self.pool       = pool
+		self.workers    = asyncio.Semaphore(jobs)
+		self.capacity   = jobs + backlog
+		self.pending    = 0
+		self.max_upload = max_upload
+		self.log        = log
+
+
+	async def start(self, host: str, port: int) -> asyncio.Server:
+		return await asyncio.start_server(self.handle, host, port, limit=MAX_HEADERS)
+
+
+	async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+		watch   = Stopwatch()
+		request = "-"
+
+		try:
+			try:
+				request, length, expect = await read_request(reader, self.max_upload)
+				conversion = await self.convert(reader, writer, length, expect, watch)
+			except HTTPError as e:
+				await self.fail(writer, request, watch, e.status, e.message)
+				return
+			except (ConnectionError, asyncio.IncompleteReadError):
+				raise
+			except Exception as e:
+				# logged here, or it would only reach the event loop's handler
+				await self.fail(writer, request, watch, 500,
+					"The conversion failed, see the server log", f"{type(e).__name__}: {e}")
+				return
+
+			await respond(writer, 200, conversion.output, {
+				"Content-Type":  "text/csv; charset=utf-8",
+				"Server-Timing": server_timing(watch.timings),
+			})
+			watch.lap("send")
+			self.report(request, 200, watch,
+				f"{conversion.rows} rows, {conversion.transactions} transactions")
+
+		except (ConnectionError, asyncio.IncompleteReadError):
+			self.report(request, 499, watch, "client went away")
+
+		finally:
+			writer.close()
+
+
+	async def convert(
+		self,
+		reader: asyncio.StreamReader,
+		writer: asyncio.StreamWriter,
+		length: int,
+		expect: bool,
+		watch:  Stopwatch,
+	) -> Conversion:
+		if self.pending >= self.capacity:
+			raise HTTPError(503, "Too many conversions in progress, try again later")
+
+		self.pending += 1
+		try:
+			if expect:
+				writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+			data = await reader.readexactly(length)
+			watch.lap("receive")
+
+			async with self.workers:
+				watch.lap("queue")
+				loop = asyncio.get_running_loop()
+				try:
+					conversion = await loop.run_in_executor(self.pool, convert_upload, data)
+				except Malformed as e:
+					raise HTTPError(400, str(e))
+				except Unmatched as e:
+					raise HTTPError(422, "Could not find a match for the following "
+						f"operations:\n\n{e}")
+				watch.lap("convert")
+		finally:
+			self.pending -= 1
+
+		watch.timings.update(conversion.timings)
+		return conversion
+
+
+	async def fail(
+		self,
+		writer:  asyncio.StreamWriter,
+		request: str,
+		watch:   Stopwatch,
+		status:  int,
+		message: str,
+		details: str = "",
+	) -> None:
+		await respond(writer, status, f"{message}\n".encode("utf-8"), {
+			"Content-Type": "text/plain; charset=utf-8",
+		})
+		self.report(request, status, watch, details)
+
+
+	def report(self, request: str, status: int, watch: Stopwatch, details: str = "") -> None:
+		timings = " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in watch.timings.items())
+		print(f"{request} {status} {watch.total():.3f}s {timings} {details}".rstrip(),
+			file=self.log, flush=True)
+
+
+async def read_request(reader: asyncio.StreamReader, max_upload: int) -> tuple[str, int, bool]:
+	"""Returns the request line, the upload size, and whether 100 Continue is expected."""
+	try:
+		head = await reader.readuntil(b"\r\n\r\n")
+	except asyncio.LimitOverrunError:
+		raise HTTPError(431, "Request headers too large")
+
+	request_line, *lines = head.decode("latin-1").split("\r\n")
+	try:
+		method, path, _ = request_line.split(" ", 2)
+	except ValueError:
+		raise HTTPError(400, "Malformed request")
+
+	headers = {}
+	for line in filter(None, lines):
+		name, _, value = line.partition(":")
+		headers[name.strip().lower()] = value.strip()
+
+	request = f"{method} {path}"
+	if path != "/convert":
+		raise HTTPError(404, "Not found, POST the NovaDAX CSV to /convert")
+	if method != "POST":
+		raise HTTPError(405, "Only POST is supported")
+	if "content-length" not in headers:
+		raise HTTPError(411, "Content-Length is required")
+
+	try:
+		length = int(headers["content-length"])
+	except ValueError:
+		raise HTTPError(400, "Malformed Content-Length")
+	if not 0 <= length <= max_upload:
+		raise HTTPError(413, f"Uploads are limited to {max_upload} bytes")
+
+	return request, length, headers.get("expect", "").lower() == "100-continue"
+
+
+async def respond(writer: asyncio.StreamWriter, status: int, body: bytes, headers: dict[str, str]) -> None:
+	"""Written one chunk at a time, waiting for slow clients to catch up."""
+	head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+	head+= [f"{name}: {value}" for name, value in headers.items()]
+	head+= [f"Content-Length: {len(body)}", "Connection: close"]
+	writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+	view = memoryview(body)
+	for i in range(0, len(view), CHUNK_SIZE):
+		writer.write(view[i:i + CHUNK_SIZE])
+		await writer.drain()
+	await writer.drain()
+
+
+def worker_pool(jobs: int) -> ProcessPoolExecutor:
+	"""
+	Workers forked from the server would inherit its open connections,
+	keeping them open after a response, so they start from a clean process.
+	"""
+	methods = multiprocessing.get_all_start_methods()
+	context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+	return ProcessPoolExecutor(jobs, mp_context=context)
+
+
+def server_timing(timings: Timings) -> str:
+	"""Server-Timing header, in milliseconds, shown by browser dev tools."""
+	return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def main(argv: list[str]) -> None:
+	args = parse_args(argv)
+	try:
+		asyncio.run(serve(args))
+	except KeyboardInterrupt:
+		pass
+
+
+def parse_args(argv: list[str]) -> Namespace:
+	cli = ArgumentParser(prog="nd2k serve")
+	cli.add_argument("--host", default="127.0.0.1")
+	cli.add_argument("--port", type=int, default=8000)
+	cli.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, metavar="N",
+		help="conversions running at once, each on its own process "
+		     "(defaults to one per CPU)")
+	cli.add_argument("--backlog", type=int, default=16, metavar="N",
+		help="uploads waiting for a worker before new ones are refused")
+	cli.add_argument("--max-upload", type=int, default=100, metavar="MIB",
+		help="largest NovaDAX CSV accepted, in MiB")
+	return cli.parse_args(argv)
+
+
+async def serve(args: Namespace) -> None:
+	with worker_pool(args.jobs) as pool:
+		server    = Server(pool, args.jobs, args.backlog, args.max_upload * 2**20)
+		listening = await server.start(args.host, args.port)
+		print(f"Serving on http://{args.host}:{args.port}/convert", file=sys.stderr)
+		async with listening:
+			await listening.serve_forever()
@@ -1,9 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime
-from decimal import Decimal
-from typing import cast
 
-from .transaction import Transaction, group_by_timestamp
+from .transaction import Transaction, Builder, Record, Totals
+from .amount import Amount
 from .operation import Operation
 
 
@@ -28,21 +27,29 @@ class Swap(Transaction):
 		])
 
 
-	def format(self) -> list[str]:
-		return [
-			self.formatted_date,      # Date
-			f"{self.asset_a.amount}", # Sent Amount
-			f"{self.asset_a.symbol}", # Sent Currency
-			f"{self.asset_b.amount}", # Received Amount
-			f"{self.asset_b.symbol}", # Received Currency
-			"",                       # Fee Amount
-			"",                       # Fee Currency
-			"",                       # Net Worth Amount
-			"",                       # Net Worth Currency
-			"swap",                   # Label
-			self.asset_a.summary,     # Description
-			"",                       # TxHash
-		]
+	@property
+	def amounts(self) -> tuple[Amount, ...]:
+		return (self.asset_a.amount, self.asset_b.amount)
+
+
+	def with_amounts(self, amounts: list[Amount]) -> "Swap":
+		a, b = amounts
+		return Swap(
+			asset_a=replace(self.asset_a, amount=a),
+			asset_b=replace(self.asset_b, amount=b))
+
+
+	def record(self) -> Record:
+		return Record(
+			date              = self.date,
+			sent_amount       = self.asset_a.amount,
+			sent_currency     = self.asset_a.symbol,
+			received_amount   = self.asset_b.amount,
+			received_currency = self.asset_b.symbol,
+			fee_amount        = None,
+			fee_currency      = None,
+			label             = "swap",
+			description       = self.asset_a.summary)
 
 
 class PartialSwap:
@@ -59,28 +66,38 @@ class PartialSwap:
 		return Swap(asset_a=self.asset_a, asset_b=asset_b)
 
 
-def build(ops: list[Operation]) -> list[Swap]:
-	swaps   = []
-	partial = None
+class SwapBuilder(Builder[Swap]):
+	def __init__(self) -> None:
+		self.totals:    Totals[Swap] = Totals()
+		self.partial:   PartialSwap | None = None
 
-	for op in ops:
-		if not partial:
-			partial = PartialSwap(op)
-			continue
 
-		swaps.append(partial.complete(op))
-		partial = None
+	def add(self, op: Operation) -> None:
+		if not self.partial:
+			self.partial = PartialSwap(op)
+			return
+
+		self.totals.add(self.partial.complete(op))
+		self.partial = None
 
-	if partial:
-		raise ValueError("Incomplete Swap", partial)
 
-	groups = group_by_timestamp(cast(list[Transaction], swaps)).values()
-	return [combine(cast(list[Swap], g)) for g in groups]
+	def is_idle(self) -> bool:
+		return self.partial is None
 
 
-def combine(lst: list[Swap]) -> Swap:
-	a = lst[0].asset_a
-	b = lst[0].asset_b
-	a.amount = Decimal(sum(i.asset_a.amount for i in lst))
-	b.amount = Decimal(sum(i.asset_b.amount for i in lst))
-	return Swap(asset_a=a, asset_b=b)
+	def collect(self) -> list[Swap]:
+		if self.partial:
+			raise ValueError("Incomplete Swap", self.partial)
+		return self.totals.collect()
+
+
+	def leftovers(self) -> list[list[Operation]]:
+		return [[self.partial.asset_a]] if self.partial else []
+
+
+def build(ops: list[Operation]) -> list[Swap]:
+	builder = SwapBuilder()
+	for op in ops:
+		builder.add(op)
+	return builder.collect()
+
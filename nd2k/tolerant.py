@@ -0,0 +1,104 @@
+"""
+Conversions that set aside what can't be converted instead of failing.
+Rows that can't be parsed, and the operations left without a match, are
+written to a rejects file along with their row numbers, while every
+transaction that could be completed is still written to the outputs, so
+only the rows around the rejects need a closer look.
+"""
+import csv
+import os
+
+from contextlib import suppress
+from datetime import timedelta
+from typing import Iterable, NamedTuple
+
+from .compressed import strip_extension
+from .main import Built, in_output_order, new_builders
+from .operation import CATEGORY, Operation
+from .reader import STDIO
+from .writers import open_output
+
+
+REJECTS_SUFFIX  = ".rejects.csv"
+REJECTS_HEADERS = ["row", "date", "summary", "symbol", "amount", "status", "reason"]
+
+# reasons given to operations left without a match
+INCOMPLETE = {
+	"swaps":     "Incomplete Swap",
+	"trades":    "Incomplete Trade",
+	"exchanges": "Incomplete Exchange",
+}
+
+
+class Reject(NamedTuple):
+	row:    int # as numbered by read_numbered
+	fields: list[str] # as in the NovaDAX CSV
+	reason: str
+
+
+def rejects_path(output_file: str) -> str:
+	"""Next to the output, uncompressed."""
+	base, _ = os.path.splitext(strip_extension(output_file)[0])
+	return base + REJECTS_SUFFIX
+
+
+def organize_tolerantly(
+	numbered:     Iterable[tuple[int, list[str]]],
+	trade_window: timedelta | None = None,
+) -> tuple[Built, list[Reject]]:
+	"""
+	Same as organize_rows, but rows that fail to parse or to fit into any
+	transaction are rejected, and so are the operations of transactions
+	still incomplete in the end. Rejects are in the order of their rows.
+	"""
+	builders = new_builders(trade_window)
+	rejects  = []
+	rows: dict[int, tuple[int, list[str]]] = {} # id of each operation held
+
+	for number, row in numbered:
+		try:
+			op = Operation.from_csv_row(row)
+		except (ValueError, IndexError) as e:
+			rejects.append(Reject(number, row, reason(e)))
+			continue
+		if not op.is_successful():
+			continue
+
+		category = CATEGORY[op.type]
+		try:
+			builders[category].add(op)
+		except ValueError as e:
+			rejects.append(Reject(number, row, reason(e)))
+			continue
+		if category != "nontrades":
+			rows[id(op)] = (number, row)
+
+	built = {}
+	for category, builder in builders.items():
+		built[category] = builder.totals.collect()
+		for ops in builder.leftovers():
+			rejects.extend(Reject(*rows[id(op)], INCOMPLETE[category]) for op in ops)
+
+	return in_output_order(built), sorted(rejects, key=lambda r: r.row)
+
+
+def reason(e: Exception) -> str:
+	return str(e.args[0]) if e.args else type(e).__name__
+
+
+def write_rejects(path: str, rejects: list[Reject]) -> None:
+	"""Without rejects, any left by an earlier run are removed instead."""
+	if not rejects:
+		if path != STDIO:
+			with suppress(FileNotFoundError):
+				os.remove(path)
+		return
+
+	with open_output(path) as f:
+		writer = csv.writer(f)
+		writer.writerow(REJECTS_HEADERS)
+		writer.writerows([r.row, *r.fields, r.reason] for r in rejects)
+
+
+def summary(rejects: list[Reject], path: str) -> str:
+	return f"Warning: {len(rejects)} rows could not be converted, see {path}"
@@ -1,11 +1,17 @@
 import re
-from dataclasses import dataclass
-from datetime import datetime
-from decimal import Decimal
-from typing import NamedTuple, cast
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from itertools import count
+from datetime import datetime, timedelta
+from typing import Iterator, NamedTuple
 
-from .transaction import Transaction, group_by_timestamp
-from .operation import Operation
+from .transaction import Transaction, Builder, Record, Totals
+from .amount import Amount
+from .operation import Operation, OperationType
+
+
+TRADING_PAIR = re.compile(r"\(([^\/]+)\/([^\)]+)")
 
 
 class TradingPair(NamedTuple):
@@ -18,14 +24,26 @@ class TradingPair(NamedTuple):
 	quote: str
 
 
-	@classmethod
-	def from_string(cls, string: str) -> "TradingPair":
-		match = re.search(r"\(([^\/]+)\/([^\)]+)", string)
+	@staticmethod
+	@lru_cache(maxsize=256)
+	def from_string(string: str) -> "TradingPair":
+		"""
+		A real export has only a few dozen distinct summaries, all interned,
+		so every trade sharing one gets the same pair.
+		"""
+		match = TRADING_PAIR.search(string)
 		if match:
-			return cls(*match.groups())
+			return TradingPair(*match.groups())
 		raise ValueError(f"No trading pair found in \"{string}\"")
 
 
+# position in the trading pair of the currency fees are charged in
+FEE_SIDE = {
+	OperationType.BUY:  0, # base asset
+	OperationType.SELL: 1, # quote asset
+}
+
+
 @dataclass
 class TradeTraits:
 	summary:      str
@@ -53,21 +71,18 @@ class TradeTraits:
 		if self.trading_fee or not op.is_trading_fee():
 			return False
 
-		if self.is_a_purchase():
-			return op.symbol == self.trading_pair.base
-
-		if self.is_a_sale():
-			return op.symbol == self.trading_pair.quote
-
-		raise ValueError("Malformed Trade")
+		side = FEE_SIDE.get(self._any_asset.type)
+		if side is None:
+			raise ValueError("Malformed Trade")
+		return op.symbol == self.trading_pair[side]
 
 
 	def is_a_purchase(self) -> bool:
-		return self._any_asset.type.name == "BUY"
+		return self._any_asset.type is OperationType.BUY
 
 
 	def is_a_sale(self) -> bool:
-		return self._any_asset.type.name == "SELL"
+		return self._any_asset.type is OperationType.SELL
 
 
 	@property
@@ -97,24 +112,38 @@ class Trade(Transaction, TradeTraits):
 		return "".join([str(self.date), self.summary])
 
 
-	def format(self) -> list[str]:
+	@property
+	def amounts(self) -> tuple[Amount, ...]:
+		return (
+			self.base_asset.amount,
+			self.quote_asset.amount,
+			self.trading_fee.amount)
+
+
+	def with_amounts(self, amounts: list[Amount]) -> "Trade":
+		base, quote, fee = amounts
+		return Trade(
+			summary      = self.summary,
+			trading_pair = self.trading_pair,
+			base_asset   = replace(self.base_asset,  amount=base),
+			quote_asset  = replace(self.quote_asset, amount=quote),
+			trading_fee  = replace(self.trading_fee, amount=fee))
+
+
+	def record(self) -> Record:
 		sent = self.quote_asset if self.is_a_purchase() else self.base_asset
 		recv = self.base_asset  if self.is_a_purchase() else self.quote_asset
 
-		return [
-			self.formatted_date,          # Date
-			f"{sent.amount}",             # Sent Amount
-			f"{sent.symbol}",             # Sent Currency
-			f"{recv.amount}",             # Received Amount
-			f"{recv.symbol}",             # Received Currency
-			f"{self.trading_fee.amount}", # Fee Amount
-			f"{self.trading_fee.symbol}", # Fee Currency
-			"",                           # Net Worth Amount
-			"",                           # Net Worth Currency
-			"trade",                      # Label
-			self.base_asset.summary,      # Description
-			"",                           # TxHash
-		]
+		return Record(
+			date              = self.date,
+			sent_amount       = sent.amount,
+			sent_currency     = sent.symbol,
+			received_amount   = recv.amount,
+			received_currency = recv.symbol,
+			fee_amount        = self.trading_fee.amount,
+			fee_currency      = self.trading_fee.symbol,
+			label             = "trade",
+			description       = self.base_asset.summary)
 
 
 class PartialTrade(TradeTraits):
@@ -126,6 +155,9 @@ class PartialTrade(TradeTraits):
 		)
 		tr.base_asset  = op if tr.fits_as_base_asset(op)  else None
 		tr.quote_asset = op if tr.fits_as_quote_asset(op) else None
+		if not (tr.base_asset or tr.quote_asset):
+			# it would hold no operation, and take every fee that comes after it
+			raise ValueError("Operation outside its trading pair", op)
 		return tr
 
 
@@ -137,21 +169,207 @@ class PartialTrade(TradeTraits):
 		return Trade(**vars(self))
 
 
-def build(ops: list[Operation]) -> list[Trade]:
-	trades = []
-	partials: list[PartialTrade] = []
+Slot  = tuple[str, str, int] # (summary, symbol, position in the trading pair)
+Index = OrderedDict[int, PartialTrade] # by sequence, in the order trades were opened
 
-	for op in ops:
-		tr = create_or_update_trade(op, partials)
+SCAN_LIMIT = 16 # open trades, beyond which scanning them all costs more than indexing them
+
+
+class TradeMatcher:
+	"""
+	Same matching rules as create_or_update_trade, which it relies on while
+	few trades are open. Once SCAN_LIMIT of them are, instead of scanning
+	every one, keeps them indexed by the slots they still have available,
+	so the oldest fitting one is found right away, until all are closed.
+	Trades leave an index as soon as they take its slot, or are retired,
+	so indexes only ever hold open trades.
+	"""
+	def __init__(self) -> None:
+		self.open:  dict[int, tuple[int, PartialTrade]] = {}
+		self.slots: defaultdict[Slot, Index] = defaultdict(OrderedDict)
+		self.fees:  defaultdict[str, Index]  = defaultdict(OrderedDict)
+
+		# the open trades while they are few, None once they are indexed
+		self.scanned: list[PartialTrade] | None = []
+
+		# trades whose fee currency is unknown, which take no fee
+		self.unclassified: Index = OrderedDict()
+		self.sequence = count()
+
+
+	@property
+	def partials(self) -> list[PartialTrade]:
+		return [pt for _, pt in self.open.values()]
+
+
+	def match(self, op: Operation) -> PartialTrade:
+		"""
+		Attempts to fit operation into an existing partial trade.
+		If it doesn't find any match, create a new partial trade.
+		"""
+		if self.scanned is not None:
+			pt = create_or_update_trade(op, self.scanned)
+			if id(pt) not in self.open:
+				self.open[id(pt)] = (next(self.sequence), pt)
+				if len(self.open) >= SCAN_LIMIT:
+					self.scanned = None
+					for seq, opened in self.open.values():
+						self.put_in_indexes(seq, opened)
+			return pt
+
+		# (oldest fitting trade, slot precedence within the same trade, its index),
+		# no two of them alike, as a trade waits for a fee in a single index
+		found = []
+		for position in (0, 1):
+			index = self.slots.get((op.summary, op.symbol, position))
+			if index:
+				found.append((next(iter(index)), position, index))
+		if op.is_trading_fee():
+			for index in (self.fees.get(op.symbol), self.unclassified):
+				if index:
+					found.append((next(iter(index)), 2, index))
+
+		if not found:
+			pt  = PartialTrade.from_operation(op)
+			seq = next(self.sequence)
+			self.open[id(pt)] = (seq, pt)
+			self.put_in_indexes(seq, pt)
+			return pt
+
+		seq, position, index = min(found) if len(found) > 1 else found[0]
+		pt = index[seq]
+
+		if position == 0:
+			pt.base_asset = op
+		elif position == 1:
+			pt.quote_asset = op
+		elif pt.fits_as_trading_fee(op): # raises for unclassified trades
+			pt.trading_fee = op
+		del index[seq]
+		return pt
+
+
+	def retire(self, pt: PartialTrade) -> None:
+		"""Completed trades are in no index anymore, evicted ones leave theirs."""
+		seq, _ = self.open.pop(id(pt))
+		if self.scanned is not None:
+			self.scanned.remove(pt)
+			return
+
+		for index in self.indexes(pt):
+			del index[seq]
+		if not self.open: # and so every index is empty
+			self.scanned = []
+
+
+	def evict(self, before: datetime) -> list[PartialTrade]:
+		"""
+		Retires the trades begun before the given date, oldest first.
+		Operations come in chronological order, so trades begin in the
+		order they were opened, and the search stops at the first recent one.
+		"""
+		evicted = []
+		for _, pt in self.open.values():
+			if began(pt) >= before:
+				break
+			evicted.append(pt)
+		for pt in evicted:
+			self.retire(pt)
+		return evicted
+
+
+	def put_in_indexes(self, seq: int, pt: PartialTrade) -> None:
+		for index in self.indexes(pt):
+			index[seq] = pt
+
+
+	def indexes(self, pt: PartialTrade) -> Iterator[Index]:
+		"""
+		Those of the slots the trade still has available. Trades begin with
+		an asset, so each one waits for its fee in the same index all along.
+		"""
+		if not pt.base_asset:
+			yield self.slots[(pt.summary, pt.trading_pair.base, 0)]
+		if not pt.quote_asset:
+			yield self.slots[(pt.summary, pt.trading_pair.quote, 1)]
+		if not pt.trading_fee:
+			symbol = self.fee_symbol(pt)
+			yield self.unclassified if symbol is None else self.fees[symbol]
+
+
+	@staticmethod
+	def fee_symbol(pt: PartialTrade) -> str | None:
+		any_asset = pt.base_asset or pt.quote_asset
+		if not any_asset:
+			return None
+		side = FEE_SIDE.get(any_asset.type)
+		return None if side is None else pt.trading_pair[side]
+
+
+def began(pt: PartialTrade) -> datetime:
+	return min(op.date for op in (pt.base_asset, pt.quote_asset, pt.trading_fee) if op)
+
+
+class TradeBuilder(Builder[Trade]):
+	"""
+	The fills and fee of an order are at most seconds apart, so with a
+	window, trades still incomplete once operations are that much newer
+	are given up on: they stop being candidates for new operations, and
+	are reported as incomplete when collected. Open trades then stay as
+	many as a window of activity holds, however long the history is.
+	A window shorter than the gap between a fee and its fills gives up on
+	valid trades as well.
+	"""
+	def __init__(self, window: timedelta | None = None) -> None:
+		self.totals:    Totals[Trade] = Totals()
+		self.matcher:   TradeMatcher = TradeMatcher()
+		self.window:    timedelta | None = window
+		self.stale:     list[PartialTrade] = []
+		self.last_date: datetime | None = None
+
+
+	def add(self, op: Operation) -> None:
+		self.advance(op.date)
+		tr = self.matcher.match(op)
 		if tr.is_completed():
-			trades.append(tr.complete())
-			partials.remove(tr)
+			self.totals.add(tr.complete())
+			self.matcher.retire(tr)
+
+
+	def advance(self, date: datetime) -> None:
+		if self.window is not None and date != self.last_date:
+			self.stale += self.matcher.evict(date - self.window)
+			self.last_date = date
+
+
+	def is_idle(self) -> bool:
+		return not self.matcher.open
 
-	if partials:
-		raise ValueError("Incomplete Trades", partials)
 
-	groups = group_by_timestamp(cast(list[Transaction], trades)).values()
-	return [combine(cast(list[Trade], g)) for g in groups]
+	def collect(self) -> list[Trade]:
+		if self.matcher.open or self.stale:
+			raise ValueError("Incomplete Trades", self.partials)
+		return self.totals.collect()
+
+
+	def leftovers(self) -> list[list[Operation]]:
+		return [
+			[op for op in (pt.base_asset, pt.quote_asset, pt.trading_fee) if op]
+			for pt in self.partials
+		]
+
+
+	@property
+	def partials(self) -> list[PartialTrade]:
+		"""Given up on first, as they are the oldest."""
+		return self.stale + self.matcher.partials
+
+
+def build(ops: list[Operation], window: timedelta | None = None) -> list[Trade]:
+	builder = TradeBuilder(window)
+	for op in ops:
+		builder.add(op)
+	return builder.collect()
 
 
 def create_or_update_trade(op: Operation, lst: list[PartialTrade]) -> PartialTrade:
@@ -176,15 +394,3 @@ def create_or_update_trade(op: Operation, lst: list[PartialTrade]) -> PartialTra
 	lst.append(pt)
 	return pt
 
-
-def combine(lst: list[Trade]) -> Trade:
-	pt = PartialTrade.from_operation(lst[0].base_asset)
-	pt.quote_asset = lst[0].quote_asset
-	pt.trading_fee = lst[0].trading_fee
-	tr = pt.complete()
-
-	tr.base_asset.amount  = Decimal(sum(i.base_asset.amount  for i in lst))
-	tr.quote_asset.amount = Decimal(sum(i.quote_asset.amount for i in lst))
-	tr.trading_fee.amount = Decimal(sum(i.trading_fee.amount for i in lst))
-
-	return tr
@@ -1,6 +1,28 @@
 from abc import ABC, abstractmethod
-from collections import defaultdict
 from datetime import datetime
+from operator import is_
+from typing import Generic, Iterable, NamedTuple, TypeVar
+
+from .amount import ZERO, Amount
+from .operation import Operation
+
+
+T = TypeVar("T", bound="Transaction")
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class Record(NamedTuple):
+	"""What goes into every output format, None where there is nothing."""
+	date:              datetime
+	sent_amount:       Amount | None
+	sent_currency:     str | None
+	received_amount:   Amount | None
+	received_currency: str | None
+	fee_amount:        Amount | None
+	fee_currency:      str | None
+	label:             str
+	description:       str
 
 
 class Transaction(ABC):
@@ -16,18 +38,137 @@ class Transaction(ABC):
 		pass
 
 
+	@property
 	@abstractmethod
-	def format(self) -> list[str]:
+	def amounts(self) -> tuple[Amount, ...]:
+		"""Amounts added up when combining transactions of the same group."""
+
+
+	@abstractmethod
+	def with_amounts(self: T, amounts: list[Amount]) -> T:
+		"""Copy holding copies of its operations, with these amounts."""
+
+
+	@abstractmethod
+	def record(self) -> Record:
 		pass
 
 
+	def format(self) -> list[str]:
+		"""Koinly Universal row, see nd2k.writers for whole batches at once."""
+		r = self.record()
+		return [
+			self.formatted_date,            # Date
+			amount_text(r.sent_amount),     # Sent Amount
+			r.sent_currency or "",          # Sent Currency
+			amount_text(r.received_amount), # Received Amount
+			r.received_currency or "",      # Received Currency
+			amount_text(r.fee_amount),      # Fee Amount
+			r.fee_currency or "",           # Fee Currency
+			"",                             # Net Worth Amount
+			"",                             # Net Worth Currency
+			r.label,                        # Label
+			r.description,                  # Description
+			"",                             # TxHash
+		]
+
+
 	@property
 	def formatted_date(self) -> str:
-		return self.date.strftime("%Y-%m-%d %H:%M:%S")
+		return self.date.strftime(DATE_FORMAT)
+
+
+def amount_text(amount: Amount | None) -> str:
+	return "" if amount is None else str(amount)
+
+
+class Builder(ABC, Generic[T]):
+	"""
+	Organizes operations into transactions one operation at a time,
+	so the caller decides how much of the input is held in memory.
+	"""
+	totals: "Totals[T]" # of every transaction completed so far
+
+
+	@abstractmethod
+	def add(self, op: Operation) -> None:
+		pass
+
+
+	@abstractmethod
+	def is_idle(self) -> bool:
+		"""True when no operation is waiting for its counterparts."""
+
+
+	@abstractmethod
+	def collect(self) -> list[T]:
+		"""Combines and hands over every transaction completed so far."""
+
+
+	@abstractmethod
+	def leftovers(self) -> list[list[Operation]]:
+		"""Operations of each transaction still incomplete, oldest first."""
+
+
+	def advance(self, date: datetime) -> None:
+		"""Told when operations of any category reach a new date."""
+
+
+def chronological(lst: list[T]) -> list[T]:
+	"""
+	Transactions complete in about the order they took place, as operations
+	are read in chronological order, so this sort takes close to linear time.
+	Ties keep their order.
+	"""
+	return sorted(lst, key=lambda t: t.date)
+
+
+class Totals(Generic[T]):
+	"""
+	Combines transactions sharing a group_index in a single pass, as they
+	complete, keeping only the first of each group and running totals of
+	its amounts. Transactions added are never changed, so builders can be
+	rerun on the same operations.
+	"""
+	def __init__(self) -> None:
+		self.groups: dict[str, tuple[T, list[Amount]]] = {}
+
+
+	def __len__(self) -> int:
+		return len(self.groups)
+
+
+	def add(self, t: T) -> None:
+		group = self.groups.get(t.group_index)
+		if group is None:
+			# amounts are added to Decimal's int 0 as well, see Amount.sum
+			self.groups[t.group_index] = (t, [
+				a if a.is_exact_sum() else ZERO + a for a in t.amounts])
+			return
+
+		totals = group[1]
+		for i, amount in enumerate(t.amounts):
+			totals[i] += amount
+
+
+	def combined(self) -> list[T]:
+		"""In order of first appearance. Lone transactions are kept as they are."""
+		return [
+			first if all(map(is_, totals, first.amounts))
+			else first.with_amounts(totals)
+			for first, totals in self.groups.values()
+		]
+
+
+	def collect(self) -> list[T]:
+		"""Hands over every combined transaction, and starts anew."""
+		combined = chronological(self.combined())
+		self.groups = {}
+		return combined
 
 
-def group_by_timestamp(lst: list[Transaction]) -> dict[str, list[Transaction]]:
-	groups = defaultdict(list)
+def combine(lst: Iterable[T]) -> list[T]:
+	totals: Totals[T] = Totals()
 	for t in lst:
-		groups[t.group_index].append(t)
-	return groups
+		totals.add(t)
+	return totals.combined()
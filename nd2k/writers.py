@@ -0,0 +1,416 @@
+"""
+Output formats. Transactions are handed to writers in batches, turned
+into columns once for every output of a run, and each writer renders
+whole columns at a time. The format of an output is told by the
+extension of its path, Koinly Universal CSV being the default.
+"""
+import csv
+import io
+import os
+import sys
+
+from abc import ABC, abstractmethod
+from contextlib import ExitStack, contextmanager, suppress
+from datetime import datetime
+from itertools import islice, repeat
+from types import TracebackType
+from typing import Any, Iterable, Iterator, NamedTuple, Sequence, TextIO, TypeVar
+
+from .amount import Amount
+from .compressed import codec_of, compressing, strip_extension
+from .reader import STDIO
+from .transaction import DATE_FORMAT, Record, Transaction, amount_text
+
+
+BATCH_SIZE   = 4096 # transactions
+WRITE_BUFFER = 1024 * 1024 # bytes
+
+KOINLY_UNIVERSAL_HEADERS = [
+	"Date",
+	"Sent Amount",
+	"Sent Currency",
+	"Received Amount",
+	"Received Currency",
+	"Fee Amount",
+	"Fee Currency",
+	"Net Worth Amount",
+	"Net Worth Currency",
+	"Label",
+	"Description",
+]
+
+FIELDS  = Record._fields
+AMOUNTS = ("sent_amount", "received_amount", "fee_amount")
+
+I = TypeVar("I")
+
+
+class Columns(NamedTuple):
+	"""A batch of records, one tuple per field, in the same order."""
+	date:              tuple[datetime, ...]
+	sent_amount:       tuple[Amount | None, ...]
+	sent_currency:     tuple[str | None, ...]
+	received_amount:   tuple[Amount | None, ...]
+	received_currency: tuple[str | None, ...]
+	fee_amount:        tuple[Amount | None, ...]
+	fee_currency:      tuple[str | None, ...]
+	label:             tuple[str, ...]
+	description:       tuple[str, ...]
+
+
+	@classmethod
+	def of(cls, records: Iterable[Record]) -> "Columns":
+		"""Transposes at least one record."""
+		return cls(*zip(*records))
+
+
+	def __len__(self) -> int:
+		return len(self.date)
+
+
+class Writer(ABC):
+	extensions: tuple[str, ...] = ()
+	# written by a library that needs a regular, uncompressed file
+	needs_file = False
+
+
+	def __init__(self, path: str):
+		self.path = path
+
+
+	@abstractmethod
+	def write(self, batch: Columns) -> None:
+		pass
+
+
+	def close(self) -> None:
+		pass
+
+
+	@classmethod
+	def unavailable(cls) -> str | None:
+		"""Why this format can't be written, None if it can."""
+		return None
+
+
+	def __enter__(self) -> "Writer":
+		return self
+
+
+	def __exit__(
+		self,
+		exc_type: type[BaseException] | None,
+		exc:      BaseException | None,
+		tb:       TracebackType | None,
+	) -> None:
+		self.close()
+
+
+class TextWriter(Writer):
+	"""Writes to files, compressed or not, or to standard output."""
+	def __init__(self, path: str):
+		super().__init__(path)
+		self.resources = ExitStack()
+		self.file      = self.resources.enter_context(open_output(path))
+
+
+	def close(self) -> None:
+		self.resources.close()
+
+
+class KoinlyWriter(TextWriter):
+	extensions = (".csv",)
+
+
+	def __init__(self, path: str):
+		super().__init__(path)
+		self.csv = csv.writer(self.file)
+		self.csv.writerow(KOINLY_UNIVERSAL_HEADERS)
+
+
+	def write(self, batch: Columns) -> None:
+		self.csv.writerows(render_koinly(batch))
+
+
+class JSONLinesWriter(TextWriter):
+	"""
+	One object per transaction, keyed by the fields of Record. Amounts are
+	strings, exactly as in the Koinly CSV, absent values are null.
+	"""
+	extensions = (".jsonl", ".ndjson")
+	template   = "{" + ",".join(f'"{name}":%s' for name in FIELDS) + "}\n"
+
+
+	def write(self, batch: Columns) -> None:
+		encoded  = [json_strings(column) for column in as_text(batch)]
+		template = self.template
+		self.file.write("".join([template % row for row in zip(*encoded)]))
+
+
+class SQLiteWriter(Writer):
+	"""
+	Bulk inserted into a transactions table, replacing any table of the
+	same name, in a single database transaction committed once all is
+	written. Amounts are stored as text, to keep them exact.
+	"""
+	extensions = (".sqlite", ".sqlite3", ".db")
+	needs_file = True
+	table      = "transactions"
+
+
+	def __init__(self, path: str):
+		import sqlite3
+
+		super().__init__(path)
+		self.db = sqlite3.connect(path)
+		self.db.execute(f"DROP TABLE IF EXISTS {self.table}")
+		self.db.execute(f"CREATE TABLE {self.table} ({', '.join(f'{f} TEXT' for f in FIELDS)})")
+		self.insert = f"INSERT INTO {self.table} VALUES ({', '.join('?' * len(FIELDS))})"
+
+
+	def write(self, batch: Columns) -> None:
+		self.db.executemany(self.insert, zip(*as_text(batch)))
+
+
+	def close(self) -> None:
+		self.db.commit()
+		self.db.close()
+
+
+class ArrowWriter(Writer):
+	"""
+	Arrow IPC file, one record batch per batch of transactions
+	(pip install nd2k[arrow]). Amounts are strings, as in the Koinly CSV.
+	"""
+	extensions: tuple[str, ...] = (".arrow", ".feather")
+	needs_file = True
+
+
+	def __init__(self, path: str):
+		super().__init__(path)
+		self.pa     = require_pyarrow()
+		self.schema = self.pa.schema(
+			[("date", self.pa.timestamp("s"))]
+			+ [(name, self.pa.string()) for name in FIELDS[1:]])
+		self.output = self.open()
+
+
+	@classmethod
+	def unavailable(cls) -> str | None:
+		try:
+			require_pyarrow()
+		except ImportError as e:
+			return str(e)
+		return None
+
+
+	def open(self) -> Any:
+		return self.pa.ipc.new_file(self.path, self.schema)
+
+
+	def write(self, batch: Columns) -> None:
+		self.output.write_batch(self.record_batch(batch))
+
+
+	def record_batch(self, batch: Columns) -> Any:
+		pa = self.pa
+		return pa.record_batch(
+			[pa.array(batch.date, pa.timestamp("s"))]
+			+ [pa.array(column, pa.string()) for column in as_text(batch)[1:]],
+			schema=self.schema)
+
+
+	def close(self) -> None:
+		self.output.close()
+
+
+class ParquetWriter(ArrowWriter):
+	"""Same columns as Arrow files, one row group per batch of transactions."""
+	extensions = (".parquet",)
+
+
+	def open(self) -> Any:
+		import pyarrow.parquet
+
+		return pyarrow.parquet.ParquetWriter(self.path, self.schema)
+
+
+	def write(self, batch: Columns) -> None:
+		self.output.write_table(self.pa.Table.from_batches([self.record_batch(batch)]))
+
+
+WRITERS: dict[str, type[Writer]] = {
+	"koinly":  KoinlyWriter,
+	"jsonl":   JSONLinesWriter,
+	"sqlite":  SQLiteWriter,
+	"arrow":   ArrowWriter,
+	"parquet": ParquetWriter,
+}
+
+
+def writer_for(path: str) -> type[Writer]:
+	"""By extension, ignoring compression, Koinly CSV for anything unknown."""
+	base, _   = strip_extension(path)
+	extension = os.path.splitext(base)[1].lower()
+	for writer in WRITERS.values():
+		if extension in writer.extensions:
+			return writer
+	return KoinlyWriter
+
+
+def unwritable(path: str) -> str | None:
+	"""Why path can't be written in the format its extension asks for, None if it can."""
+	writer = writer_for(path)
+	if writer.needs_file and (path == STDIO or codec_of(path)):
+		return f"{path}: {writer.__name__.removesuffix('Writer')} outputs must be uncompressed files"
+	return writer.unavailable()
+
+
+def require_pyarrow() -> Any:
+	try:
+		import pyarrow
+		import pyarrow.ipc
+	except ImportError:
+		raise ImportError(
+			"Arrow and Parquet outputs require PyArrow: pip install 'nd2k[arrow]'")
+	return pyarrow
+
+
+def batches(items: Iterable[I], size: int = BATCH_SIZE) -> Iterator[list[I]]:
+	"""Never pulls more items than the batch being handed over needs."""
+	iterator = iter(items)
+	while batch := list(islice(iterator, size)):
+		yield batch
+
+
+def column_batches(transactions: Iterable[Transaction]) -> Iterator[Columns]:
+	for batch in batches(transactions):
+		yield Columns.of([t.record() for t in batch])
+
+
+def write_transactions(paths: Sequence[str], transactions: Iterable[Transaction]) -> None:
+	write_batches(paths, column_batches(transactions))
+
+
+def write_batches(paths: Sequence[str], batches: Iterable[Columns]) -> None:
+	"""Every output is fed each batch in turn, in a single pass over them."""
+	with ExitStack() as stack:
+		writers = [stack.enter_context(writer_for(p)(p)) for p in paths]
+		for batch in batches:
+			for writer in writers:
+				writer.write(batch)
+
+
+@contextmanager
+def staged(paths: Sequence[str]) -> Iterator[list[str]]:
+	"""
+	Hidden paths next to each output, renamed over them once everything is
+	written, and removed otherwise, so a failure leaves the outputs as they
+	were. Standard output is written as it goes. An existing database is
+	copied first, to keep its other tables.
+	"""
+	staging = {p: staging_path(p) for p in paths if p != STDIO}
+	for path, temporary in staging.items():
+		if writer_for(path) is SQLiteWriter and os.path.exists(path):
+			import shutil # imports every codec
+
+			shutil.copyfile(path, temporary)
+	try:
+		yield [staging.get(p, p) for p in paths]
+	except BaseException:
+		for temporary in staging.values():
+			with suppress(FileNotFoundError):
+				os.remove(temporary)
+		raise
+	for path, temporary in staging.items():
+		os.replace(temporary, path)
+
+
+def staging_path(path: str) -> str:
+	"""Same directory and ending, so the same format and compression apply."""
+	directory, name = os.path.split(path)
+	return os.path.join(directory, f".{os.getpid()}.{name}")
+
+
+def koinly_universal_format(transactions: Iterable[Transaction]) -> Iterator[Sequence[str]]:
+	"""Rows are formatted a batch at a time, never all held at once."""
+	yield KOINLY_UNIVERSAL_HEADERS
+	yield from koinly_rows(transactions)
+
+
+def koinly_rows(transactions: Iterable[Transaction]) -> Iterator[tuple[str, ...]]:
+	for batch in column_batches(transactions):
+		yield from render_koinly(batch)
+
+
+def render_koinly(c: Columns) -> Iterator[tuple[str, ...]]:
+	"""Same rows as Transaction.format, rendered a column at a time."""
+	blank = repeat("")
+	return zip(
+		formatted_dates(c.date),                  # Date
+		map(amount_text, c.sent_amount),          # Sent Amount
+		[s or "" for s in c.sent_currency],       # Sent Currency
+		map(amount_text, c.received_amount),      # Received Amount
+		[s or "" for s in c.received_currency],   # Received Currency
+		map(amount_text, c.fee_amount),           # Fee Amount
+		[s or "" for s in c.fee_currency],        # Fee Currency
+		blank,                                    # Net Worth Amount
+		blank,                                    # Net Worth Currency
+		c.label,                                  # Label
+		c.description,                            # Description
+		blank,                                    # TxHash
+	)
+
+
+def formatted_dates(dates: Sequence[datetime]) -> Iterator[str]:
+	"""Transactions often share a date, each one is formatted only once."""
+	formatted = {d: d.strftime(DATE_FORMAT) for d in set(dates)}
+	return map(formatted.__getitem__, dates)
+
+
+def as_text(batch: Columns) -> list[Sequence[Any]]:
+	"""Dates formatted and amounts as exact decimal text, absent values left None."""
+	columns: list[Sequence[Any]] = list(batch)
+	columns[0] = list(formatted_dates(batch.date))
+	for i in map(FIELDS.index, AMOUNTS):
+		columns[i] = [None if a is None else str(a) for a in batch[i]]
+	return columns
+
+
+def json_strings(column: Sequence[str | None]) -> list[str]:
+	"""Each distinct value is encoded only once, most of them repeat a lot."""
+	import json
+
+	encoded = {s: json.dumps(s, ensure_ascii=False) for s in set(column)}
+	return list(map(encoded.__getitem__, column))
+
+
+@contextmanager
+def open_output(path: str) -> Iterator[TextIO]:
+	"""
+	Rows reach the file or standard output in chunks of WRITE_BUFFER bytes,
+	compressed when the file name ends like a compressed file.
+	Standard output is left open, for whatever comes next in a pipeline.
+	"""
+	codec = codec_of(path)
+	if codec:
+		with compressing(path, codec) as binary:
+			with io.TextIOWrapper(
+				io.BufferedWriter(binary, WRITE_BUFFER), encoding="utf-8", newline="\n"
+			) as f:
+				yield f
+		return
+
+	if path != STDIO:
+		with open(path, "w", encoding="utf-8", newline="\n", buffering=WRITE_BUFFER) as f:
+			yield f
+		return
+
+	sys.stdout.flush() # anything printed so far comes first
+	stdout = io.TextIOWrapper(
+		io.BufferedWriter(sys.stdout.buffer, WRITE_BUFFER), encoding="utf-8", newline="\n")
+	try:
+		yield stdout
+	finally:
+		stdout.flush()
+		stdout.detach().detach()
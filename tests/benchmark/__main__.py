@@ -0,0 +1,192 @@
+"""
+Measures each stage of a conversion, and a whole conversion, on a
+synthetic export, along with how long the command takes to start.
+Results are stored as JSON, and compared against a baseline, exiting
+with an error when a stage got slower than tolerated.
+
+	python -m tests.benchmark --operations 100000 --save-baseline
+	python -m tests.benchmark --operations 100000
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser, Namespace
+from datetime import datetime, timezone
+from typing import Any, Callable, TypeVar
+
+from nd2k import __version__, swap, trade, exchange, nontrade
+from nd2k.main import categorize_by_type, convert, order_by_date, parse_successful_rows
+from nd2k.reader import read_successful
+from nd2k.writers import koinly_universal_format, write_transactions
+
+from .generator import write_export
+
+
+RESULTS_DIR = ".benchmarks"
+BASELINE    = os.path.join(RESULTS_DIR, "baseline.json")
+
+R = TypeVar("R")
+
+Timings = dict[str, float]
+
+
+def main() -> None:
+	args = parse_args(sys.argv[1:])
+
+	result = run(args.operations, args.repeat, args.seed)
+	print(report(result))
+
+	os.makedirs(RESULTS_DIR, exist_ok=True)
+	save(result, os.path.join(RESULTS_DIR, f"{result['started']}.json"))
+
+	if args.save_baseline:
+		save(result, args.baseline)
+		return
+
+	baseline = load(args.baseline)
+	if baseline is None:
+		print(f"No baseline at {args.baseline}, run with --save-baseline first")
+		return
+
+	regressions = compare(result, baseline, args.tolerance)
+	for r in regressions:
+		print(f"REGRESSION {r}")
+	exit(1 if regressions else 0)
+
+
+def parse_args(argv: list[str]) -> Namespace:
+	cli = ArgumentParser(prog="python -m tests.benchmark")
+	cli.add_argument("--operations", type=int, default=100_000,
+		help="rows in the synthetic export")
+	cli.add_argument("--repeat", type=int, default=5,
+		help="runs per stage, the fastest one being kept")
+	cli.add_argument("--seed", type=int, default=0)
+	cli.add_argument("--baseline", default=BASELINE)
+	cli.add_argument("--save-baseline", action="store_true",
+		help="store these results as the baseline")
+	cli.add_argument("--tolerance", type=float, default=0.2,
+		help="how much slower a stage may get, 0.2 meaning 20%%")
+	return cli.parse_args(argv)
+
+
+def run(operations: int, repeat: int, seed: int = 0) -> dict[str, Any]:
+	started = datetime.now(timezone.utc)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		input_file  = os.path.join(tmp, "novadax.csv")
+		output_file = os.path.join(tmp, "koinly.csv")
+		write_export(input_file, operations, seed)
+
+		best: Timings = {}
+		for _ in range(repeat):
+			timings = run_once(input_file, output_file) | startup()
+			for stage, seconds in timings.items():
+				best[stage] = min(seconds, best.get(stage, seconds))
+
+	return {
+		"started":    started.strftime("%Y%m%dT%H%M%SZ"),
+		"nd2k":       __version__,
+		"python":     platform.python_version(),
+		"operations": operations,
+		"repeat":     repeat,
+		"seed":       seed,
+		"stages":     best,
+	}
+
+
+def run_once(input_file: str, output_file: str) -> Timings:
+	"""
+	Every stage is fed the output of the one before it, as in main, where
+	writing formats the transactions again, a batch at a time.
+	"""
+	timings: Timings = {}
+
+	rows        = measure(timings, "read", lambda p: list(read_successful(p)), input_file)
+	operations  = measure(timings, "parse_successful_rows", parse_successful_rows, rows)
+	categorized = measure(timings, "categorize_by_type", categorize_by_type, operations)
+
+	built: list[Any] = []
+	for module, category in [
+		(swap,     "swaps"),
+		(trade,    "trades"),
+		(exchange, "exchanges"),
+		(nontrade, "nontrades"),
+	]:
+		name   = f"{module.__name__.split('.')[-1]}.build"
+		built.append(measure(timings, name, module.build, categorized[category]))
+
+	ordered = measure(timings, "order_by_date", order_by_date, built)
+	measure(timings, "koinly_universal_format",
+		lambda t: list(koinly_universal_format(t)), ordered)
+	measure(timings, "write", write_transactions, [output_file], ordered)
+
+	measure(timings, "end_to_end", convert, input_file, output_file)
+	return timings
+
+
+def startup() -> Timings:
+	"""Fresh interpreters running the command, and importing what converts."""
+	def python(*args: str) -> None:
+		subprocess.run([sys.executable, *args], check=True, stdout=subprocess.DEVNULL)
+
+	timings: Timings = {}
+	measure(timings, "cli_startup", python, "-m", "nd2k", "--version")
+	measure(timings, "import_main", python, "-c", "import nd2k.main")
+	return timings
+
+
+def measure(timings: Timings, stage: str, function: Callable[..., R], *args: Any) -> R:
+	start  = time.perf_counter()
+	result = function(*args)
+	timings[stage] = time.perf_counter() - start
+	return result
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+	"""Timings are only comparable for the same number of operations."""
+	if result["operations"] != baseline["operations"]:
+		return [
+			f"baseline measured {baseline['operations']} operations, "
+			f"not {result['operations']}"
+		]
+
+	regressions = []
+	for stage, seconds in result["stages"].items():
+		before = baseline["stages"].get(stage)
+		if before and seconds > before * (1 + tolerance):
+			regressions.append(
+				f"{stage}: {seconds:.4f}s, was {before:.4f}s "
+				f"(+{(seconds / before - 1) * 100:.0f}%)")
+	return regressions
+
+
+def report(result: dict[str, Any]) -> str:
+	lines = [
+		f"nd2k {result['nd2k']} on Python {result['python']}, "
+		f"{result['operations']} operations, best of {result['repeat']}"
+	]
+	for stage, seconds in result["stages"].items():
+		rate = result["operations"] / seconds if seconds else 0
+		lines.append(f"{stage:<25} {seconds:>9.4f}s {rate:>14,.0f} ops/s")
+	return "\n".join(lines)
+
+
+def save(result: dict[str, Any], path: str) -> None:
+	with open(path, "w", encoding="utf-8") as f:
+		json.dump(result, f, indent=2)
+
+
+def load(path: str) -> dict[str, Any] | None:
+	if not os.path.exists(path):
+		return None
+	with open(path, "r", encoding="utf-8") as f:
+		return dict(json.load(f))
+
+
+if __name__ == "__main__":
+	main()
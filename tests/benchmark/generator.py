@@ -0,0 +1,156 @@
+"""
+Synthetic NovaDAX exports, as realistic as the parser and builders need:
+every kind of operation, many trading pairs, trades filled several times
+within the same second, exchanges with fees, and a few failed rows.
+"""
+import csv
+import random
+
+from datetime import datetime, timedelta
+from typing import Callable
+
+
+HEADER = ["Data", "Tipo", "Moeda", "Valor", "Status"]
+
+START = datetime(2021, 1, 1)
+PAIRS = 200
+
+
+def generate(operations: int, seed: int = 0) -> list[list[str]]:
+	"""
+	Rows from the newest to the oldest, as exported by NovaDAX.
+	Every event is complete, so the whole export converts without errors.
+	"""
+	rng = random.Random(seed)
+	events, weights = zip(*EVENTS)
+
+	rows: list[list[str]] = []
+	date = START
+	while len(rows) < operations:
+		date += timedelta(seconds=rng.choice([0, 0, 1, 2, 60, 3600]))
+		rows += rng.choices(events, weights)[0](rng, date)
+
+	return list(reversed(rows))
+
+
+def write_export(path: str, operations: int, seed: int = 0) -> None:
+	with open(path, "w", encoding="utf-8", newline="") as f:
+		writer = csv.writer(f)
+		writer.writerow(HEADER)
+		writer.writerows(generate(operations, seed))
+
+
+def symbol(rng: random.Random) -> str:
+	"""One of PAIRS made up symbols, of three letters or more."""
+	i = rng.randrange(PAIRS) + 26 * 26
+	letters = ""
+	while i:
+		i, letter = divmod(i, 26)
+		letters = chr(ord("A") + letter) + letters
+	return letters
+
+
+def row(date: datetime, summary: str, currency: str, amount: str, status: str = "Sucesso") -> list[str]:
+	return [date.strftime("%d/%m/%Y %H:%M:%S"), summary, currency, amount, status]
+
+
+def number(rng: random.Random, places: int, magnitude: int = 6) -> str:
+	"""NovaDAX separates thousands and decimals alike with commas."""
+	integer = f"{rng.randrange(10 ** rng.randint(0, magnitude)):,}"
+	if not places:
+		return integer
+	return f"{integer},{rng.randrange(10 ** places):0{places}d}"
+
+
+def reais(rng: random.Random, sign: str) -> str:
+	return f"R$ {sign}{number(rng, 2)}"
+
+
+def crypto(rng: random.Random, sign: str, currency: str) -> str:
+	brl = f"{rng.randrange(10000)}.{rng.randrange(100):02d}"
+	return f"{sign}{number(rng, rng.choice([2, 4, 8]))} {currency}(≈R${brl})"
+
+
+def fiat_deposit(rng: random.Random, date: datetime) -> list[list[str]]:
+	return [row(date, "Depósito em Reais", "BRL", reais(rng, "+"))]
+
+
+def fiat_withdraw(rng: random.Random, date: datetime) -> list[list[str]]:
+	status = "Sucesso" if rng.random() < 0.9 else "Falha"
+	return [row(date, "Saque em Reais", "BRL", reais(rng, "-"), status)]
+
+
+def crypto_deposit(rng: random.Random, date: datetime) -> list[list[str]]:
+	return [row(date, "Depósito de criptomoedas", "BTC", crypto(rng, "+", "BTC"))]
+
+
+def crypto_withdraw(rng: random.Random, date: datetime) -> list[list[str]]:
+	return [
+		row(date, "Saque de criptomoedas", "ETH", crypto(rng, "-", "ETH")),
+		row(date, "Taxa de saque de criptomoedas", "ETH", crypto(rng, "-", "ETH")),
+	]
+
+
+def bonus(rng: random.Random, date: datetime) -> list[list[str]]:
+	return [row(date, "Redeemed Bonus", "BRL", reais(rng, "+"))]
+
+
+def trade(rng: random.Random, date: datetime) -> list[list[str]]:
+	"""
+	Some trades are filled several times within the same second.
+	Both sides of a fill come in any order, always ahead of its fee.
+	"""
+	base = symbol(rng)
+	kind = rng.choice(["Compra", "Venda"])
+	summary = f"{kind}({base}/BRL)"
+	rows = []
+
+	for _ in range(rng.choice([1, 1, 1, 2, 3, 5])):
+		if kind == "Compra":
+			fill = [
+				row(date, summary, "BRL", reais(rng, "-")),
+				row(date, summary, base, crypto(rng, "+", base)),
+			]
+			fee = row(date, "Taxa de transação", base, crypto(rng, "-", base))
+		else:
+			fill = [
+				row(date, summary, base, crypto(rng, "-", base)),
+				row(date, summary, "BRL", reais(rng, "+")),
+			]
+			fee = row(date, "Taxa de transação", "BRL", reais(rng, "-"))
+		rng.shuffle(fill)
+		rows += fill + [fee]
+
+	return rows
+
+
+def swap(rng: random.Random, date: datetime) -> list[list[str]]:
+	sent = symbol(rng)
+	return [
+		row(date, "Troca", sent, crypto(rng, "-", sent)),
+		row(date, "Troca", sent + "X", crypto(rng, "+", sent + "X")),
+	]
+
+
+def exchange(rng: random.Random, date: datetime) -> list[list[str]]:
+	rows = [
+		row(date, "Convert", "BRL", reais(rng, "+")),
+		row(date, "Taxa de Convert", "BRL", reais(rng, "-")),
+	]
+	rng.shuffle(rows)
+	return [row(date, "Convert", "USDT", crypto(rng, "-", "USDT"))] + rows
+
+
+Event = Callable[[random.Random, datetime], list[list[str]]]
+
+# events and how often they happen, trades being the bulk of an export
+EVENTS: list[tuple[Event, int]] = [
+	(trade,           60),
+	(fiat_deposit,     8),
+	(fiat_withdraw,    6),
+	(crypto_deposit,   6),
+	(crypto_withdraw,  6),
+	(bonus,            2),
+	(swap,             4),
+	(exchange,         8),
+]
@@ -0,0 +1,59 @@
+from pathlib import Path
+from typing import Any
+
+from nd2k.main import convert, parse_successful_rows
+from nd2k.operation import OperationType
+
+from .generator import generate, write_export
+from .__main__ import compare, run
+
+
+def test_generated_export_converts(tmp_path: Path) -> None:
+	input_file = tmp_path / "novadax.csv"
+	write_export(str(input_file), 2000, seed=1)
+
+	rows, transactions = convert(str(input_file), str(tmp_path / "koinly.csv"))
+	assert rows >= 2000
+	assert 0 < transactions < rows
+
+
+def test_generated_export_has_every_operation_type() -> None:
+	operations = parse_successful_rows(list(reversed(generate(2000))))
+	assert {op.type for op in operations} == set(OperationType)
+
+
+def test_generator_is_deterministic() -> None:
+	assert generate(100, seed=7) == generate(100, seed=7)
+	assert generate(100, seed=7) != generate(100, seed=8)
+
+
+def test_run_measures_every_stage() -> None:
+	result = run(operations=200, repeat=1)
+	assert list(result["stages"]) == [
+		"read",
+		"parse_successful_rows",
+		"categorize_by_type",
+		"swap.build",
+		"trade.build",
+		"exchange.build",
+		"nontrade.build",
+		"order_by_date",
+		"koinly_universal_format",
+		"write",
+		"end_to_end",
+		"cli_startup",
+		"import_main",
+	]
+
+
+def test_compare_flags_regressions() -> None:
+	baseline: dict[str, Any] = {"operations": 10, "stages": {"read": 1.0, "write": 1.0}}
+	result:   dict[str, Any] = {"operations": 10, "stages": {"read": 1.1, "write": 1.5}}
+
+	assert compare(result, baseline, tolerance=0.2) == ["write: 1.5000s, was 1.0000s (+50%)"]
+	assert compare(result, baseline, tolerance=0.5) == []
+
+	result["operations"] = 20
+	assert compare(result, baseline, tolerance=0.5) == [
+		"baseline measured 10 operations, not 20"
+	]
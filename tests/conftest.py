@@ -0,0 +1,12 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory: Any, monkeypatch: Any) -> Path:
+	"""Conversions are cached away from the user's cache, and apart for each test."""
+	directory = tmp_path_factory.mktemp("cache")
+	monkeypatch.setenv("ND2K_CACHE_DIR", str(directory))
+	return Path(directory)
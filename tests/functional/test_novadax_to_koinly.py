@@ -28,6 +28,13 @@ def invoke_nd2k_tool(tmp_path: Path, monkeypatch: Any) -> None:
 	main()
 
 
+@when("the file is processed in streaming mode")
+def invoke_nd2k_tool_in_streaming_mode(tmp_path: Path, monkeypatch: Any) -> None:
+	file = tmp_path / "temp.csv"
+	monkeypatch.setattr("sys.argv", ["nd2k", "--stream", str(file)])
+	main()
+
+
 @when("I attempt to process the file", target_fixture="error_msg")
 def invoke_nd2k_tool_with_bad_file(tmp_path: Path, capsys: Any, monkeypatch: Any) -> str:
 	file = tmp_path / "temp.csv"
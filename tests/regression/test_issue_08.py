@@ -1,5 +1,5 @@
 from pathlib import Path
-from nd2k.main import read
+from nd2k.reader import read_rows
 
 # https://github.com/thiagoalessio/nd2k/issues/8
 def test_handle_input_with_any_encoding(tmp_path: Path) -> None:
@@ -16,4 +16,4 @@ def test_handle_input_with_any_encoding(tmp_path: Path) -> None:
 	with file.open("wb") as f:
 		f.write(contents)
 
-	assert read(str(file)) == [["foo", "bar", "test"]]
+	assert list(read_rows(str(file))) == [["foo", "bar", "test"]]
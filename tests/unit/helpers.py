@@ -1,6 +1,6 @@
 from typing import Any
 from datetime import datetime
-from decimal import Decimal
+from nd2k.amount import Amount
 from nd2k.trade import PartialTrade, TradingPair
 from nd2k.operation import OperationType, Operation
 
@@ -11,7 +11,7 @@ def fake_op(**kwargs: Any) -> Operation:
 		"type":    OperationType.BUY,
 		"summary": "Test",
 		"symbol":  "TST",
-		"amount":  Decimal("1.234"),
+		"amount":  Amount(1234, 3),
 		"status":  "Sucesso",
 	}
 	return Operation(**{**defaults, **kwargs})
@@ -0,0 +1,59 @@
+import random
+
+from decimal import Decimal
+
+from nd2k.amount import Amount
+
+
+def test_renders_like_decimal() -> None:
+	assert str(Amount(35577, 2)) == "355.77"
+	assert str(Amount(20078700, 2)) == "200787.00"
+	assert str(Amount(1, 8)) == "1E-8"
+	assert str(Amount(0, 8)) == "0E-8"
+	assert str(Amount(5, 3)) == "0.005"
+	assert f"{Amount(-5, 1)}" == "-0.5"
+
+
+def test_renders_like_decimal_property() -> None:
+	rng = random.Random(12)
+	for _ in range(20000):
+		mantissa = rng.choice([0, rng.randrange(10), rng.randrange(10 ** rng.randint(1, 35))])
+		scale    = rng.randint(-3, 12)
+		decimal  = Decimal(f"{mantissa}E{-scale}")
+		assert str(Amount(mantissa, scale)) == str(decimal)
+		assert Amount.from_decimal(decimal) == Amount(mantissa, scale)
+
+
+def test_sum() -> None:
+	total = Amount.sum([Amount(5, 1), Amount(25, 2), Amount(3)])
+	assert (total.mantissa, total.scale) == (375, 2)
+	assert str(Amount.sum([])) == "0"
+
+
+def test_sum_like_decimal_property() -> None:
+	"""Beyond 28 digits, Decimal rounds, and so must the sum."""
+	rng = random.Random(12)
+	for _ in range(5000):
+		amounts = [
+			Amount(rng.randrange(10 ** rng.randint(1, 30)), rng.randint(0, 10))
+			for _ in range(rng.randint(1, 6))
+		]
+		expected = Decimal(sum(a.to_decimal() for a in amounts))
+		assert str(Amount.sum(amounts)) == str(expected)
+
+
+def test_add_like_decimal_property() -> None:
+	rng = random.Random(15)
+	for _ in range(5000):
+		a, b = (
+			Amount(rng.randrange(-10 ** 30, 10 ** rng.randint(1, 30)), rng.randint(-2, 10))
+			for _ in range(2)
+		)
+		assert str(a + b) == str(a.to_decimal() + b.to_decimal())
+
+
+def test_equality_ignores_trailing_zeros() -> None:
+	assert Amount(10, 1) == Amount(1)
+	assert hash(Amount(10, 1)) == hash(Amount(1))
+	assert Amount(10, 1) != Amount(2)
+	assert repr(Amount(10, 1)) == "Amount('1.0')"
@@ -0,0 +1,75 @@
+from pathlib import Path
+
+from nd2k.batch import Outcome, Report, convert_many, describe, expand_inputs, is_batch
+
+
+def test_is_batch(tmp_path: Path) -> None:
+	file = tmp_path / "a.csv"
+	file.touch()
+	assert not is_batch([str(file)])
+	assert not is_batch(["missing.csv"])
+	assert is_batch([str(file), str(file)])
+	assert is_batch([str(tmp_path)])
+	assert is_batch([str(tmp_path / "*.csv")])
+
+
+def test_files_named_like_patterns(tmp_path: Path) -> None:
+	for name in ["report[1].csv", "report1.csv"]:
+		(tmp_path / name).touch()
+
+	bracketed = str(tmp_path / "report[1].csv")
+	assert not is_batch([bracketed])
+	assert expand_inputs([bracketed, str(tmp_path / "report1.csv")]) == [
+		bracketed, str(tmp_path / "report1.csv")]
+
+
+def test_expand_inputs(tmp_path: Path) -> None:
+	for name in ["b.csv", "a.csv", "a_koinly_universal.csv", "c.txt"]:
+		(tmp_path / name).touch()
+
+	a, b = str(tmp_path / "a.csv"), str(tmp_path / "b.csv")
+
+	assert expand_inputs([str(tmp_path)]) == [a, b]
+	assert expand_inputs([str(tmp_path / "*.csv"), b]) == [a, b]
+	assert expand_inputs([str(tmp_path / "z*.csv")]) == [str(tmp_path / "z*.csv")]
+
+
+def test_convert_many(tmp_path: Path) -> None:
+	good = tmp_path / "good.csv"
+	bad  = tmp_path / "bad.csv"
+	good.touch()
+	bad.touch()
+
+	def fake_convert(input_file: str) -> tuple[int, int]:
+		if input_file == str(bad):
+			raise ValueError("Incomplete Trades", ["leftovers"])
+		return 10, 3
+
+	files  = [str(good), str(bad), str(tmp_path / "missing.csv")]
+	report = convert_many(files, fake_convert, 1)
+
+	assert not report.succeeded()
+	assert [(o.rows, o.transactions, o.error) for o in report.outcomes] == [
+		(10, 3, None),
+		(0, 0, "Incomplete Trades"),
+		(0, 0, "No such file"),
+	]
+
+
+def test_report_summary() -> None:
+	report = Report([
+		Outcome("a.csv", 0.5, 10, 3),
+		Outcome("b.csv", 0.25, error="Incomplete Swap"),
+	], 0.75)
+
+	assert report.summary() == "\n".join([
+		"OK     a.csv: 10 rows, 3 transactions (0.50s)",
+		"FAILED b.csv: Incomplete Swap (0.25s)",
+		"Converted 1 of 2 files in 0.75s",
+	])
+
+
+def test_describe() -> None:
+	assert describe(ValueError("Incomplete Exchange", object())) == "Incomplete Exchange"
+	assert describe(KeyError("x")) == "'x'"
+	assert describe(RuntimeError()) == "RuntimeError"
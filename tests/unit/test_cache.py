@@ -0,0 +1,141 @@
+import io
+import os
+
+from datetime import timedelta
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from nd2k import cache
+from nd2k.cache import (
+	Cache, dump_records, key, load_counts, load_records, lookup, parse_amounts)
+from nd2k.main import convert, main
+from nd2k.writers import column_batches
+
+
+CONTENTS = (
+	"date,summary,symbol,amount,status\n"
+	"01/01/2024 00:00:02,Taxa de transação,BTC,\"-0,01 BTC(≈R$0.10)\",Sucesso\n"
+	"01/01/2024 00:00:02,Compra(BTC/BRL),BTC,\"+1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:02,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+	"01/01/2024 00:00:01,Troca,BTC,\"-1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:01,Troca,ETH,\"+2,00 ETH(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +100,00\",Sucesso\n"
+	"01/01/2024 00:00:00,Saque em Reais,BRL,\"R$ -1,00\",Falha\n"
+).encode("utf-8")
+
+
+@pytest.fixture
+def export(tmp_path: Path) -> Path:
+	path = tmp_path / "novadax.csv"
+	path.write_bytes(CONTENTS)
+	return path
+
+
+def run(monkeypatch: Any, *args: str) -> None:
+	monkeypatch.setattr("sys.argv", ["nd2k", *args])
+	main()
+
+
+def without_conversions(monkeypatch: Any) -> None:
+	def fail(*args: Any) -> Any:
+		raise AssertionError("converted again")
+	monkeypatch.setattr("nd2k.main.read_successful", fail)
+
+
+def test_converts_once(tmp_path: Path, export: Path, monkeypatch: Any) -> None:
+	run(monkeypatch, "--cache", str(export), "-o", str(tmp_path / "first.csv"))
+	without_conversions(monkeypatch)
+	run(monkeypatch, "--cache", str(export), "-o", str(tmp_path / "again.csv"))
+	run(monkeypatch, "--cache", str(export), "-o", str(tmp_path / "again.csv.gz"), "-o", str(tmp_path / "again.jsonl"))
+
+	monkeypatch.undo()
+	run(monkeypatch, str(export), "-o", str(tmp_path / "fresh.jsonl"))
+
+	assert (tmp_path / "again.csv").read_bytes() == (tmp_path / "first.csv").read_bytes()
+	assert (tmp_path / "again.jsonl").read_bytes() == (tmp_path / "fresh.jsonl").read_bytes()
+
+
+def test_cache_is_opt_in(tmp_path: Path, export: Path, monkeypatch: Any, cache_dir: Path) -> None:
+	run(monkeypatch, str(export))
+	assert not cache_dir.exists() or not list(cache_dir.iterdir())
+
+	run(monkeypatch, "--cache", str(export))
+	without_conversions(monkeypatch)
+	with pytest.raises(AssertionError):
+		run(monkeypatch, str(export))
+
+
+def test_trade_window_is_part_of_the_key(export: Path, monkeypatch: Any) -> None:
+	run(monkeypatch, "--cache", str(export))
+	without_conversions(monkeypatch)
+	with pytest.raises(AssertionError):
+		run(monkeypatch, "--cache", "--trade-window", "60", str(export))
+
+
+def test_only_the_owner_reads_the_cache(export: Path, monkeypatch: Any, cache_dir: Path) -> None:
+	directory = cache_dir / "nd2k"
+	monkeypatch.setenv("ND2K_CACHE_DIR", str(directory))
+	run(monkeypatch, "--cache", str(export))
+	assert os.stat(directory).st_mode & 0o077 == 0
+	for entry in os.scandir(directory):
+		assert entry.stat().st_mode & 0o077 == 0
+
+
+def test_batches_use_the_cache(tmp_path: Path, export: Path, monkeypatch: Any) -> None:
+	assert convert(str(export), str(tmp_path / "first.csv"), cache=True) == (6, 3)
+	without_conversions(monkeypatch)
+	assert convert(str(export), str(tmp_path / "again.csv"), cache=True) == (6, 3)
+
+
+def test_records_read_back_exactly(export: Path) -> None:
+	from nd2k.main import organize_or_raise, order_by_date
+	from nd2k.reader import read_successful
+
+	rows    = list(read_successful(str(export)))
+	batches = list(column_batches(order_by_date(organize_or_raise(rows))))
+
+	f = io.BytesIO()
+	dump_records((6, 3), batches, f)
+	text = io.StringIO(f.getvalue().decode("utf-8"), newline="")
+
+	assert load_counts(text) == (6, 3)
+	assert list(load_records(text)) == batches
+
+	amounts = ("1E+2", "0.10", "-1.5E-7", "")
+	assert [a and str(a) for a in parse_amounts(amounts)] == ["1E+2", "0.10", "-1.5E-7", None]
+
+
+def test_key(export: Path, monkeypatch: Any) -> None:
+	before = key(str(export))
+	assert key(str(export)) == before
+	assert key(str(export), timedelta(seconds=60)) != before
+	assert key(str(export), timedelta(seconds=60)) != key(str(export), timedelta(seconds=1))
+	monkeypatch.setattr(cache, "__version__", "0.0.0")
+	assert key(str(export)) != before
+	assert lookup("-") is None
+
+
+def test_least_recently_used_are_evicted(tmp_path: Path) -> None:
+	lru = Cache(str(tmp_path), max_size=25)
+	for i, name in enumerate("ab"):
+		with lru.put(name, "kind") as f:
+			f.write(b"0123456789")
+		os.utime(lru.path(name, "kind"), (i, i))
+
+	assert lru.get("a", "kind") # now the most recently used
+	assert lru.get("z", "kind") is None
+	with lru.put("c", "kind") as f:
+		f.write(b"0123456789")
+
+	assert sorted(os.listdir(tmp_path)) == ["a.kind", "c.kind"]
+
+
+def test_entries_appear_once_written(tmp_path: Path) -> None:
+	lru = Cache(str(tmp_path), max_size=100)
+	with pytest.raises(RuntimeError), lru.put("a", "kind") as f:
+		f.write(b"half")
+		assert os.listdir(tmp_path) != ["a.kind"]
+		raise RuntimeError
+	assert os.listdir(tmp_path) == []
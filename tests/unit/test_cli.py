@@ -0,0 +1,53 @@
+import subprocess
+import sys
+
+from pathlib import Path
+
+import pytest
+
+import nd2k
+
+
+ROOT = Path(nd2k.__file__).parent.parent
+
+# runs the command, then lists every module it imported on its last line
+PROBE = """
+import atexit, runpy, sys
+atexit.register(lambda: print(*sorted(sys.modules)))
+sys.argv = ["nd2k", *sys.argv[1:]]
+runpy.run_module("nd2k", run_name="__main__")
+"""
+
+# only imported when a conversion needs them
+DEFERRED = [
+	"bz2", "concurrent.futures", "gzip", "json", "lzma", "multiprocessing",
+	"pprint", "sqlite3", "tempfile", "zipfile", "nd2k.parallel", "nd2k.server",
+]
+
+# brought along by shutil, which argparse imports to print its messages
+ARGPARSE = ["bz2", "lzma"]
+
+
+def imported(code: str, *args: str) -> tuple[set[str], subprocess.CompletedProcess[str]]:
+	"""Modules imported by a fresh interpreter running code, as listed on its last line."""
+	result = subprocess.run([sys.executable, "-c", code, *args],
+		cwd=ROOT, capture_output=True, text=True)
+	return set(result.stdout.splitlines()[-1].split()), result
+
+
+@pytest.mark.parametrize("args, exit_code, output", [
+	(["--version"], 0, nd2k.__version__),
+	([],            1, "Usage: nd2k <novadax-csv>"),
+])
+def test_early_exits_skip_the_conversion(args: list[str], exit_code: int, output: str) -> None:
+	modules, result = imported(PROBE, *args)
+	assert result.returncode == exit_code
+	assert output in result.stdout
+	assert "nd2k.cli" in modules
+	assert [m for m in ["nd2k.main", *DEFERRED] if m in modules and m not in ARGPARSE] == []
+
+
+def test_conversion_defers_imports() -> None:
+	modules, _ = imported("import sys, nd2k.main; print(*sorted(sys.modules))")
+	assert "nd2k.main" in modules
+	assert [m for m in DEFERRED if m in modules] == []
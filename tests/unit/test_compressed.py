@@ -0,0 +1,124 @@
+import bz2
+import gzip
+import io
+import lzma
+import zipfile
+
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+from nd2k.batch import expand_inputs
+from nd2k.compressed import codec_of, compressing, decompressed, detect, strip_extension
+from nd2k.main import main, output_path
+from nd2k.reader import read_successful
+
+
+CONTENTS = (
+	"date,summary,symbol,amount,status\n"
+	"01/01/2024 00:00:01,Troca,BTC,\"-1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:01,Troca,ETH,\"+2,00 ETH(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +100,00\",Sucesso\n"
+	"01/01/2024 00:00:00,Saque em Reais,BRL,\"R$ -1,00\",Falha\n"
+).encode("utf-8")
+
+
+def zipped(data: bytes) -> bytes:
+	buffer = io.BytesIO()
+	with zipfile.ZipFile(buffer, "w") as archive:
+		archive.writestr("readme.txt", b"not this one")
+		archive.writestr("novadax.csv", data)
+	return buffer.getvalue()
+
+
+COMPRESSORS: dict[str, Callable[[bytes], bytes]] = {
+	".gz":  gzip.compress,
+	".bz2": bz2.compress,
+	".xz":  lzma.compress,
+	".zip": zipped,
+}
+
+
+@pytest.mark.parametrize("extension", COMPRESSORS)
+def test_reads_compressed_exports(tmp_path: Path, extension: str) -> None:
+	plain      = tmp_path / "novadax.csv"
+	compressed = tmp_path / f"novadax.csv{extension}"
+	plain.write_bytes(CONTENTS)
+	compressed.write_bytes(COMPRESSORS[extension](CONTENTS))
+
+	expected = list(read_successful(str(plain)))
+	assert len(expected) == 3
+	assert list(read_successful(str(compressed), block_size=16)) == expected
+
+
+@pytest.mark.parametrize("extension", COMPRESSORS)
+def test_writes_compressed_outputs(tmp_path: Path, monkeypatch: Any, extension: str) -> None:
+	(tmp_path / "novadax.csv").write_bytes(CONTENTS)
+	monkeypatch.setattr("sys.argv", ["nd2k", str(tmp_path / "novadax.csv")])
+	main()
+	expected = (tmp_path / "novadax_koinly_universal.csv").read_bytes()
+
+	output = tmp_path / f"koinly.csv{extension}"
+	monkeypatch.setattr("sys.argv", ["nd2k", "-o", str(output), str(tmp_path / "novadax.csv")])
+	main()
+
+	with open(output, "rb") as f, decompressed(f, codec_of(str(output)) or "") as copy:
+		assert copy.read() == expected
+	if extension == ".zip":
+		assert zipfile.ZipFile(output).namelist() == ["koinly.csv"]
+
+
+def test_compressed_standard_input(tmp_path: Path, capsysbinary: Any, monkeypatch: Any) -> None:
+	(tmp_path / "novadax.csv").write_bytes(CONTENTS)
+	monkeypatch.setattr("sys.argv", ["nd2k", str(tmp_path / "novadax.csv")])
+	main()
+	expected = (tmp_path / "novadax_koinly_universal.csv").read_bytes()
+
+	stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(gzip.compress(CONTENTS))))
+	monkeypatch.setattr("sys.stdin", stdin)
+	monkeypatch.setattr("sys.argv", ["nd2k", "-"])
+	main()
+	assert capsysbinary.readouterr().out == expected
+
+
+def test_compressed_inputs_get_compressed_outputs() -> None:
+	assert output_path("export.csv.gz") == "export_koinly_universal.csv.gz"
+	assert output_path("export.zip")    == "export_koinly_universal.csv.zip"
+	assert output_path("export.csv")    == "export_koinly_universal.csv"
+
+
+def test_batch_finds_compressed_exports(tmp_path: Path) -> None:
+	for name in ["a.csv.gz", "b.csv", "a_koinly_universal.csv.gz", "c.gz"]:
+		(tmp_path / name).touch()
+	assert expand_inputs([str(tmp_path)]) == [str(tmp_path / "a.csv.gz"), str(tmp_path / "b.csv")]
+
+
+def test_detect() -> None:
+	assert detect(gzip.compress(b"x")) == "gzip"
+	assert detect(bz2.compress(b"x"))  == "bz2"
+	assert detect(lzma.compress(b"x")) == "xz"
+	assert detect(zipped(b"x"))        == "zip"
+	assert detect(CONTENTS) is None
+	assert detect(b"") is None
+
+
+def test_strip_extension() -> None:
+	assert strip_extension("a/export.csv.GZ") == ("a/export.csv", ".GZ")
+	assert strip_extension("export.csv")      == ("export.csv", "")
+	assert codec_of("export.csv.zst") == "zstd"
+	assert codec_of("export.csv") is None
+
+
+def test_zip_without_files(tmp_path: Path) -> None:
+	with zipfile.ZipFile(tmp_path / "empty.zip", "w"):
+		pass
+	with open(tmp_path / "empty.zip", "rb") as f, pytest.raises(ValueError) as e:
+		decompressed(f, "zip")
+	assert str(e.value) == "Empty zip archive"
+
+
+def test_compressing(tmp_path: Path) -> None:
+	with compressing(str(tmp_path / "out.csv.gz"), "gzip") as f:
+		f.write(b"a,b\r\n")
+	assert gzip.decompress((tmp_path / "out.csv.gz").read_bytes()) == b"a,b\r\n"
@@ -1,13 +1,10 @@
-from typing import cast
-
-from nd2k.exchange import Exchange, combine
-from nd2k.transaction import Transaction, group_by_timestamp
+from nd2k.exchange import Exchange
+from nd2k.transaction import combine
 
 
 def test_combine() -> None:
 	exchanges = example_exchanges()
-	groups    = group_by_timestamp(cast(list[Transaction], exchanges)).values()
-	combined  = [combine(cast(list[Exchange], g)) for g in groups]
+	combined  = combine(exchanges)
 
 	assert len(combined) == 0
 
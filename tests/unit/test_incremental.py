@@ -0,0 +1,139 @@
+from pathlib import Path
+
+import pytest
+
+from nd2k.incremental import Checkpoint, checkpoint_path, convert_incrementally
+from nd2k.main import stream
+
+
+HEADER = "date,summary,symbol,amount,status\r\n"
+
+OLD_ROWS = (
+	"01/01/2024 00:00:01,Taxa de transação,BTC,\"-0,01 BTC(≈R$0.10)\",Sucesso\r\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BTC,\"+1,00 BTC(≈R$10.00)\",Sucesso\r\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\r\n"
+	"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +100,00\",Sucesso\r\n"
+)
+
+# another fill of the same trade, and a deposit afterwards
+NEW_ROWS = (
+	"01/01/2024 00:00:02,Depósito em Reais,BRL,\"R$ +5,00\",Sucesso\r\n"
+	"01/01/2024 00:00:01,Taxa de transação,BTC,\"-0,005 BTC(≈R$0.05)\",Sucesso\r\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BTC,\"+0,50 BTC(≈R$5.00)\",Sucesso\r\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BRL,\"R$ -5,00\",Sucesso\r\n"
+	"01/01/2024 00:00:01,Saque em Reais,BRL,\"R$ -1,00\",Falha\r\n"
+)
+
+
+def converted_from_scratch(tmp_path: Path, contents: str) -> str:
+	input_file = tmp_path / "scratch.csv"
+	input_file.write_text(contents, encoding="utf-8")
+	stream(str(input_file), [str(tmp_path / "scratch_out.csv")])
+	return (tmp_path / "scratch_out.csv").read_text(encoding="utf-8")
+
+
+def test_resumes_from_checkpoint(tmp_path: Path) -> None:
+	input_file  = tmp_path / "export.csv"
+	output_file = tmp_path / "export_koinly_universal.csv"
+
+	input_file.write_text(HEADER + OLD_ROWS, encoding="utf-8")
+	assert convert_incrementally(str(input_file), str(output_file)) == (4, 0)
+	assert output_file.read_text(encoding="utf-8") == converted_from_scratch(
+		tmp_path, HEADER + OLD_ROWS)
+
+	input_file.write_text(HEADER + NEW_ROWS + OLD_ROWS, encoding="utf-8")
+	assert convert_incrementally(str(input_file), str(output_file)) == (5, 0)
+	assert output_file.read_text(encoding="utf-8") == converted_from_scratch(
+		tmp_path, HEADER + NEW_ROWS + OLD_ROWS)
+
+	# nothing new
+	assert convert_incrementally(str(input_file), str(output_file)) == (0, 0)
+	assert output_file.read_text(encoding="utf-8") == converted_from_scratch(
+		tmp_path, HEADER + NEW_ROWS + OLD_ROWS)
+
+
+def test_starts_over_when_converted_rows_changed(tmp_path: Path) -> None:
+	input_file  = tmp_path / "export.csv"
+	output_file = tmp_path / "export_koinly_universal.csv"
+
+	input_file.write_text(HEADER + OLD_ROWS, encoding="utf-8")
+	convert_incrementally(str(input_file), str(output_file))
+
+	edited = OLD_ROWS.replace("+100,00", "+200,00")
+	input_file.write_text(HEADER + NEW_ROWS + edited, encoding="utf-8")
+	assert convert_incrementally(str(input_file), str(output_file)) == (9, 0)
+	assert output_file.read_text(encoding="utf-8") == converted_from_scratch(
+		tmp_path, HEADER + NEW_ROWS + edited)
+
+
+def test_starts_over_without_output(tmp_path: Path) -> None:
+	input_file  = tmp_path / "export.csv"
+	output_file = tmp_path / "export_koinly_universal.csv"
+
+	input_file.write_text(HEADER + OLD_ROWS, encoding="utf-8")
+	convert_incrementally(str(input_file), str(output_file))
+	output_file.unlink()
+
+	assert convert_incrementally(str(input_file), str(output_file)) == (4, 0)
+
+
+def test_checkpoint_keeps_open_window(tmp_path: Path) -> None:
+	input_file  = tmp_path / "export.csv"
+	output_file = tmp_path / "export_koinly_universal.csv"
+
+	input_file.write_text(HEADER + OLD_ROWS, encoding="utf-8")
+	convert_incrementally(str(input_file), str(output_file))
+
+	checkpoint = Checkpoint.load(checkpoint_path(str(output_file)))
+	assert checkpoint is not None
+	assert [row[1] for row in checkpoint.window] == [
+		"Compra(BTC/BRL)", "Compra(BTC/BRL)", "Taxa de transação"
+	]
+	assert checkpoint.tail_size == len(OLD_ROWS.encode("utf-8"))
+
+
+def test_invalid_checkpoint_is_ignored(tmp_path: Path) -> None:
+	path = tmp_path / "export_koinly_universal.csv.checkpoint"
+	path.write_text("{\"version\": ", encoding="utf-8")
+	assert Checkpoint.load(str(path)) is None
+
+
+def test_holds_back_trade_awaiting_its_fee(tmp_path: Path) -> None:
+	input_file  = tmp_path / "export.csv"
+	output_file = tmp_path / "export_koinly_universal.csv"
+
+	fills = (
+		"01/01/2024 00:00:01,Compra(BTC/BRL),BTC,\"+1,00 BTC(≈R$10.00)\",Sucesso\r\n"
+		"01/01/2024 00:00:01,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\r\n"
+		"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +100,00\",Sucesso\r\n"
+	)
+	fee = "01/01/2024 00:00:02,Taxa de transação,BTC,\"-0,01 BTC(≈R$0.10)\",Sucesso\r\n"
+
+	input_file.write_text(HEADER + fills, encoding="utf-8")
+	assert convert_incrementally(str(input_file), str(output_file)) == (3, 2)
+	assert output_file.read_text(encoding="utf-8") == converted_from_scratch(
+		tmp_path, HEADER + fills.split("\r\n", 2)[2])
+
+	input_file.write_text(HEADER + fee + fills, encoding="utf-8")
+	assert convert_incrementally(str(input_file), str(output_file)) == (1, 0)
+	assert output_file.read_text(encoding="utf-8") == converted_from_scratch(
+		tmp_path, HEADER + fee + fills)
+
+
+def test_failure_leaves_output_and_checkpoint(tmp_path: Path) -> None:
+	input_file  = tmp_path / "export.csv"
+	output_file = tmp_path / "export_koinly_universal.csv"
+	checkpoint  = Path(checkpoint_path(str(output_file)))
+
+	input_file.write_text(HEADER + OLD_ROWS, encoding="utf-8")
+	convert_incrementally(str(input_file), str(output_file))
+	before = output_file.read_bytes(), checkpoint.read_bytes()
+
+	unknown = "01/01/2024 00:00:02,Unknown,BRL,\"R$ +5,00\",Sucesso\r\n"
+	input_file.write_text(HEADER + unknown + OLD_ROWS, encoding="utf-8")
+	with pytest.raises(ValueError):
+		convert_incrementally(str(input_file), str(output_file))
+
+	assert (output_file.read_bytes(), checkpoint.read_bytes()) == before
+	assert sorted(p.name for p in tmp_path.iterdir()) == sorted([
+		checkpoint.name, input_file.name, output_file.name])
@@ -1,9 +1,16 @@
+import io
 import pytest
 import nd2k
-from nd2k.main import main
+from nd2k.main import main, route, collect_routed, order_by_date, stream_transactions
+from nd2k.nontrade import NonTrade
+from nd2k.operation import OperationType
 
+from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Any
 
+from .helpers import fake_op
+
 
 def test_no_input_file(capsys: Any, monkeypatch: Any) -> None:
 	monkeypatch.setattr("sys.argv", ["nd2k"])
@@ -13,6 +20,21 @@ def test_no_input_file(capsys: Any, monkeypatch: Any) -> None:
 	assert "Usage: nd2k <novadax-csv>" in capsys.readouterr().out
 
 
+@pytest.mark.parametrize("argv, message", [
+	(["--jobs", "x", "a.csv"],  "nd2k: argument -j/--jobs: invalid positive value: 'x'"),
+	(["--bogus", "a.csv"],      "nd2k: unrecognized arguments: --bogus"),
+	(["a.csv", "--output"],     "nd2k: argument -o/--output: expected one argument"),
+])
+def test_argument_errors(capsys: Any, monkeypatch: Any, argv: list[str], message: str) -> None:
+	monkeypatch.setattr("sys.argv", ["nd2k", *argv])
+	with pytest.raises(SystemExit) as exc_info:
+		main()
+	assert exc_info.value.code == 1
+	out, err = capsys.readouterr()
+	assert out == "Usage: nd2k <novadax-csv>\n"
+	assert err == f"{message} (see nd2k --help)\n"
+
+
 def test_input_file_does_not_exist(capsys: Any, monkeypatch: Any) -> None:
 	monkeypatch.setattr("sys.argv", ["nd2k", "invalid-file.csv"])
 	with pytest.raises(SystemExit) as exc_info:
@@ -35,3 +57,215 @@ def test_version_long_form(capsys: Any, monkeypatch: Any) -> None:
 		main()
 	assert exc_info.value.code == 0
 	assert nd2k.__version__ in capsys.readouterr().out
+
+
+def test_batch(tmp_path: Path, capsys: Any, monkeypatch: Any) -> None:
+	(tmp_path / "good.csv").write_text(
+		"date,summary,symbol,amount,status\n"
+		"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +1,00\",Sucesso\n")
+	(tmp_path / "bad.csv").write_text(
+		"date,summary,symbol,amount,status\n"
+		"01/01/2024 00:00:00,Troca,BRL,R$ -1,Sucesso\n")
+
+	monkeypatch.setattr("sys.argv", ["nd2k", "--jobs", "2", str(tmp_path)])
+	with pytest.raises(SystemExit) as exc_info:
+		main()
+	assert exc_info.value.code == 1
+
+	out = capsys.readouterr().out
+	assert f"FAILED {tmp_path / 'bad.csv'}: Incomplete Swap" in out
+	assert f"OK     {tmp_path / 'good.csv'}: 1 rows, 1 transactions" in out
+	assert "Converted 1 of 2 files" in out
+	assert (tmp_path / "good_koinly_universal.csv").exists()
+
+
+def test_route_reports_errors_in_category_order() -> None:
+	ops = [
+		fake_op(type=OperationType.TRADING_FEE, summary="Taxa de transação"),
+		fake_op(type=OperationType.SWAP),
+	]
+	routed = route(ops)
+	with pytest.raises(ValueError) as e:
+		collect_routed(routed)
+	assert e.value.args[0] == "Incomplete Swap"
+
+	del routed["swaps"]
+	with pytest.raises(ValueError) as e:
+		collect_routed(routed)
+	assert str(e.value) == "No trading pair found in \"Taxa de transação\""
+
+
+def test_order_by_date_merges_categories() -> None:
+	def at(hour: int, summary: str) -> NonTrade:
+		return NonTrade(operation=fake_op(
+			type=OperationType.FIAT_DEPOSIT, date=datetime(2024, 1, 1, hour), summary=summary))
+
+	first  = [at(1, "a"), at(3, "b"), at(3, "c")]
+	second = [at(0, "d"), at(3, "e"), at(4, "f")]
+
+	ordered = order_by_date([first, second])
+	assert [t.format()[10] for t in ordered] == ["d", "a", "b", "c", "e", "f"]
+	assert ordered == sorted(first + second, key=lambda t: t.date)
+
+
+def test_categories_are_built_in_chronological_order() -> None:
+	ops = [
+		fake_op(type=OperationType.FIAT_DEPOSIT, date=datetime(2024, 1, 1, 5)),
+		fake_op(type=OperationType.FIAT_DEPOSIT, date=datetime(2024, 1, 1, 2)),
+	]
+	nontrades = collect_routed(route(ops))[3]
+	assert [t.date.hour for t in nontrades] == [2, 5]
+
+
+DEPOSIT = (
+	"date,summary,symbol,amount,status\n"
+	"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +1,00\",Sucesso\n"
+)
+
+
+@pytest.mark.parametrize("options", [[], ["--stream"]])
+def test_standard_input_to_standard_output(
+	tmp_path: Path, capsysbinary: Any, monkeypatch: Any, options: list[str]
+) -> None:
+	(tmp_path / "novadax.csv").write_text(DEPOSIT, encoding="utf-8")
+	monkeypatch.setattr("sys.argv", ["nd2k", str(tmp_path / "novadax.csv")])
+	main()
+	expected = (tmp_path / "novadax_koinly_universal.csv").read_bytes()
+
+	stdin = io.TextIOWrapper(io.BytesIO(DEPOSIT.encode("utf-8")), encoding="utf-8")
+	monkeypatch.setattr("sys.stdin", stdin)
+	monkeypatch.setattr("sys.argv", ["nd2k", *options, "-"])
+	main()
+	assert capsysbinary.readouterr().out == expected
+
+
+def test_errors_stay_out_of_standard_output(tmp_path: Path, capsys: Any, monkeypatch: Any) -> None:
+	(tmp_path / "bad.csv").write_text(
+		"date,summary,symbol,amount,status\n"
+		"01/01/2024 00:00:00,Troca,BRL,R$ -1,Sucesso\n")
+
+	monkeypatch.setattr("sys.argv", ["nd2k", "-o", "-", str(tmp_path / "bad.csv")])
+	with pytest.raises(SystemExit):
+		main()
+	captured = capsys.readouterr()
+	assert captured.out == ""
+	assert "Incomplete Swap" in captured.err
+
+
+def test_stream_gives_up_on_stale_trades_right_away() -> None:
+	def rows() -> Any:
+		yield ["31/12/2023 23:59:59", "Depósito em Reais", "BRL", "R$ +1,00", "Sucesso"]
+		yield ["01/01/2024 00:00:00", "Compra(BTC/BRL)",   "BRL", "R$ -10,00", "Sucesso"]
+		yield ["01/01/2024 00:00:30", "Depósito em Reais", "BRL", "R$ +1,00", "Sucesso"]
+		raise AssertionError("read too far")
+
+	transactions = stream_transactions(rows(), timedelta(seconds=10))
+	assert next(transactions).date == datetime(2023, 12, 31, 23, 59, 59)
+	with pytest.raises(ValueError, match="Incomplete Trades"):
+		next(transactions)
+
+
+def test_stream_leaves_outputs_as_they_were(tmp_path: Path, capsys: Any, monkeypatch: Any) -> None:
+	(tmp_path / "bad.csv").write_text(
+		"date,summary,symbol,amount,status\n"
+		"01/01/2024 00:00:01,Troca,BRL,R$ -1,Sucesso\n"
+		+ DEPOSIT.splitlines()[1] + "\n")
+	output = tmp_path / "out.csv"
+	output.write_text("earlier")
+
+	monkeypatch.setattr("sys.argv", ["nd2k", "--stream", "-o", str(output), str(tmp_path / "bad.csv")])
+	with pytest.raises(SystemExit):
+		main()
+	assert "could not find a match" in capsys.readouterr().out
+	assert output.read_text() == "earlier"
+	assert sorted(p.name for p in tmp_path.iterdir()) == ["bad.csv", "out.csv"]
+
+
+def test_stream_raises_parse_errors_as_they_are(tmp_path: Path, monkeypatch: Any) -> None:
+	(tmp_path / "bad.csv").write_text(
+		"date,summary,symbol,amount,status\n"
+		"01/01/2024 00:00:00,Unknown,BRL,R$ -1,Sucesso\n")
+
+	monkeypatch.setattr("sys.argv", ["nd2k", "--stream", str(tmp_path / "bad.csv")])
+	with pytest.raises(ValueError, match="'Unknown' is not a valid OperationType"):
+		main()
+	assert [p.name for p in tmp_path.iterdir()] == ["bad.csv"]
+
+
+@pytest.mark.parametrize("options, error", [
+	(["--trade-window", "1", "--jobs", "2"], "Error: --trade-window can't be combined"),
+	(["--trade-window", "-1"],               "Error: --trade-window can't be negative"),
+	(["--trade-window", "nan"],              "Error: --trade-window must be a finite number"),
+	(["--trade-window", "inf"],              "Error: --trade-window must be a finite number"),
+	(["--trade-window", "1e300"],            "Error: --trade-window is too large"),
+])
+def test_trade_window_errors(
+	tmp_path: Path, capsys: Any, monkeypatch: Any, options: list[str], error: str
+) -> None:
+	(tmp_path / "novadax.csv").write_text(DEPOSIT, encoding="utf-8")
+	monkeypatch.setattr("sys.argv", ["nd2k", *options, str(tmp_path / "novadax.csv")])
+	with pytest.raises(SystemExit) as exc_info:
+		main()
+	assert exc_info.value.code == 1
+	assert error in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("options, error", [
+	(["--stream", "--incremental"], "Error: --stream can't be combined with --incremental"),
+	(["--stream", "--jobs", "2"],   "Error: --jobs can't be combined with --stream"),
+	(["--stream", "--cache"],       "Error: --cache can't be combined with --stream"),
+	(["--profile", "p", "--jobs", "2"], "Error: --jobs can't be combined with --stats"),
+	(["--stats", "--stream"],       "Error: --stats can't be combined with --stream"),
+	(["--incremental", "--stats"],  "Error: --stats can't be combined with --incremental"),
+	(["--jobs", "0"],               "Usage: nd2k <novadax-csv>"),
+	(["--jobs", "-2"],              "Usage: nd2k <novadax-csv>"),
+])
+def test_options_the_mode_makes_no_use_of(
+	tmp_path: Path, capsys: Any, monkeypatch: Any, options: list[str], error: str
+) -> None:
+	(tmp_path / "novadax.csv").write_text(DEPOSIT, encoding="utf-8")
+	monkeypatch.setattr("sys.argv", ["nd2k", *options, str(tmp_path / "novadax.csv")])
+	with pytest.raises(SystemExit) as exc_info:
+		main()
+	assert exc_info.value.code == 1
+	assert error in capsys.readouterr().out
+	assert [p.name for p in tmp_path.iterdir()] == ["novadax.csv"]
+
+
+@pytest.mark.parametrize("options", [
+	["--stream"], ["--incremental"], ["--stats"], ["--profile", "p"], ["--tolerant"],
+	["--trade-window", "1"], ["--output", "out.csv"], ["--jobs", "0"],
+])
+def test_options_batches_make_no_use_of(
+	tmp_path: Path, capsys: Any, monkeypatch: Any, options: list[str]
+) -> None:
+	for name in ["a.csv", "b.csv"]:
+		(tmp_path / name).write_text(DEPOSIT, encoding="utf-8")
+	monkeypatch.setattr("sys.argv", ["nd2k", *options, str(tmp_path / "*.csv")])
+	with pytest.raises(SystemExit) as exc_info:
+		main()
+	assert exc_info.value.code == 1
+	assert capsys.readouterr().out.startswith(("Error: ", "Usage: "))
+	assert sorted(p.name for p in tmp_path.iterdir()) == ["a.csv", "b.csv"]
+
+
+def test_output_option(tmp_path: Path, monkeypatch: Any) -> None:
+	(tmp_path / "novadax.csv").write_text(DEPOSIT, encoding="utf-8")
+	monkeypatch.setattr("sys.argv", [
+		"nd2k", "--output", str(tmp_path / "elsewhere.csv"), str(tmp_path / "novadax.csv")])
+	main()
+	assert (tmp_path / "elsewhere.csv").exists()
+	assert not (tmp_path / "novadax_koinly_universal.csv").exists()
+
+
+@pytest.mark.parametrize("argv, error", [
+	(["-o", "out.csv", "a.csv", "b.csv"], "Error: --output takes a single input file"),
+	(["--incremental", "-"], "Error: --incremental needs uncompressed input and output files"),
+])
+def test_output_option_errors(capsys: Any, monkeypatch: Any, argv: list[str], error: str) -> None:
+	monkeypatch.setattr("sys.argv", ["nd2k", *argv])
+	with pytest.raises(SystemExit) as exc_info:
+		main()
+	assert exc_info.value.code == 1
+	assert error in capsys.readouterr().out
+
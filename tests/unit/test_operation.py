@@ -1,8 +1,13 @@
 import pytest
+import random
+import re
+import unicodedata
 
-from datetime import datetime
+from datetime import datetime, timedelta
 from decimal import Decimal
+from typing import Any, Callable
 
+from nd2k.amount import Amount
 from nd2k.operation import OperationType, Operation
 from .helpers import fake_op
 
@@ -17,21 +22,21 @@ def test_parse_date() -> None:
 def test_parse_amount_no_commas() -> None:
 	data     = "+12345678901234567890 SHIB(≈R$0)"
 	actual   = Operation.parse_amount(data)
-	expected = Decimal(12345678901234567890)
+	expected = Amount(12345678901234567890)
 	assert actual == expected
 
 
 def test_parse_amount_one_comma() -> None:
 	data     = "R$ -355,77"
 	actual   = Operation.parse_amount(data)
-	expected = Decimal("355.77")
+	expected = Amount(35577, 2)
 	assert actual == expected
 
 
 def test_parse_amount_multiple_commas() -> None:
 	data     = "-121,162,430,769,2304 BABYDOGE2(≈R$0.45)"
 	actual   = Operation.parse_amount(data)
-	expected = Decimal("121162430769.2304")
+	expected = Amount(1211624307692304, 4)
 	assert actual == expected
 
 
@@ -42,6 +47,88 @@ def test_parse_amount_invalid() -> None:
 	assert str(e.value) == f"No numeric values found in \"{data}\""
 
 
+def test_parse_amount_commas_only() -> None:
+	with pytest.raises(ValueError) as e:
+		Operation.parse_amount("R$ ,")
+	assert str(e.value) == "No numeric values found in \"R$ ,\""
+
+
+# Straightforward implementations the fast parsers must agree with.
+def reference_parse_date(data: str) -> datetime:
+	return datetime.strptime(data, "%d/%m/%Y %H:%M:%S")
+
+
+def reference_parse_amount(data: str) -> Decimal:
+	matches = re.search(r"^\D*([,\d]+)", data)
+	if not matches or not re.search(r"\d", matches.group(1)):
+		raise ValueError(f"No numeric values found in \"{data}\"")
+	parts = matches.group(1).split(",")
+	last_part = parts.pop()
+	if not len(parts):
+		return Decimal(last_part)
+	return Decimal(f"{''.join(parts)}.{last_part}")
+
+
+def reference_parse_summary(data: str) -> tuple[str, OperationType]:
+	summary = unicodedata.normalize("NFC", data)
+	return summary, OperationType(summary.split("(")[0])
+
+
+def outcome(func: Callable[[str], Any], data: str) -> Any:
+	try:
+		return func(data)
+	except Exception as e:
+		return type(e), str(e)
+
+
+def rendered(func: Callable[[str], Any]) -> Callable[[str], str]:
+	return lambda data: str(func(data))
+
+
+def test_parse_date_property() -> None:
+	rng = random.Random(6)
+	start = datetime(1900, 1, 1)
+	for _ in range(5000):
+		date = start + timedelta(seconds=rng.randrange(200 * 366 * 24 * 3600))
+		data = date.strftime("%d/%m/%Y %H:%M:%S")
+		if rng.random() < .5:
+			data = mutate(rng, data, "0123456789/: 9x٣")
+		assert outcome(Operation.parse_date, data) == outcome(reference_parse_date, data)
+
+
+def test_parse_amount_property() -> None:
+	rng = random.Random(6)
+	for _ in range(5000):
+		data = "".join(rng.choice("0123456789,,,.+- R$≈()٣AB") for _ in range(rng.randrange(12)))
+		assert (outcome(rendered(Operation.parse_amount), data)
+			== outcome(rendered(reference_parse_amount), data))
+
+
+def test_parse_summary_property() -> None:
+	rng = random.Random(6)
+	names = [t.value for t in OperationType] + ["Unknown"]
+	for _ in range(2000):
+		data = rng.choice(names) + rng.choice(["", "(ABC/BRL)", "(X"])
+		if rng.random() < .5:
+			data = unicodedata.normalize("NFD", data)
+		assert outcome(Operation.parse_summary, data) == outcome(reference_parse_summary, data)
+
+
+def mutate(rng: random.Random, data: str, alphabet: str) -> str:
+	chars = list(data)
+	for _ in range(rng.randrange(1, 3)):
+		i = rng.randrange(len(chars) + 1)
+		action = rng.choice(["insert", "replace", "delete"])
+		if action == "insert":
+			chars.insert(i, rng.choice(alphabet))
+		elif chars and i < len(chars):
+			if action == "replace":
+				chars[i] = rng.choice(alphabet)
+			else:
+				del chars[i]
+	return "".join(chars)
+
+
 def test_create_operation_from_csv_row() -> None:
 	row = [
 		"15/03/1970 23:45:56",
@@ -56,12 +143,29 @@ def test_create_operation_from_csv_row() -> None:
 		type    = OperationType.BUY,
 		summary = "Compra(ABC/BRL)",
 		symbol  = "ABC",
-		amount  = Decimal("1234.567"),
+		amount  = Amount(1234567, 3),
 		status  = "Sucesso",
 	)
 	assert actual == expected
 
 
+def test_operations_share_repeated_strings() -> None:
+	rows = [[
+		"15/03/1970 23:45:56",
+		"".join(["Compra", "(ABC/BRL)"]),
+		"".join(["A", "BC"]),
+		"+1 ABC",
+		"".join(["Suc", "esso"]),
+	] for _ in range(2)]
+	a, b = [Operation.from_csv_row(r) for r in rows]
+
+	assert rows[0][1] is not rows[1][1]
+	assert a.summary is b.summary
+	assert a.symbol  is b.symbol
+	assert a.status  is b.status
+	assert not hasattr(a, "__dict__")
+
+
 def test_is_successful() -> None:
 	assert fake_op(status="Sucesso").is_successful()
 	assert not fake_op(status="Other").is_successful()
@@ -79,3 +183,34 @@ def test_is_a_non_trade() -> None:
 	assert fake_op(type=OperationType.FIAT_WITHDRAW).is_a_non_trade()
 	assert fake_op(type=OperationType.WITHDRAW_FEE).is_a_non_trade()
 	assert fake_op(type=OperationType.REDEEMED_BONUS).is_a_non_trade()
+
+
+def test_every_type_has_a_category() -> None:
+	for t in OperationType:
+		op = fake_op(type=t)
+		assert [
+			op.is_a_swap(),
+			op.belongs_to_trade(),
+			op.belongs_to_an_exchange(),
+			op.is_a_non_trade(),
+		].count(True) == 1
+
+
+def test_belongs_to_trade() -> None:
+	assert fake_op(type=OperationType.BUY).belongs_to_trade()
+	assert fake_op(type=OperationType.SELL).belongs_to_trade()
+	assert fake_op(type=OperationType.TRADING_FEE).belongs_to_trade()
+	assert not fake_op(type=OperationType.EXCHANGE_FEE).belongs_to_trade()
+
+
+def test_belongs_to_an_exchange() -> None:
+	assert fake_op(type=OperationType.EXCHANGE).belongs_to_an_exchange()
+	assert fake_op(type=OperationType.EXCHANGE_FEE).belongs_to_an_exchange()
+	assert not fake_op(type=OperationType.TRADING_FEE).belongs_to_an_exchange()
+
+
+def test_is_sending_funds() -> None:
+	assert fake_op(type=OperationType.CRYPTO_WITHDRAW).is_sending_funds()
+	assert fake_op(type=OperationType.FIAT_WITHDRAW).is_sending_funds()
+	assert fake_op(type=OperationType.WITHDRAW_FEE).is_sending_funds()
+	assert not fake_op(type=OperationType.CRYPTO_DEPOSIT).is_sending_funds()
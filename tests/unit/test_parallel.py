@@ -0,0 +1,197 @@
+import gzip
+import pytest
+
+from datetime import datetime, timedelta
+from nd2k.amount import Amount
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Any
+
+from nd2k.operation import Operation, OperationType
+from nd2k.main import parse_successful_rows
+from nd2k.parallel import (
+	build_in_parallel, decode, encode, parse_in_parallel, split_in_ranges, split_in_windows)
+from nd2k.reader import read_successful
+from nd2k.swap import SwapBuilder
+from nd2k.trade import TradeBuilder, build
+
+from .helpers import fake_op
+
+
+START = datetime(2024, 1, 1)
+
+
+def test_split_in_windows() -> None:
+	ops = [fake_op(date=START + timedelta(seconds=s)) for s in [0, 0, 1, 1, 1, 2, 3]]
+	windows = split_in_windows(ops, 2)
+	assert windows == [ops[0:2], ops[2:5], ops[5:7]]
+
+
+def test_split_in_windows_keeps_timestamps_together() -> None:
+	ops = [fake_op(date=START + timedelta(seconds=s)) for s in [0, 2, 1, 3, 2, 4]]
+	windows = split_in_windows(ops, 1)
+	assert windows == [ops[0:1], ops[1:5], ops[5:6]]
+
+
+def test_split_in_windows_empty() -> None:
+	assert split_in_windows([], 10) == []
+
+
+def test_build_in_parallel_matches_serial() -> None:
+	ops = example_trade_operations(30)
+	serial = build(ops)
+	for window_size in [1, 2, 5, 100]:
+		[parallel] = build_in_parallel([(TradeBuilder, ops)], 2, window_size)
+		assert parallel == serial
+
+
+def test_build_in_parallel_merges_windows_awaiting_a_match() -> None:
+	ops = example_trade_operations(4)
+	fee = ops.pop(5) # second fee now comes one second later
+	fee.date = START + timedelta(seconds=1)
+	ops.insert(8, fee)
+
+	[parallel] = build_in_parallel([(TradeBuilder, ops)], 2, 1)
+	assert parallel == build(ops)
+
+
+class CountingTradeBuilder(TradeBuilder):
+	added = 0 # on this process only
+
+	def add(self, op: Operation) -> None:
+		CountingTradeBuilder.added += 1
+		super().add(op)
+
+
+def test_build_in_parallel_carries_on_from_windows_awaiting_a_match() -> None:
+	common: dict[str, Any] = {"type": OperationType.BUY, "summary": "Compra(LONE/BRL)"}
+	later = START + timedelta(seconds=60)
+	ops = [
+		fake_op(**common, date=START, symbol="LONE", amount=Amount(1)),
+		*example_trade_operations(60),
+		fake_op(**common, date=later, symbol="BRL", amount=Amount(2)),
+		fake_op(
+			date    = later,
+			type    = OperationType.TRADING_FEE,
+			summary = "Taxa de transação",
+			symbol  = "LONE",
+			amount  = Amount(3)),
+	]
+
+	CountingTradeBuilder.added = 0
+	[parallel] = build_in_parallel([(CountingTradeBuilder, ops)], 2, 3)
+	assert parallel == build(ops)
+	assert CountingTradeBuilder.added <= len(ops)
+
+
+def test_build_in_parallel_raises_like_serial() -> None:
+	swaps = [fake_op(type=OperationType.SWAP, date=START + timedelta(seconds=s))
+		for s in range(5)]
+
+	with pytest.raises(ValueError) as expected:
+		builder = SwapBuilder()
+		for op in swaps:
+			builder.add(op)
+		builder.collect()
+
+	with pytest.raises(ValueError) as actual:
+		build_in_parallel([(SwapBuilder, swaps)], 2, 1)
+
+	[error, partial] = actual.value.args
+	assert error == expected.value.args[0]
+	assert vars(partial) == vars(expected.value.args[1])
+
+
+def example_trade_operations(n: int) -> list[Operation]:
+	ops = []
+	for i in range(n):
+		date = START + timedelta(seconds=i // 2)
+		summary = f"Compra(T{i % 3}/BRL)"
+		common: dict[str, Any] = {"date": date, "type": OperationType.BUY, "summary": summary}
+		ops += [
+			fake_op(**common, symbol=f"T{i % 3}", amount=Amount(i + 1)),
+			fake_op(**common, symbol="BRL", amount=Amount(i + 2)),
+			fake_op(
+				date    = date,
+				type    = OperationType.TRADING_FEE,
+				summary = "Taxa de transação",
+				symbol  = f"T{i % 3}",
+				amount  = Amount(i + 3)),
+		]
+	return ops
+
+
+def export(tmp_path: Path, rows: int) -> Path:
+	lines = ["date,summary,symbol,amount,status"]
+	for i in range(rows):
+		date = (START + timedelta(seconds=i // 3)).strftime("%d/%m/%Y %H:%M:%S")
+		status = "Falha" if i % 7 == 0 else "Sucesso"
+		amount = "1" + "0" * (i % 25) + ",5" # some beyond 64 bits
+		lines.append(f"{date},Compra(BTC/BRL),{'BTC' if i % 2 else 'BRL'},\"+{amount} X\",{status}")
+	path = tmp_path / "novadax.csv"
+	path.write_bytes("\r\n".join(lines).encode("utf-8"))
+	return path
+
+
+def operation_fields(ops: list[Operation]) -> list[tuple[Any, ...]]:
+	return [
+		(op.date, op.type, op.summary, op.symbol, op.amount.mantissa, op.amount.scale, op.status)
+		for op in ops
+	]
+
+
+def test_parse_in_parallel_matches_serial(tmp_path: Path) -> None:
+	path = export(tmp_path, 500)
+	rows = list(read_successful(str(path)))
+
+	for chunk_size in [1, 1000, 1 << 20]:
+		count, ops = parse_in_parallel(str(path), 2, chunk_size)
+		assert count == len(rows)
+		assert operation_fields(ops) == operation_fields(parse_successful_rows(rows))
+
+
+def test_split_in_ranges(tmp_path: Path) -> None:
+	path     = export(tmp_path, 50)
+	contents = path.read_bytes()
+	ranges   = split_in_ranges(str(path), 8, 1)
+
+	assert len(ranges) > 1
+	assert ranges[0][0] == contents.index(b"\n") + 1
+	assert ranges[-1][1] == len(contents)
+	for (_, end), (start, _) in zip(ranges, ranges[1:]):
+		assert end == start
+		assert contents[end - 1:end] == b"\n"
+
+
+def test_parse_in_parallel_reads_compressed_files_here(tmp_path: Path) -> None:
+	path = export(tmp_path, 50)
+	compressed = tmp_path / "novadax.csv.gz"
+	compressed.write_bytes(gzip.compress(path.read_bytes()))
+
+	assert split_in_ranges(str(compressed), 4, 1) == []
+	count, ops = parse_in_parallel(str(compressed), 2, 1)
+	expected_count, expected = parse_in_parallel(str(path), 2, 1)
+	assert (count, operation_fields(ops)) == (expected_count, operation_fields(expected))
+
+
+def test_decode_frees_shared_memory() -> None:
+	ops = [
+		fake_op(date=START, amount=Amount(10 ** 30, 2)),
+		fake_op(date=START, type=OperationType.SELL),
+	]
+	encoded = encode(3, ops)
+
+	rows, decoded = decode(encoded)
+	assert (rows, operation_fields(decoded)) == (3, operation_fields(ops))
+	with pytest.raises(FileNotFoundError):
+		SharedMemory(name=encoded.name)
+	assert decode(encode(3, [])) == (3, [])
+
+
+def test_parse_in_parallel_raises_like_serial(tmp_path: Path) -> None:
+	path = export(tmp_path, 300)
+	with open(path, "ab") as f:
+		f.write(b"\r\n01/01/2024 00:00:00,Mystery,BRL,\"R$ 1,00\",Sucesso")
+
+	with pytest.raises(ValueError, match="'Mystery' is not a valid OperationType"):
+		parse_in_parallel(str(path), 2, 1000)
@@ -0,0 +1,130 @@
+import io
+import json
+import pstats
+import tracemalloc
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from nd2k import profiling, reader
+from nd2k.main import convert, main, parse_successful_rows
+from nd2k.profiling import convert_with_stats
+
+
+CONTENTS = (
+	"date,summary,symbol,amount,status\n"
+	"01/01/2024 00:00:01,Taxa de transação,BTC,\"-0,01 BTC(≈R$0.10)\",Sucesso\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BTC,\"+1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+	"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +100,00\",Sucesso\n"
+	"01/01/2024 00:00:00,Saque em Reais,BRL,\"R$ -1,00\",Falha\n"
+)
+
+
+def test_same_output_as_regular_run(tmp_path: Path) -> None:
+	input_file = tmp_path / "novadax.csv"
+	input_file.write_text(CONTENTS, encoding="utf-8")
+
+	convert(str(input_file), str(tmp_path / "regular.csv"))
+	stats = convert_with_stats(str(input_file), [str(tmp_path / "profiled.csv")])
+
+	assert (tmp_path / "profiled.csv").read_text() == (tmp_path / "regular.csv").read_text()
+	assert [(s.name, s.items) for s in stats.stages] == [
+		("read",              4),
+		("parse",             4),
+		("categorize",        4),
+		("build swaps",       0),
+		("combine swaps",     0),
+		("build trades",      1),
+		("combine trades",    1),
+		("build exchanges",   0),
+		("combine exchanges", 0),
+		("build nontrades",   1),
+		("combine nontrades", 1),
+		("sort",              2),
+		("format",            2),
+		("write",             2),
+	]
+	assert not tracemalloc.is_tracing()
+
+
+def test_json_and_summary(tmp_path: Path) -> None:
+	input_file = tmp_path / "novadax.csv"
+	input_file.write_text(CONTENTS, encoding="utf-8")
+
+	stats = convert_with_stats(str(input_file), [str(tmp_path / "out.csv")])
+
+	data = json.loads(stats.to_json())
+	assert [s["name"] for s in data["stages"]][:2] == ["read", "parse"]
+	assert set(data["total"]) == {"name", "items", "wall", "cpu", "peak_memory"}
+	assert data["total"]["items"] == 4
+
+	lines = stats.summary().splitlines()
+	assert lines[0].split() == ["Stage", "Items", "Wall", "CPU", "Peak", "memory"]
+	assert lines[-1].startswith("total")
+
+
+def test_profile_dumps(tmp_path: Path, monkeypatch: Any) -> None:
+	input_file = tmp_path / "novadax.csv"
+	input_file.write_text(CONTENTS, encoding="utf-8")
+	profile = tmp_path / "nd2k.prof"
+
+	reads, tracing = [], []
+	def read_successful(path: str) -> Any:
+		reads.append(path)
+		return reader.read_successful(path)
+	def parse(rows: Any) -> Any:
+		tracing.append(tracemalloc.is_tracing())
+		return parse_successful_rows(rows)
+	monkeypatch.setattr(profiling, "read_successful", read_successful)
+	monkeypatch.setattr(profiling, "parse_successful_rows", parse)
+
+	stats = convert_with_stats(str(input_file), [str(tmp_path / "out.csv")], str(profile))
+
+	assert reads == [str(input_file)] # standard input couldn't be read twice
+	assert tracing == [False, True] # allocations are only traced once timings are taken
+	assert all(s.peak_memory > 0 for s in stats.stages)
+	assert pstats.Stats(str(profile)).get_stats_profile().func_profiles
+	assert tracemalloc.Snapshot.load(str(profile) + ".tracemalloc").traces
+
+
+def test_profile_from_standard_input(tmp_path: Path, monkeypatch: Any) -> None:
+	profile = tmp_path / "nd2k.prof"
+	stdin   = io.TextIOWrapper(io.BytesIO(CONTENTS.encode("utf-8")), encoding="utf-8")
+	monkeypatch.setattr("sys.stdin", stdin)
+	monkeypatch.setattr("sys.argv", [
+		"nd2k", "--profile", str(profile), "-o", str(tmp_path / "out.csv"), "-"])
+	main()
+
+	snapshot = tracemalloc.Snapshot.load(str(profile) + ".tracemalloc")
+	files    = {frame.filename for trace in snapshot.traces for frame in trace.traceback}
+	assert any(f.endswith("trade.py") for f in files) # trades were built again
+
+
+def test_stats_options(tmp_path: Path, capsys: Any, monkeypatch: Any) -> None:
+	input_file = tmp_path / "novadax.csv"
+	input_file.write_text(CONTENTS, encoding="utf-8")
+	stats_json = tmp_path / "stats.json"
+
+	monkeypatch.setattr("sys.argv", [
+		"nd2k", str(input_file), "--stats", "--stats-json", str(stats_json)])
+	main()
+
+	captured = capsys.readouterr()
+	assert captured.out == ""
+	assert "combine trades" in captured.err
+	assert json.loads(stats_json.read_text())["stages"][0]["name"] == "read"
+	assert (tmp_path / "novadax_koinly_universal.csv").exists()
+
+
+def test_stats_on_incomplete_file(tmp_path: Path, capsys: Any, monkeypatch: Any) -> None:
+	input_file = tmp_path / "novadax.csv"
+	input_file.write_text(CONTENTS.replace("Compra(BTC/BRL),BTC", "Troca,BTC"))
+
+	monkeypatch.setattr("sys.argv", ["nd2k", str(input_file), "--stats"])
+	with pytest.raises(SystemExit) as exc_info:
+		main()
+	assert exc_info.value.code == 1
+	assert "Incomplete Swap" in capsys.readouterr().out
@@ -0,0 +1,92 @@
+import random
+
+from io import BytesIO
+from pathlib import Path
+
+from nd2k.reader import (
+	header_size, parse_line, parse_lines, read_numbered, read_successful, reversed_lines)
+
+
+def test_reversed_lines() -> None:
+	f = BytesIO(b"first\nsecond\r\nthird\rfourth\n")
+	assert list(reversed_lines(f)) == [b"fourth", b"third", b"second", b"first"]
+
+
+def test_reversed_lines_across_blocks() -> None:
+	contents = b"a,b\r\nccc,dd\r\n\r\ne,ffff\rgg\n"
+	for block_size in range(1, len(contents) + 1):
+		f = BytesIO(contents)
+		assert list(reversed_lines(f, block_size)) == [
+			b"gg", b"e,ffff", b"ccc,dd", b"a,b"
+		]
+
+
+def test_reversed_lines_empty_file() -> None:
+	assert list(reversed_lines(BytesIO(b""))) == []
+
+
+def test_reversed_lines_within_range() -> None:
+	contents = b"header\r\nfirst\nsecond\nthird\n"
+	for block_size in [1, 3, 64]:
+		f = BytesIO(contents)
+		assert list(reversed_lines(f, block_size, start=8, end=21)) == [
+			b"second", b"first"
+		]
+
+
+def test_header_size() -> None:
+	for contents in [b"a,b\r\nc\n", b"a,b\nc\n", b"a,b\rc\n"]:
+		for block_size in [1, 2, 4, 64]:
+			expected = contents.index(b"c")
+			assert header_size(BytesIO(contents), block_size) == expected
+	assert header_size(BytesIO(b"a,b")) == 3
+
+
+def test_read_successful(tmp_path: Path) -> None:
+	file = tmp_path / "temp.csv"
+	file.write_bytes(
+		"date,summary,symbol,amount,status\r".encode("utf-8")
+		+ "01/01/2024 00:00:02,Depósito em Reais,BRL,\"R$ +1,00\",Sucesso\r".encode("utf-8")
+		+ b"01/01/2024 00:00:01,Saque em Reais,BRL,R$ -2,Falha\xff\r"
+		+ b"01/01/2024 00:00:00,Saque em Reais,BRL,R$ -3\xff,\"Sucesso\"\r")
+
+	expected = [
+		["01/01/2024 00:00:00", "Saque em Reais", "BRL", "R$ -3", "Sucesso"],
+		["01/01/2024 00:00:02", "Depósito em Reais", "BRL", "R$ +1,00", "Sucesso"],
+	]
+	for block_size in [1, 7, 64]:
+		assert list(read_successful(str(file), block_size)) == expected
+
+
+def test_read_successful_with_columns_after_status(tmp_path: Path) -> None:
+	file = tmp_path / "temp.csv"
+	file.write_bytes(
+		b"date,summary,symbol,amount,status,\r\n"
+		b"01/01/2024 00:00:02,Sucesso,BRL,R$ +1,Falha,\r\n"
+		b"01/01/2024 00:00:01,Dep\xc3\xb3sito em Reais,BRL,R$ +2,Sucesso,note\r\n"
+		b"01/01/2024 00:00:00,Dep\xc3\xb3sito em Reais,BRL,R$ +3,Sucesso,\r\n")
+
+	expected = [
+		["01/01/2024 00:00:00", "Depósito em Reais", "BRL", "R$ +3", "Sucesso", ""],
+		["01/01/2024 00:00:01", "Depósito em Reais", "BRL", "R$ +2", "Sucesso", "note"],
+	]
+	for block_size in [1, 7, 64]:
+		assert list(read_successful(str(file), block_size)) == expected
+		assert list(read_numbered(str(file), block_size)) == list(zip([4, 3], expected))
+
+
+def test_read_successful_empty_file(tmp_path: Path) -> None:
+	file = tmp_path / "temp.csv"
+	file.write_bytes(b"")
+	assert list(read_successful(str(file))) == []
+
+
+def test_parse_lines_property() -> None:
+	rng = random.Random(14)
+	for _ in range(2000):
+		lines = [
+			"".join(rng.choice("ab,,,\"\" Sucesso") for _ in range(rng.randrange(24))).encode("utf-8")
+			+ rng.choice([b"", b"\xc3", b"\xff"])
+			for _ in range(rng.randrange(1, 5))
+		]
+		assert parse_lines(lines) == [parse_line(line) for line in lines], lines
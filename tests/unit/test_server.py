@@ -0,0 +1,175 @@
+import asyncio
+import io
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+from nd2k.main import convert
+from nd2k.server import Server, convert_upload, parse_args, server_timing, worker_pool
+
+
+CONTENTS = (
+	"date,summary,symbol,amount,status\n"
+	"01/01/2024 00:00:01,Taxa de transação,BTC,\"-0,01 BTC(≈R$0.10)\",Sucesso\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BTC,\"+1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+	"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +100,00\",Sucesso\n"
+	"01/01/2024 00:00:00,Saque em Reais,BRL,\"R$ -1,00\",Falha\n"
+).encode("utf-8")
+
+INCOMPLETE = (
+	"date,summary,symbol,amount,status\n"
+	"01/01/2024 00:00:01,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+).encode("utf-8")
+
+Response = tuple[int, dict[str, str], bytes]
+Scenario = Callable[[Server, int], Awaitable[None]]
+
+
+async def post(
+	port:   int,
+	body:   bytes,
+	head:   str = "POST /convert HTTP/1.1",
+	length: int | None = None,
+) -> Response:
+	"""Stand-in client, as a web backend would upload files."""
+	length = len(body) if length is None else length
+	reader, writer = await asyncio.open_connection("127.0.0.1", port)
+	writer.write(f"{head}\r\nContent-Length: {length}\r\n\r\n".encode("latin-1") + body)
+	await writer.drain()
+	response = await reader.read()
+	writer.close()
+
+	raw_head, _, payload = response.partition(b"\r\n\r\n")
+	status_line, *lines = raw_head.decode("latin-1").split("\r\n")
+	headers = dict(line.split(": ", 1) for line in lines)
+	return int(status_line.split()[1]), headers, payload
+
+
+def run(scenario: Scenario, pool: Executor, jobs: int = 2, backlog: int = 2) -> str:
+	"""Runs scenario against a server listening on a free port, returning its log."""
+	log = io.StringIO()
+
+	async def main() -> None:
+		server    = Server(pool, jobs, backlog, max_upload=2**20, log=log)
+		listening = await server.start("127.0.0.1", 0)
+		async with listening:
+			await scenario(server, listening.sockets[0].getsockname()[1])
+
+	with pool:
+		asyncio.run(main())
+	return log.getvalue()
+
+
+def test_converts_uploads(tmp_path: Path) -> None:
+	input_file = tmp_path / "novadax.csv"
+	input_file.write_bytes(CONTENTS)
+	convert(str(input_file), str(tmp_path / "koinly.csv"))
+	expected = (tmp_path / "koinly.csv").read_bytes()
+
+	async def scenario(server: Server, port: int) -> None:
+		responses = await asyncio.gather(*[post(port, CONTENTS) for _ in range(4)])
+		for status, headers, body in responses:
+			assert status == 200
+			assert body == expected
+			assert headers["Content-Type"] == "text/csv; charset=utf-8"
+			assert "convert;dur=" in headers["Server-Timing"]
+
+	log = run(scenario, worker_pool(2))
+	assert log.count("POST /convert 200") == 4
+	assert "4 rows, 2 transactions" in log
+
+
+def test_refuses_uploads_beyond_the_backlog() -> None:
+	async def scenario(server: Server, port: int) -> None:
+		# an upload still being sent holds the only place available
+		_, stalled = await asyncio.open_connection("127.0.0.1", port)
+		stalled.write(b"POST /convert HTTP/1.1\r\nContent-Length: 10\r\n\r\n")
+		await stalled.drain()
+		while not server.pending:
+			await asyncio.sleep(0.01)
+
+		status, _, body = await post(port, CONTENTS)
+		assert status == 503
+		assert body == b"Too many conversions in progress, try again later\n"
+
+		stalled.close()
+		while server.pending:
+			await asyncio.sleep(0.01)
+		assert (await post(port, CONTENTS))[0] == 200
+
+	run(scenario, ThreadPoolExecutor(1), jobs=1, backlog=0)
+
+
+def test_reports_unmatched_operations() -> None:
+	async def scenario(server: Server, port: int) -> None:
+		status, _, body = await post(port, INCOMPLETE)
+		assert status == 422
+		assert body.startswith(b"Could not find a match for the following operations:")
+		assert b"Incomplete Trades" in body
+
+	log = run(scenario, ThreadPoolExecutor(1))
+	assert "POST /convert 422" in log
+
+
+def test_skips_blank_lines_and_columns_after_status() -> None:
+	upload = CONTENTS.replace(b"\n", b"\n\n").replace(b"Sucesso\n", b"Sucesso,\n")
+	assert convert_upload(upload).output == convert_upload(CONTENTS).output
+
+
+def test_reports_rows_that_cant_be_parsed() -> None:
+	async def scenario(server: Server, port: int) -> None:
+		status, _, body = await post(port, CONTENTS.replace(b"Compra", b"Unknown", 1))
+		assert status == 400
+		assert body.startswith(b"Row 3 could not be parsed: ")
+
+	log = run(scenario, ThreadPoolExecutor(1))
+	assert "POST /convert 400" in log
+
+
+def test_reports_failed_conversions(monkeypatch: Any) -> None:
+	def fail(*args: Any) -> None:
+		raise RuntimeError("broken")
+	monkeypatch.setattr("nd2k.server.order_by_date", fail)
+
+	async def scenario(server: Server, port: int) -> None:
+		status, _, body = await post(port, CONTENTS)
+		assert status == 500
+		assert body == b"The conversion failed, see the server log\n"
+
+	log = run(scenario, ThreadPoolExecutor(1))
+	assert "POST /convert 500" in log
+	assert log.rstrip().endswith("RuntimeError: broken")
+
+
+@pytest.mark.parametrize("head, length, status", [
+	("GET /other HTTP/1.1",    0,     404),
+	("GET /convert HTTP/1.1",  0,     405),
+	("POST /convert HTTP/1.1", 2**21, 413),
+	("nonsense",               0,     400),
+])
+def test_rejects_bad_requests(head: str, length: int, status: int) -> None:
+	async def scenario(server: Server, port: int) -> None:
+		assert (await post(port, b"", head, length))[0] == status
+
+	run(scenario, ThreadPoolExecutor(1))
+
+
+def test_convert_upload() -> None:
+	conversion = convert_upload(CONTENTS)
+	assert conversion.rows == 4
+	assert conversion.transactions == 2
+	assert list(conversion.timings) == ["parse", "organize", "format"]
+	assert conversion.output.startswith(b"Date,Sent Amount,")
+
+
+def test_server_timing() -> None:
+	assert server_timing({"queue": 0.0012, "convert": 0.25}) == "queue;dur=1.2, convert;dur=250.0"
+
+
+def test_parse_args() -> None:
+	args = parse_args(["--port", "9000", "-j", "3"])
+	assert (args.host, args.port, args.jobs, args.backlog) == ("127.0.0.1", 9000, 3, 16)
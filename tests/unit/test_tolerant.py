@@ -0,0 +1,140 @@
+import csv
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from nd2k.main import main
+from nd2k.reader import read_numbered
+from nd2k.tolerant import organize_tolerantly, rejects_path
+
+
+CONTENTS = (
+	"date,summary,symbol,amount,status\n"
+	"01/01/2024 00:00:03,Troca,BTC,\"-1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:02,Taxa de transação,BTC,\"-0,01 BTC(≈R$0.10)\",Sucesso\n"
+	"01/01/2024 00:00:02,Compra(BTC/BRL),BTC,\"+1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:02,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+	"01/01/2024 00:00:01,Compra(ETH/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+	"01/01/2024 00:00:01,Mystery,BRL,\"R$ -10,00\",Sucesso\n"
+	"01/01/2024 00:00:00,Saque em Reais,BRL,\"R$ -1,00\",Falha\n"
+	"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +100,00\",Sucesso\n"
+).encode("utf-8")
+
+
+@pytest.fixture
+def export(tmp_path: Path) -> Path:
+	path = tmp_path / "novadax.csv"
+	path.write_bytes(CONTENTS)
+	return path
+
+
+def run(monkeypatch: Any, *args: str) -> None:
+	monkeypatch.setattr("sys.argv", ["nd2k", *args])
+	main()
+
+
+def read_csv(path: Path) -> list[list[str]]:
+	with open(path, encoding="utf-8", newline="") as f:
+		return list(csv.reader(f))
+
+
+def test_read_numbered(export: Path) -> None:
+	for block_size in [1, 16, 4096]:
+		numbered = list(read_numbered(str(export), block_size))
+		assert [n for n, _ in numbered] == [9, 7, 6, 5, 4, 3, 2]
+		assert numbered[0][1][1] == "Depósito em Reais"
+
+
+def test_organize_tolerantly(export: Path) -> None:
+	built, rejects = organize_tolerantly(read_numbered(str(export)))
+	trades, swaps, exchanges, nontrades = built
+	assert (len(trades), len(swaps), len(exchanges), len(nontrades)) == (1, 0, 0, 1)
+	assert [(r.row, r.fields[1], r.reason) for r in rejects] == [
+		(2, "Troca",           "Incomplete Swap"),
+		(6, "Compra(ETH/BRL)", "Incomplete Trade"),
+		(7, "Mystery",         "'Mystery' is not a valid OperationType"),
+	]
+
+
+def test_rejects_amounts_without_digits() -> None:
+	row = ["01/01/2024 00:00:00", "Depósito em Reais", "BRL", "R$ ,", "Sucesso"]
+	_, rejects = organize_tolerantly([(2, row)])
+	assert [(r.row, r.reason) for r in rejects] == [
+		(2, "No numeric values found in \"R$ ,\""),
+	]
+
+
+def test_rows_outside_their_trading_pair_spare_the_trades_after_them(
+	capsys: Any, tmp_path: Path, monkeypatch: Any
+) -> None:
+	(tmp_path / "novadax.csv").write_bytes((
+		"date,summary,symbol,amount,status\n"
+		"01/01/2024 00:00:02,Taxa de transação,ETH,\"-0,01 ETH(≈R$0.10)\",Sucesso\n"
+		"01/01/2024 00:00:02,Compra(ETH/BRL),ETH,\"+1,00 ETH(≈R$10.00)\",Sucesso\n"
+		"01/01/2024 00:00:02,Compra(ETH/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+		"01/01/2024 00:00:01,Taxa de transação,BTC,\"-0,01 BTC(≈R$0.10)\",Sucesso\n"
+		"01/01/2024 00:00:01,Compra(BTC/BRL),BTC,\"+1,00 BTC(≈R$10.00)\",Sucesso\n"
+		"01/01/2024 00:00:01,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+		"01/01/2024 00:00:00,Compra(XRP/BRL),USDT,\"-1,00 USDT(≈R$5.00)\",Sucesso\n"
+	).encode("utf-8"))
+	run(monkeypatch, "--tolerant", str(tmp_path / "novadax.csv"))
+
+	assert "Warning: 1 rows could not be converted" in capsys.readouterr().out
+	koinly = read_csv(tmp_path / "novadax_koinly_universal.csv")
+	assert [(r[9], r[10]) for r in koinly[1:]] == [
+		("trade", "Compra(BTC/BRL)"), ("trade", "Compra(ETH/BRL)")]
+
+	rejects = read_csv(tmp_path / "novadax_koinly_universal.rejects.csv")
+	assert [(r[0], r[3], r[6]) for r in rejects[1:]] == [
+		("8", "USDT", "Operation outside its trading pair")]
+
+
+def test_tolerant_run(capsys: Any, tmp_path: Path, export: Path, monkeypatch: Any) -> None:
+	run(monkeypatch, "--tolerant", str(export))
+
+	assert "Warning: 3 rows could not be converted" in capsys.readouterr().out
+	koinly = read_csv(tmp_path / "novadax_koinly_universal.csv")
+	assert [r[9] for r in koinly[1:]] == ["deposit", "trade"]
+
+	rejects = read_csv(tmp_path / "novadax_koinly_universal.rejects.csv")
+	assert rejects[0] == ["row", "date", "summary", "symbol", "amount", "status", "reason"]
+	assert rejects[1] == [
+		"2", "01/01/2024 00:00:03", "Troca", "BTC", "-1,00 BTC(≈R$10.00)", "Sucesso",
+		"Incomplete Swap"]
+
+
+def test_rejects_of_earlier_runs_are_removed(tmp_path: Path, export: Path, monkeypatch: Any) -> None:
+	rejects = tmp_path / "rejects.csv"
+	run(monkeypatch, "--rejects", str(rejects), str(export))
+	assert rejects.exists()
+
+	export.write_bytes(b"".join(
+		line for line in CONTENTS.splitlines(keepends=True)
+		if b"Troca" not in line and b"ETH" not in line and b"Mystery" not in line))
+	run(monkeypatch, "--rejects", str(rejects), str(export))
+	assert not rejects.exists()
+
+	run(monkeypatch, "--rejects", str(rejects), str(export)) # from the cache
+	assert not rejects.exists()
+
+
+def test_rejects_path() -> None:
+	assert rejects_path("out/koinly.csv.gz") == "out/koinly.rejects.csv"
+	assert rejects_path("koinly") == "koinly.rejects.csv"
+
+
+@pytest.mark.parametrize("args, error", [
+	(["--tolerant", "--stream"],    "Error: --stream can't be combined with --tolerant"),
+	(["--tolerant", "--jobs", "2"], "Error: --jobs can't be combined with --tolerant"),
+	(["--tolerant", "-o", "-"],     "Error: --rejects must tell where the rejects go"),
+	(["--rejects", "k.csv", "-o", "k.csv"], "Error: The rejects must go elsewhere"),
+])
+def test_tolerant_errors(
+	capsys: Any, export: Path, monkeypatch: Any, args: list[str], error: str
+) -> None:
+	with pytest.raises(SystemExit) as exc_info:
+		run(monkeypatch, *args, str(export))
+	assert exc_info.value.code == 1
+	assert error in capsys.readouterr().out
@@ -1,12 +1,15 @@
 import pytest
+import random
 
 from datetime import datetime, timedelta
-from decimal import Decimal
-from typing import cast
+from nd2k.amount import Amount
+from typing import Any, Callable, cast
 
-from nd2k.trade import Trade, PartialTrade, TradingPair, combine
-from nd2k.operation import OperationType
-from nd2k.transaction import Transaction, group_by_timestamp
+from nd2k.trade import (
+	Trade, PartialTrade, TradingPair, TradeBuilder, TradeMatcher, create_or_update_trade
+)
+from nd2k.operation import Operation, OperationType
+from nd2k.transaction import combine
 
 from .helpers import fake_op, fake_partial_trade
 
@@ -17,6 +20,12 @@ def test_create_trading_pair_from_string() -> None:
 	assert pair.quote == "BRL"
 
 
+def test_trading_pair_is_shared_by_trades_of_the_same_summary() -> None:
+	a = PartialTrade.from_operation(fake_op(summary="Compra(DOGE/BRL)", symbol="DOGE"))
+	b = PartialTrade.from_operation(fake_op(summary="Compra(DOGE/BRL)", symbol="BRL"))
+	assert a.trading_pair is b.trading_pair
+
+
 def test_create_trading_pair_invalid_string() -> None:
 	string = "AnythingElse"
 	with pytest.raises(ValueError) as e:
@@ -54,6 +63,13 @@ def test_create_partial_trade_from_quote_asset() -> None:
 	assert actual == expected
 
 
+def test_create_partial_trade_outside_its_trading_pair() -> None:
+	op = fake_op(summary="Compra(ABC/XYZ)", type=OperationType.BUY, symbol="USDT")
+	with pytest.raises(ValueError) as e:
+		PartialTrade.from_operation(op)
+	assert e.value.args == ("Operation outside its trading pair", op)
+
+
 def test_is_completed() -> None:
 	assert fake_partial_trade(
 		base_asset  = fake_op(),
@@ -238,76 +254,168 @@ def test_fits_as_trading_fee_malformed_trade() -> None:
 	assert str(e.value) == "Malformed Trade"
 
 
+@pytest.mark.parametrize("scan_limit", [0, 3, 16])
+def test_matcher_agrees_with_linear_scan(monkeypatch: Any, scan_limit: int) -> None:
+	monkeypatch.setattr("nd2k.trade.SCAN_LIMIT", scan_limit)
+	rng = random.Random(8)
+	for _ in range(200):
+		ops     = random_trade_operations(rng, 40)
+		matcher = TradeMatcher()
+		partials: list[PartialTrade] = []
+
+		for op in ops:
+			expected = outcome(lambda: create_or_update_trade(op, partials))
+			actual   = outcome(lambda: matcher.match(op))
+			assert actual == expected
+
+			if isinstance(expected, PartialTrade) and expected.is_completed():
+				partials.remove(expected)
+				matcher.retire(cast(PartialTrade, actual))
+
+			if isinstance(expected, str):
+				break
+
+		assert matcher.partials == partials
+
+		# indexes hold open trades only
+		indexes = [*matcher.slots.values(), *matcher.fees.values(), matcher.unclassified]
+		opened  = {seq for seq, _ in matcher.open.values()}
+		assert all(seq in opened for index in indexes for seq in index)
+
+
+def random_trade_operations(rng: random.Random, n: int) -> list[Operation]:
+	now = datetime.now()
+	ops: list[Operation] = []
+	for _ in range(n):
+		ot = rng.choice(["BUY", "SELL", "TRADING_FEE"] if ops else ["BUY", "SELL"])
+		pair = rng.choice(["AAA/BBB", "AAA/CCC", "BBB/CCC"])
+		assets = pair.split("/") if rng.random() < .95 else ["DDD"]
+		summary = {
+			"BUY":  f"Compra({pair})",
+			"SELL": f"Venda({pair})",
+			"TRADING_FEE": "Taxa de transação",
+		}[ot]
+		ops.append(fake_op(
+			type    = OperationType[ot],
+			summary = summary,
+			symbol  = rng.choice(assets if ot != "TRADING_FEE" else ["AAA", "BBB", "CCC"]),
+			amount  = Amount(rng.randint(1, 9)),
+			date    = now,
+		))
+	return ops
+
+
+def outcome(func: Callable[[], PartialTrade]) -> PartialTrade | str:
+	try:
+		return func()
+	except ValueError as e:
+		return str(e)
+
+
+def test_builder_gives_up_on_trades_beyond_window() -> None:
+	start = datetime(2024, 1, 1)
+	def op(ot: str, symbol: str, seconds: int) -> Operation:
+		return fake_op(
+			type    = OperationType[ot],
+			summary = "Taxa de transação" if ot == "TRADING_FEE" else "Compra(AAA/BBB)",
+			symbol  = symbol,
+			date    = start + timedelta(seconds=seconds))
+
+	stale   = op("BUY", "AAA", 0)
+	builder = TradeBuilder(window=timedelta(seconds=1))
+	for o in [stale, op("BUY", "AAA", 1), op("BUY", "BBB", 2), op("TRADING_FEE", "AAA", 2)]:
+		builder.add(o)
+	assert builder.matcher.partials == []
+	assert builder.is_idle()
+
+	# the trade begun at 0 was given up on, the one begun at 1 took the BBB
+	builder.add(op("BUY", "BBB", 3))
+	assert [pt.base_asset for pt in builder.partials[:1]] == [stale]
+	assert builder.leftovers()[0] == [stale]
+	with pytest.raises(ValueError, match="Incomplete Trades"):
+		builder.collect()
+
+	without_window = TradeBuilder()
+	for o in [stale, op("BUY", "AAA", 10), op("BUY", "BBB", 10), op("TRADING_FEE", "AAA", 10)]:
+		without_window.add(o)
+	assert len(without_window.totals) == 1
+	assert without_window.matcher.partials[0].base_asset is not stale
+
+
 def test_combine() -> None:
 	trades   = example_trades()
-	groups   = group_by_timestamp(cast(list[Transaction], trades)).values()
-	combined = [combine(cast(list[Trade], g)) for g in groups]
+	combined = combine(trades)
 
 	assert len(combined) == 5
 
 	# t0+t1
-	assert combined[0].base_asset.amount  == Decimal("30") # 11+19
-	assert combined[0].quote_asset.amount == Decimal("36") # 13+23
-	assert combined[0].trading_fee.amount == Decimal("46") # 17+29
+	assert combined[0].base_asset.amount  == Amount(30) # 11+19
+	assert combined[0].quote_asset.amount == Amount(36) # 13+23
+	assert combined[0].trading_fee.amount == Amount(46) # 17+29
 
 	# t2+t3
-	assert combined[1].base_asset.amount  == Decimal("74") # 31+43
-	assert combined[1].quote_asset.amount == Decimal("84") # 37+47
-	assert combined[1].trading_fee.amount == Decimal("94") # 41+53
+	assert combined[1].base_asset.amount  == Amount(74) # 31+43
+	assert combined[1].quote_asset.amount == Amount(84) # 37+47
+	assert combined[1].trading_fee.amount == Amount(94) # 41+53
 
 	assert combined[2] == trades[4] # t4
 
 	# t5+t7
-	assert combined[3].base_asset.amount  == Decimal("172") # 71+101
-	assert combined[3].quote_asset.amount == Decimal("176") # 73+103
-	assert combined[3].trading_fee.amount == Decimal("186") # 79+107
+	assert combined[3].base_asset.amount  == Amount(172) # 71+101
+	assert combined[3].quote_asset.amount == Amount(176) # 73+103
+	assert combined[3].trading_fee.amount == Amount(186) # 79+107
 
 	assert combined[4] == trades[6] # t6
 
+	# neither the trades combined nor their operations are changed
+	assert trades[0].base_asset.amount  == Amount(11)
+	assert trades[0].trading_fee.amount == Amount(17)
+	assert combined[0].trading_pair is trades[0].trading_pair
+
 
 def example_trades() -> list[Trade]:
 	now = datetime.now()
 	a_minute_ago = now - timedelta(minutes=1)
 
 	t0 = trade("BUY", "Buy(AAA/USD)", "AAA", "USD", now)
-	t0.base_asset.amount  = Decimal("11")
-	t0.quote_asset.amount = Decimal("13")
-	t0.trading_fee.amount = Decimal("17")
+	t0.base_asset.amount  = Amount(11)
+	t0.quote_asset.amount = Amount(13)
+	t0.trading_fee.amount = Amount(17)
 
 	t1 = trade("BUY", "Buy(AAA/USD)", "AAA", "USD", now)
-	t1.base_asset.amount  = Decimal("19")
-	t1.quote_asset.amount = Decimal("23")
-	t1.trading_fee.amount = Decimal("29")
+	t1.base_asset.amount  = Amount(19)
+	t1.quote_asset.amount = Amount(23)
+	t1.trading_fee.amount = Amount(29)
 
 	t2 = trade("SELL", "Sell(AAA/USD)", "AAA", "USD", now)
-	t2.base_asset.amount  = Decimal("31")
-	t2.quote_asset.amount = Decimal("37")
-	t2.trading_fee.amount = Decimal("41")
+	t2.base_asset.amount  = Amount(31)
+	t2.quote_asset.amount = Amount(37)
+	t2.trading_fee.amount = Amount(41)
 
 	t3 = trade("SELL", "Sell(AAA/USD)", "AAA", "USD", now)
-	t3.base_asset.amount  = Decimal("43")
-	t3.quote_asset.amount = Decimal("47")
-	t3.trading_fee.amount = Decimal("53")
+	t3.base_asset.amount  = Amount(43)
+	t3.quote_asset.amount = Amount(47)
+	t3.trading_fee.amount = Amount(53)
 
 	t4 = trade("BUY", "Buy(AAA/USD)", "AAA", "USD", a_minute_ago)
-	t4.base_asset.amount  = Decimal("59")
-	t4.quote_asset.amount = Decimal("61")
-	t4.trading_fee.amount = Decimal("67")
+	t4.base_asset.amount  = Amount(59)
+	t4.quote_asset.amount = Amount(61)
+	t4.trading_fee.amount = Amount(67)
 
 	t5 = trade("BUY", "Buy(BBB/USD)", "BBB", "USD", now)
-	t5.base_asset.amount  = Decimal("71")
-	t5.quote_asset.amount = Decimal("73")
-	t5.trading_fee.amount = Decimal("79")
+	t5.base_asset.amount  = Amount(71)
+	t5.quote_asset.amount = Amount(73)
+	t5.trading_fee.amount = Amount(79)
 
 	t6 = trade("BUY", "Buy(BBB/USD)", "BBB", "USD", a_minute_ago)
-	t6.base_asset.amount  = Decimal("83")
-	t6.quote_asset.amount = Decimal("89")
-	t6.trading_fee.amount = Decimal("97")
+	t6.base_asset.amount  = Amount(83)
+	t6.quote_asset.amount = Amount(89)
+	t6.trading_fee.amount = Amount(97)
 
 	t7 = trade("BUY", "Buy(BBB/USD)", "BBB", "USD", now)
-	t7.base_asset.amount  = Decimal("101")
-	t7.quote_asset.amount = Decimal("103")
-	t7.trading_fee.amount = Decimal("107")
+	t7.base_asset.amount  = Amount(101)
+	t7.quote_asset.amount = Amount(103)
+	t7.trading_fee.amount = Amount(107)
 
 	return [t for t in [t0, t1, t2, t3, t4, t5, t6, t7]]
 
@@ -323,20 +431,20 @@ def trade(ot: str, s: str, b: str, q: str, d: datetime) -> Trade:
 	t.base_asset.type    = OperationType[ot]
 	t.base_asset.summary = s
 	t.base_asset.symbol  = b
-	t.base_asset.amount  = Decimal("0")
+	t.base_asset.amount  = Amount(0)
 
 	t.quote_asset = fake_op()
 	t.quote_asset.date    = d
 	t.quote_asset.type    = OperationType[ot]
 	t.quote_asset.summary = s
 	t.quote_asset.symbol  = q
-	t.quote_asset.amount  = Decimal("0")
+	t.quote_asset.amount  = Amount(0)
 
 	t.trading_fee = fake_op()
 	t.trading_fee.date    = d
 	t.trading_fee.type    = OperationType.TRADING_FEE
 	t.trading_fee.summary = "trading fee"
 	t.trading_fee.symbol  = b if ot == "BUY" else q
-	t.trading_fee.amount  = Decimal("0")
+	t.trading_fee.amount  = Amount(0)
 
 	return t.complete()
@@ -0,0 +1,170 @@
+import csv
+import json
+import sqlite3
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from nd2k.main import main
+from nd2k.nontrade import NonTrade
+from nd2k.operation import OperationType
+from nd2k.writers import (
+	BATCH_SIZE, ArrowWriter, JSONLinesWriter, KoinlyWriter, ParquetWriter,
+	SQLiteWriter, Columns, koinly_universal_format, render_koinly, staged,
+	unwritable, writer_for)
+
+from .helpers import fake_op
+
+
+CONTENTS = (
+	"date,summary,symbol,amount,status\n"
+	"01/01/2024 00:00:02,Taxa de transação,BTC,\"-0,01 BTC(≈R$0.10)\",Sucesso\n"
+	"01/01/2024 00:00:02,Compra(BTC/BRL),BTC,\"+1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:02,Compra(BTC/BRL),BRL,\"R$ -10,00\",Sucesso\n"
+	"01/01/2024 00:00:01,Troca,BTC,\"-1,00 BTC(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:01,Troca,ETH,\"+2,00 ETH(≈R$10.00)\",Sucesso\n"
+	"01/01/2024 00:00:00,Depósito em Reais,BRL,\"R$ +100,00\",Sucesso\n"
+).encode("utf-8")
+
+
+def convert_to(tmp_path: Path, monkeypatch: Any, *outputs: str) -> list[Path]:
+	(tmp_path / "novadax.csv").write_bytes(CONTENTS)
+	paths = [tmp_path / o for o in outputs]
+	monkeypatch.setattr("sys.argv", ["nd2k", str(tmp_path / "novadax.csv"),
+		*[arg for p in paths for arg in ["-o", str(p)]]])
+	main()
+	return paths
+
+
+def test_one_run_feeds_several_outputs(tmp_path: Path, monkeypatch: Any) -> None:
+	koinly, lines, db = convert_to(tmp_path, monkeypatch, "k.csv", "t.jsonl", "t.sqlite")
+
+	with open(koinly, encoding="utf-8") as f:
+		rows = list(csv.reader(f))[1:]
+	assert [r[9] for r in rows] == ["deposit", "swap", "trade"]
+
+	records = [json.loads(line) for line in lines.read_text(encoding="utf-8").splitlines()]
+	assert records[0] == {
+		"date":              "2024-01-01 00:00:00",
+		"sent_amount":       None,
+		"sent_currency":     None,
+		"received_amount":   "100.00",
+		"received_currency": "BRL",
+		"fee_amount":        None,
+		"fee_currency":      None,
+		"label":             "deposit",
+		"description":       "Depósito em Reais",
+	}
+	assert [(r["sent_amount"], r["fee_amount"]) for r in records] == [
+		(None, None), ("2.00", None), ("10.00", "0.01")]
+
+	with sqlite3.connect(db) as connection:
+		stored = connection.execute("SELECT * FROM transactions").fetchall()
+	assert stored == [tuple(r.values()) for r in records]
+
+
+def test_sqlite_output_replaces_its_table(tmp_path: Path, monkeypatch: Any) -> None:
+	convert_to(tmp_path, monkeypatch, "t.sqlite")
+	db, = convert_to(tmp_path, monkeypatch, "t.sqlite")
+	with sqlite3.connect(db) as connection:
+		assert connection.execute("SELECT COUNT(*) FROM transactions").fetchone() == (3,)
+
+
+def test_staged_outputs(tmp_path: Path) -> None:
+	csv_path, db = str(tmp_path / "t.csv.gz"), str(tmp_path / "t.sqlite")
+	with sqlite3.connect(db) as connection:
+		connection.execute("CREATE TABLE others (x TEXT)")
+	connection.close()
+
+	with pytest.raises(RuntimeError), staged([csv_path, db, "-"]) as paths:
+		assert paths[2] == "-"
+		assert [writer_for(p) for p in paths[:2]] == [KoinlyWriter, SQLiteWriter]
+		raise RuntimeError
+	assert sorted(p.name for p in tmp_path.iterdir()) == ["t.sqlite"]
+
+	with staged([csv_path, db]) as paths:
+		for path in paths:
+			with writer_for(path)(path):
+				pass
+	assert sorted(p.name for p in tmp_path.iterdir()) == ["t.csv.gz", "t.sqlite"]
+	with sqlite3.connect(db) as connection:
+		tables = connection.execute("SELECT name FROM sqlite_master ORDER BY name").fetchall()
+	connection.close()
+	assert tables == [("others",), ("transactions",)]
+
+
+def test_render_koinly_same_as_format() -> None:
+	transactions = [
+		NonTrade(operation=fake_op(type=OperationType.FIAT_DEPOSIT)),
+		NonTrade(operation=fake_op(type=OperationType.CRYPTO_WITHDRAW)),
+	]
+	rows = render_koinly(Columns.of(t.record() for t in transactions))
+	assert [list(r) for r in rows] == [t.format() for t in transactions]
+
+
+def test_koinly_universal_format_is_lazy() -> None:
+	def transactions() -> Any:
+		for _ in range(BATCH_SIZE):
+			yield NonTrade(operation=fake_op(type=OperationType.FIAT_DEPOSIT))
+		raise AssertionError("consumed too early")
+
+	rows = koinly_universal_format(transactions())
+	assert next(rows)[0] == "Date"
+	assert next(rows)[9] == "deposit"
+
+
+@pytest.mark.parametrize("path, writer", [
+	("out.csv",        KoinlyWriter),
+	("out.txt",        KoinlyWriter),
+	("-",              KoinlyWriter),
+	("out.JSONL",      JSONLinesWriter),
+	("out.ndjson.gz",  JSONLinesWriter),
+	("out.sqlite",     SQLiteWriter),
+	("out.db",         SQLiteWriter),
+	("out.arrow",      ArrowWriter),
+	("out.parquet",    ParquetWriter),
+])
+def test_writer_for(path: str, writer: type) -> None:
+	assert writer_for(path) is writer
+
+
+def test_unwritable() -> None:
+	assert unwritable("out.jsonl.gz") is None
+	assert unwritable("out.sqlite.gz") == "out.sqlite.gz: SQLite outputs must be uncompressed files"
+	assert unwritable("-.sqlite") is None
+
+
+def test_several_outputs_to_standard_output(capsys: Any, tmp_path: Path, monkeypatch: Any) -> None:
+	(tmp_path / "novadax.csv").write_bytes(CONTENTS)
+	monkeypatch.setattr("sys.argv", ["nd2k", str(tmp_path / "novadax.csv"), "-o", "-", "-o", "-"])
+	with pytest.raises(SystemExit) as exc_info:
+		main()
+	assert exc_info.value.code == 1
+	assert "Error: Only one output can go to standard output" in capsys.readouterr().out
+
+
+def test_arrow_and_parquet_outputs(tmp_path: Path, monkeypatch: Any) -> None:
+	pytest.importorskip("pyarrow")
+	import pyarrow.ipc
+	import pyarrow.parquet
+
+	arrow, parquet = convert_to(tmp_path, monkeypatch, "t.arrow", "t.parquet")
+
+	for table in [
+		pyarrow.ipc.open_file(str(arrow)).read_all(),
+		pyarrow.parquet.read_table(str(parquet)),
+	]:
+		assert table.column_names == list(Columns._fields)
+		assert table.column("label").to_pylist() == ["deposit", "swap", "trade"]
+		assert table.column("received_amount").to_pylist() == ["100.00", "1.00", "1.00"]
+
+
+def test_arrow_without_pyarrow(capsys: Any, tmp_path: Path, monkeypatch: Any) -> None:
+	if ArrowWriter.unavailable() is None:
+		pytest.skip("PyArrow is installed")
+
+	with pytest.raises(SystemExit):
+		convert_to(tmp_path, monkeypatch, "t.parquet")
+	assert "Error: Arrow and Parquet outputs require PyArrow" in capsys.readouterr().out